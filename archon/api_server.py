@@ -1,4 +1,4 @@
-from fastapi import FastAPI, WebSocket, HTTPException, BackgroundTasks
+from fastapi import FastAPI, WebSocket, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
@@ -8,7 +8,12 @@ from archon_graph import agentic_flow, AgentState
 from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter
 from fastapi import WebSocketDisconnect
 from fastapi.websockets import WebSocketState
-import uuid
+from fastapi.responses import StreamingResponse
+from archon.utils.session_store import create_session_store, new_session
+from archon.utils.streaming import stream_agent, coalesce
+from archon.utils.admission import QueueFullError, create_admission_controller
+from archon.utils.prompt_budget import token_usage
+from archon.utils.supabase_repository import site_page_urls_cache
 
 app = FastAPI(title="Archon AI API", version="1.0.0")
 
@@ -21,10 +26,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store active sessions and their websockets
-active_sessions: Dict[str, Dict[str, Any]] = {}
+# Store active sessions (bounded, see SESSION_STORE) and their websockets
+session_store = create_session_store()
 websocket_connections: Dict[str, WebSocket] = {}
 
+# Caps concurrent graph runs and queues the rest, see MAX_CONCURRENT_RUNS
+admission = create_admission_controller()
+
 class ChatMessage(BaseModel):
     role: str
     content: str
@@ -39,166 +47,267 @@ class ChatResponse(BaseModel):
     messages: List[ChatMessage]
     context: Dict[str, Any]
 
+def run_config(session_id: str) -> Dict[str, Any]:
+    # One checkpoint thread per session, so any worker sharing the checkpointer can continue it
+    return {"configurable": {"thread_id": session_id}}
+
+async def agent_input(session_id: str, session: Dict[str, Any]) -> Dict[str, Any]:
+    # The checkpointer already holds the thread's state, so only the new message is sent;
+    # a thread without checkpoints (new, or evicted by CHECKPOINT_TTL) is seeded from the session
+    snapshot = await agentic_flow.aget_state(run_config(session_id))
+    if snapshot.values:
+        return {'latest_user_message': session['agent_state']['latest_user_message']}
+    return session['agent_state']
+
+async def cancel_on_disconnect(http_request: Request, coro):
+    # Plain HTTP handlers never hear about a disconnect, so poll for it and cancel the run
+    task = asyncio.create_task(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=1.0)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+def session_context(session: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'scope': session['agent_state'].get('scope', ''),
+        'architecture': session['agent_state'].get('architecture', '')
+    }
+
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     session_id = request.session_id
     
-    # Initialize or get session state
-    if session_id not in active_sessions:
-        active_sessions[session_id] = {
-            'messages': [],
-            'agent_state': {
-                'messages': [],
-                'scope': '',
-                'architecture': '',
-                'latest_user_message': ''
-            }
-        }
-    
-    session = active_sessions[session_id]
-    
-    # Update agent state with new message
-    session['agent_state']['latest_user_message'] = request.message
-    session['messages'].append(ChatMessage(role="user", content=request.message))
-    
     try:
-        # Create a response accumulator
-        response_content = []
-        
-        def stream_handler(content: str):
-            response_content.append(content)
-        
-        # Run the agent workflow
-        result = await agentic_flow.ainvoke(
-            session['agent_state'],
-            config={"configurable": {"stream_handler": stream_handler}}
-        )
-        
-        # Update session state with result
-        session['agent_state'] = result
-        
-        # Combine response content
-        full_response = ''.join(response_content)
+        # Run the agent workflow once admitted, accumulating the text its nodes stream.
+        # The session is read and written back only while holding the slot, so a
+        # queued turn of the same session never works on this turn's state
+        async def run():
+            async with admission.slot(session_id):
+                # Initialize or get session state
+                session = session_store.get_or_create(session_id)
+                
+                # Update agent state with new message
+                session['agent_state']['latest_user_message'] = request.message
+                session['messages'].append({"role": "user", "content": request.message})
+                
+                response_content = []
+                async for kind, payload in stream_agent(agentic_flow, await agent_input(session_id, session), run_config(session_id)):
+                    if kind == "chunk":
+                        response_content.append(payload)
+                    elif payload:
+                        # Update session state with result
+                        session['agent_state'] = payload
+                
+                # Add assistant's response to messages
+                full_response = ''.join(response_content)
+                session['messages'].append({"role": "assistant", "content": full_response})
+                session_store.put(session_id, session)
+            return full_response, session
         
-        # Add assistant's response to messages
-        session['messages'].append(ChatMessage(role="assistant", content=full_response))
+        full_response, session = await cancel_on_disconnect(http_request, run())
         
         return ChatResponse(
             session_id=session_id,
             response=full_response,
-            messages=session['messages'],
-            context={
-                'scope': session['agent_state'].get('scope', ''),
-                'architecture': session['agent_state'].get('architecture', '')
-            }
+            messages=[ChatMessage(**m) for m in session['messages']],
+            context=session_context(session)
         )
         
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Server-sent events version of /api/chat: chunk events as text is produced, then a complete event."""
+    session_id = request.session_id
+    if admission.queue_full:
+        raise HTTPException(status_code=429, detail="Server busy, try again later")
+    
+    def sse(event: str, data: Dict[str, Any]) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    async def events():
+        response_content = []
+        positions: asyncio.Queue = asyncio.Queue()
+        try:
+            # Queue positions are reported as events while waiting; the stream is
+            # cancelled, and the slot released, when the client disconnects
+            acquire = asyncio.create_task(admission.acquire(session_id, on_position=positions.put))
+            try:
+                while not acquire.done():
+                    position = asyncio.create_task(positions.get())
+                    await asyncio.wait({acquire, position}, return_when=asyncio.FIRST_COMPLETED)
+                    if position.done():
+                        yield sse("queued", {"position": position.result()})
+                    else:
+                        position.cancel()
+                acquire.result()
+                
+                # The session is read and written back only while holding the slot
+                session = session_store.get_or_create(session_id)
+                session['agent_state']['latest_user_message'] = request.message
+                session['messages'].append({"role": "user", "content": request.message})
+                async for kind, payload in coalesce(stream_agent(agentic_flow, await agent_input(session_id, session), run_config(session_id))):
+                    if kind == "chunk":
+                        response_content.append(payload)
+                        yield sse("chunk", {"content": payload})
+                    elif payload:
+                        session['agent_state'] = payload
+                session['messages'].append({"role": "assistant", "content": ''.join(response_content)})
+                session_store.put(session_id, session)
+            finally:
+                if not acquire.done():
+                    acquire.cancel()
+                elif not acquire.cancelled() and acquire.exception() is None:
+                    # Admitted, including when the client left at a "queued" event sent in the same round
+                    admission.release(session_id)
+            yield sse("complete", {"context": session_context(session)})
+        except QueueFullError as e:
+            yield sse("error", {"error": str(e), "status": 429})
+        except Exception as e:
+            print(f"Error in agent workflow: {e}")
+            yield sse("error", {"error": str(e)})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.websocket("/ws/chat/{session_id}")
 async def websocket_chat(websocket: WebSocket, session_id: str):
+    reader = None
     try:
         await websocket.accept()
         
         # Store WebSocket connection
         websocket_connections[session_id] = websocket
         
-        # Initialize or get session state
-        if session_id not in active_sessions:
-            active_sessions[session_id] = {
-                'messages': [],
-                'agent_state': {
-                    'messages': [],
-                    'scope': '',
-                    'architecture': '',
-                    'latest_user_message': '',
-                    'thread_id': str(uuid.uuid4())  # Add thread_id
-                }
-            }
-        
-        session = active_sessions[session_id]
+        async def send_json(data: Dict[str, Any]):
+            if websocket.client_state == WebSocketState.CONNECTED:
+                await websocket.send_text(json.dumps(data))
         
-        try:
-            while True:
-                # Receive message from client
-                message = await websocket.receive_text()
-                data = json.loads(message)
-                
-                # Update agent state with new message
-                session['agent_state']['latest_user_message'] = data['message']
-                session['messages'].append({"role": "user", "content": data['message']})
-                
-                # Create a stream handler that sends chunks through websocket
-                async def stream_handler(content: str):
-                    if websocket.client_state == WebSocketState.CONNECTED:
-                        try:
-                            await websocket.send_text(json.dumps({
-                                "type": "chunk",
-                                "content": content
-                            }))
-                        except Exception as e:
-                            print(f"Error sending chunk: {e}")
-                
-                try:
-                    # Run the agent workflow
-                    result = await agentic_flow.ainvoke(
-                        session['agent_state'],
-                        config={"configurable": {"stream_handler": stream_handler}}
-                    )
+        async def run_turn(user_message: str):
+            try:
+                async with admission.slot(session_id, on_position=lambda position: send_json({
+                    "type": "queued",
+                    "position": position
+                })):
+                    # Initialize or get session state once admitted, re-read each turn since idle
+                    # sessions may be evicted or spilled and other requests may have updated it
+                    session = session_store.get_or_create(session_id)
                     
-                    # Update session state with result
-                    session['agent_state'].update(result)
+                    # Update agent state with new message
+                    session['agent_state']['latest_user_message'] = user_message
+                    session['messages'].append({"role": "user", "content": user_message})
                     
-                    # Send final state update
-                    if websocket.client_state == WebSocketState.CONNECTED:
-                        await websocket.send_text(json.dumps({
-                            "type": "complete",
-                            "context": {
-                                'scope': session['agent_state'].get('scope', ''),
-                                'architecture': session['agent_state'].get('architecture', '')
-                            }
-                        }))
-                except Exception as e:
-                    if websocket.client_state == WebSocketState.CONNECTED:
-                        await websocket.send_text(json.dumps({
-                            "type": "error",
-                            "error": str(e)
-                        }))
-                    print(f"Error in agent workflow: {e}")
+                    # Run the agent workflow, sending coalesced chunks as they are produced.
+                    # Sends are awaited, so a slow client pauses the graph once the buffer fills
+                    response_content = []
+                    async for kind, payload in coalesce(stream_agent(agentic_flow, await agent_input(session_id, session), run_config(session_id))):
+                        if kind == "chunk":
+                            response_content.append(payload)
+                            await send_json({
+                                "type": "chunk",
+                                "content": payload
+                            })
+                        elif payload:
+                            # Update session state with result
+                            session['agent_state'] = payload
                     
-        except WebSocketDisconnect:
-            print(f"WebSocket {session_id} disconnected normally")
-        except Exception as e:
-            print(f"Error in WebSocket connection {session_id}: {e}")
-            if websocket.client_state == WebSocketState.CONNECTED:
-                await websocket.send_text(json.dumps({
+                    session['messages'].append({"role": "assistant", "content": ''.join(response_content)})
+                    session_store.put(session_id, session)
+                
+                # Send final state update
+                await send_json({
+                    "type": "complete",
+                    "context": session_context(session)
+                })
+            except QueueFullError as e:
+                await send_json({
                     "type": "error",
-                    "error": str(e)
-                }))
+                    "error": str(e),
+                    "status": 429
+                })
+            except Exception as e:
+                print(f"Error in agent workflow: {e}")
+                try:
+                    await send_json({
+                        "type": "error",
+                        "error": str(e)
+                    })
+                except Exception:
+                    pass
+        
+        # Messages are read by a separate task so a disconnect is noticed mid-run and cancels the run
+        inbox: asyncio.Queue = asyncio.Queue()
+        current_run: Optional[asyncio.Task] = None
+        
+        async def read_messages():
+            try:
+                while True:
+                    await inbox.put(await websocket.receive_text())
+            except WebSocketDisconnect:
+                print(f"WebSocket {session_id} disconnected normally")
+            except Exception as e:
+                print(f"Error in WebSocket connection {session_id}: {e}")
+            finally:
+                if current_run is not None and not current_run.done():
+                    current_run.cancel()
+                inbox.put_nowait(None)
+        
+        reader = asyncio.create_task(read_messages())
+        while True:
+            # Receive message from client
+            message = await inbox.get()
+            if message is None:
+                break
+            data = json.loads(message)
+            current_run = asyncio.create_task(run_turn(data['message']))
+            await asyncio.wait({current_run})
     except Exception as e:
         print(f"Error in WebSocket setup {session_id}: {e}")
     finally:
         # Clean up
-        if session_id in websocket_connections:
+        if reader is not None:
+            reader.cancel()
+        if websocket_connections.get(session_id) is websocket:
             del websocket_connections[session_id]
         if websocket.client_state == WebSocketState.CONNECTED:
             await websocket.close()
 
 @app.delete("/api/chat/{session_id}")
 async def clear_chat(session_id: str):
-    if session_id in active_sessions:
-        active_sessions[session_id] = {
-            'messages': [],
-            'agent_state': {
-                'messages': [],
-                'scope': '',
-                'architecture': '',
-                'latest_user_message': ''
-            }
-        }
+    if session_store.get(session_id) is not None:
+        session_store.put(session_id, new_session())
+    # Drop the checkpoint thread too, or the next turn would continue the old conversation
+    delete_thread = getattr(agentic_flow.checkpointer, 'adelete_thread', None)
+    if delete_thread is not None:
+        await delete_thread(session_id)
     return {"status": "success"}
 
+@app.get("/api/metrics/sessions")
+async def session_metrics():
+    return session_store.metrics()
+
+@app.get("/api/metrics/admission")
+async def admission_metrics():
+    return admission.metrics()
+
+@app.get("/api/metrics/tokens")
+async def token_metrics():
+    return token_usage.snapshot()
+
+@app.get("/api/metrics/documentation-pages")
+async def documentation_page_metrics():
+    return site_page_urls_cache.metrics()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
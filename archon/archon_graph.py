@@ -4,13 +4,11 @@ from pydantic_ai.models.anthropic import AnthropicModel
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai import Agent, RunContext
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
 from typing import TypedDict, Annotated, List, Any
 from langgraph.config import get_stream_writer
 from langgraph.types import interrupt
 from langgraph.errors import GraphInterrupt
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
 from supabase import Client
 import logfire
 import os
@@ -21,7 +19,6 @@ import datetime
 import json
 import random
 import re
-import tiktoken
 from typing import Dict, Any, Optional, List, Union, AsyncGenerator, Callable, TypeVar
 from typing_extensions import Protocol
 from logfire import configure
@@ -45,6 +42,10 @@ from archon.pydantic_ai_coder import (
     detect_mcp_tool_keywords
 )
 from utils.utils import get_env_var
+from archon.utils.supabase_repository import get_supabase_client
+from archon.utils.checkpointer import create_checkpointer
+from archon.utils.model_client import get_openai_client, run as run_model
+from archon.utils.prompt_budget import PromptSection, assemble_prompt, model_summarizer, record_usage
 
 # Add import for MCP tools modules - ensure we import from all three components
 from archon.mcp_tools.mcp_tool_coder import (
@@ -52,6 +53,7 @@ from archon.mcp_tools.mcp_tool_coder import (
     MCPToolDeps,
     find_relevant_mcp_tools,
     integrate_mcp_tool_with_code,
+    write_mcp_runtime,
     create_mcp_context
 )
 from archon.mcp_tools.mcp_tool_graph import (
@@ -100,12 +102,20 @@ is_ollama = "localhost" in base_url.lower()
 is_anthropic = "anthropic" in base_url.lower()
 is_openai = "openai" in base_url.lower()
 
+# Shared pooled client, None when no model provider is configured.
+# The pydantic-ai agents below send their requests over its transport but call the
+# SDK directly, so only safe_run_model calls get the header-driven rate-limit pacing.
+if is_ollama:
+    openai_client = get_openai_client(base_url, api_key)
+else:
+    openai_client = get_openai_client(api_key=get_env_var("OPENAI_API_KEY"))
+
 reasoner_llm_model_name = get_env_var('REASONER_MODEL') or 'gpt-4o-mini'
 # Fix model initialization
 if is_anthropic:
     reasoner_llm_model = AnthropicModel(reasoner_llm_model_name, api_key=api_key)
 else:
-    reasoner_llm_model = OpenAIModel(reasoner_llm_model_name)
+    reasoner_llm_model = OpenAIModel(reasoner_llm_model_name, openai_client=openai_client)
 
 reasoner = Agent(  
     reasoner_llm_model,
@@ -161,7 +171,7 @@ primary_llm_model_name = get_env_var('PRIMARY_MODEL') or 'gpt-4o-mini'
 if is_anthropic:
     primary_llm_model = AnthropicModel(primary_llm_model_name, api_key=api_key)
 else:
-    primary_llm_model = OpenAIModel(primary_llm_model_name)
+    primary_llm_model = OpenAIModel(primary_llm_model_name, openai_client=openai_client)
 
 # Now you can use primary_llm_model in the Agent instantiation
 architecture_agent = Agent(  
@@ -258,19 +268,8 @@ For each conversation end:
 Always ensure users have everything they need to run their CrewAI solution."""
 )
 
-openai_client=None
-
-if is_ollama:
-    # For Ollama, we need to specify base_url
-    openai_client = AsyncOpenAI(base_url=base_url)
-elif get_env_var("OPENAI_API_KEY"):
-    # Use the OpenAI API key from environment variable
-    openai_client = AsyncOpenAI()
-else:
-    openai_client = None
-
 if get_env_var("SUPABASE_URL"):
-    supabase: Client = Client(
+    supabase: Client = get_supabase_client(
         get_env_var("SUPABASE_URL"),
         get_env_var("SUPABASE_SERVICE_KEY")
     )
@@ -284,56 +283,22 @@ class AgentState(TypedDict):
     scope: str
     architecture: str
 
-# Add helper function after the imports but before the main function definitions
-async def safe_run_model(deps, prompt: str) -> str:
+async def safe_run_model(prompt: str) -> str:
     """
-    Safely run a prompt with different model types, including handling AsyncOpenAI clients.
+    Run a prompt through the shared model client.
     
     Args:
-        deps: Dependencies object that may have a model or openai_client attribute
         prompt: The prompt to send to the model
         
     Returns:
-        The model's response as a string
+        The model's response as a string, or an empty string when no model is configured
     """
     logger.info("Running model with prompt (first 100 chars): " + prompt[:100] + "...")
     
-    # Case 1: If deps has model attribute with run method (normal case)
-    if hasattr(deps, 'model') and hasattr(deps.model, 'run'):
-        result = await deps.model.run(prompt)
-        return result.data if hasattr(result, 'data') else str(result)
-        
-    # Case 2: If deps is itself a model with run method
-    elif hasattr(deps, 'run'):
-        result = await deps.run(prompt)
-        return result.data if hasattr(result, 'data') else str(result)
-    
-    # Case 3: If deps has openai_client (AsyncOpenAI client)
-    elif hasattr(deps, 'openai_client') and deps.openai_client is not None:
-        logger.info("Using openai_client for model run")
-        response = await deps.openai_client.chat.completions.create(
-            model=os.getenv('PRIMARY_MODEL', 'gpt-4o-mini'),
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=4000
-        )
-        return response.choices[0].message.content
-    
-    # Case 4: Check for an OpenAIModel in deps.model (that doesn't have run method but has client)
-    elif hasattr(deps, 'model') and hasattr(deps.model, 'client'):
-        logger.info("Using model.client for chat completion")
-        try:
-            response = await deps.model.client.chat.completions.create(
-                model=os.getenv('PRIMARY_MODEL', 'gpt-4o-mini'),
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=4000
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            logger.error(f"Error using model.client: {str(e)}")
-            
-    # Fallback
-    logger.warning("No suitable model found, returning empty string")
-    return ""
+    if openai_client is None:
+        logger.warning("No suitable model found, returning empty string")
+        return ""
+    return await run_model(prompt, model=os.getenv('PRIMARY_MODEL', 'gpt-4o-mini'), max_tokens=4000)
 
 # Scope Definition Node with Reasoner LLM
 async def define_scope_with_reasoner(state: AgentState):
@@ -341,9 +306,9 @@ async def define_scope_with_reasoner(state: AgentState):
     documentation_pages = await list_documentation_pages_helper(supabase)
     documentation_pages_str = "\n".join(documentation_pages)
 
-    # Then, use the reasoner to define the scope
-    prompt = f"""
-    User AI Agent Request: {state['latest_user_message']}
+    # Then, use the reasoner to define the scope, trimming the page list first if the prompt is too long
+    prompt = await assemble_prompt("""
+    User AI Agent Request: {request}
     
     Create detailed scope document for the AI agent including:
     - Architecture diagram
@@ -353,13 +318,17 @@ async def define_scope_with_reasoner(state: AgentState):
 
     Also based on these documentation pages available:
 
-    {documentation_pages_str}
+    {documentation_pages}
 
     Include a list of documentation pages that are relevant to creating this agent for the user in the scope document.
-    """
+    """, [
+        PromptSection("request", state['latest_user_message'], priority=2),
+        PromptSection("documentation_pages", documentation_pages_str, priority=1)
+    ], model=reasoner_llm_model_name)
 
     result = await reasoner.run(prompt)
     scope = result.data
+    record_usage("define_scope_with_reasoner", result, prompt, scope, reasoner_llm_model_name)
 
     # Get the directory one level up from the current file
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -380,9 +349,10 @@ async def create_architecture(state: AgentState):
     if 'architecture' not in state:
         state['architecture'] = ""  # Initialize it to an empty string or appropriate default
 
-    prompt = f"""
+    # An oversized scope is summarized to fit the model's context window
+    prompt = await assemble_prompt("""
     Based on the following scope document:
-    {state['scope']}
+    {scope}
     
     Create a detailed technical architecture including:
     1. System components and their interactions
@@ -393,10 +363,13 @@ async def create_architecture(state: AgentState):
     6. Security considerations
     7. Scalability and performance design
     8. Deployment architecture
-    """
+    """, [
+        PromptSection("scope", state['scope'], summarize=True)
+    ], model=primary_llm_model_name, summarizer=model_summarizer(primary_llm_model_name))
     
     result = await architecture_agent.run(prompt)
     architecture_plan = result.data
+    record_usage("create_architecture", result, prompt, architecture_plan, primary_llm_model_name)
     
     # Save architecture to file
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -415,9 +388,10 @@ async def create_architecture(state: AgentState):
 async def create_implementation_plan(state: AgentState):
     """Creates a detailed implementation plan based on the architecture."""
     
-    prompt = f"""
+    # An oversized architecture is summarized to fit the model's context window
+    prompt = await assemble_prompt("""
     Based on the following architecture document:
-    {state['architecture']}
+    {architecture}
     
     Create a detailed implementation plan including:
     1. Step-by-step implementation guide
@@ -425,10 +399,13 @@ async def create_implementation_plan(state: AgentState):
     3. Code structure and organization
     4. Testing and validation strategies
     5. Deployment instructions
-    """
+    """, [
+        PromptSection("architecture", state['architecture'], summarize=True)
+    ], model=primary_llm_model_name, summarizer=model_summarizer(primary_llm_model_name))
     
     result = await implementation_agent.run(prompt)
     implementation_plan = result.data
+    record_usage("create_implementation_plan", result, prompt, implementation_plan, primary_llm_model_name)
     
     # Save implementation plan to file
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -444,34 +421,18 @@ async def create_implementation_plan(state: AgentState):
 async def coder_agent(state: AgentState, writer):    
     logger.info(f"User message: {state['latest_user_message']}")
     
-    openai_client = None
     supabase = None
     is_openai = True
     
-    try:
-        # Check if we can get a valid openai client
-        from openai import AsyncOpenAI
-        base_url = os.getenv('BASE_URL', 'https://api.openai.com/v1')
-        api_key = os.getenv('LLM_API_KEY', 'no-llm-api-key-provided')
-        is_ollama = "localhost" in base_url.lower()
-        
-        if is_ollama:
-            openai_client = AsyncOpenAI(base_url=base_url, api_key=api_key)
-        elif os.getenv("OPENAI_API_KEY"):
-            openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        else:
-            logger.warning("Could not initialize OpenAI client. MCP tool search will be limited.")
-    except ImportError:
-        logger.warning("Could not import AsyncOpenAI. MCP tool search will be limited.")
+    # Reuse the process-wide pooled model client instead of connecting on every run
+    openai_client = get_openai_client()
+    if openai_client is None:
+        logger.warning("Could not initialize OpenAI client. MCP tool search will be limited.")
     
     try:
-        # Check if we can get a valid supabase client
-        from supabase import Client
-        supabase_url = os.getenv('SUPABASE_URL')
-        supabase_key = os.getenv('SUPABASE_SERVICE_KEY')
-        if supabase_url and supabase_key:
-            supabase = Client(supabase_url, supabase_key)
-        else:
+        # Reuse the process-wide supabase client instead of connecting on every run
+        supabase = get_supabase_client()
+        if supabase is None:
             logger.warning("Could not initialize Supabase client. MCP tool search will be limited.")
     except ImportError:
         logger.warning("Could not import Supabase. MCP tool search will be limited.")
@@ -712,7 +673,7 @@ async def coder_agent(state: AgentState, writer):
                             ```
                             """
                             
-                            integration_result = await safe_run_model(deps, tool_integration_query)
+                            integration_result = await safe_run_model(tool_integration_query)
                             
                             # Extract code blocks from the response
                             import re
@@ -850,7 +811,7 @@ async def coder_agent(state: AgentState, writer):
                     """
                     
                     try:
-                        needs_mcp = await safe_run_model(deps, mcp_needs_query)
+                        needs_mcp = await safe_run_model(mcp_needs_query)
                         needs_mcp_result = needs_mcp.lower()
                         
                         if "yes" in needs_mcp_result:
@@ -911,6 +872,8 @@ async def coder_agent(state: AgentState, writer):
                         try:
                             with open(file_path, "w", encoding="utf-8") as f:
                                 f.write(code)
+                            if file_name == "tools.py":
+                                write_mcp_runtime(output_dir)
                             logger.info(f"Writing adapted code to {file_path}")
                             writer(f"Created {file_name}\n")
                         except Exception as e:
@@ -922,6 +885,7 @@ async def coder_agent(state: AgentState, writer):
                     try:
                         with open(tools_path, "w", encoding="utf-8") as f:
                             f.write(generated_tool_code)
+                        write_mcp_runtime(output_dir)
                         logger.info(f"Copying MCP tools.py to {tools_path}")
                         writer(f"Created tools.py with MCP tool integration\n")
                     except Exception as e:
@@ -1051,7 +1015,7 @@ async def coder_agent(state: AgentState, writer):
                             Make sure the agents properly use the MCP tools from tools.py.
                             """
                             
-                            missing_files_code = await safe_run_model(deps, tool_integration_query)
+                            missing_files_code = await safe_run_model(tool_integration_query)
                             
                             # Check if we got code for the missing files
                             if missing_files_code:
@@ -1126,6 +1090,7 @@ async def coder_agent(state: AgentState, writer):
                     try:
                         with open(tools_path, "w", encoding="utf-8") as f:
                             f.write(generated_tool_code)
+                        write_mcp_runtime(output_dir)
                         logger.info(f"Copied MCP tools.py to {tools_path}")
                         writer(f"Created tools.py with MCP tool integration\n")
                     except Exception as e:
@@ -1251,7 +1216,7 @@ async def coder_agent(state: AgentState, writer):
                         Please adapt these examples to match the user's request and ensure they work with the provided tools.py file.
                         """
                         
-                        integration_result = await safe_run_model(deps, tool_integration_query)
+                        integration_result = await safe_run_model(tool_integration_query)
                         
                         # Extract code blocks from the response
                         import re
@@ -1384,8 +1349,8 @@ builder.add_conditional_edges(
 )
 builder.add_edge("finish_conversation", END)
 
-# Configure persistence
-memory = MemorySaver()
+# Configure persistence (CHECKPOINT_BACKEND selects sqlite, supabase or memory)
+memory = create_checkpointer(supabase=supabase)
 agentic_flow = builder.compile(checkpointer=memory)
 
 async def get_most_likely_tool_name(mcp_result: Dict[str, Any]) -> str:
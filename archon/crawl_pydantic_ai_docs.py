@@ -5,21 +5,29 @@ import threading
 import subprocess
 import requests
 import json
+import hashlib
 from typing import List, Dict, Any, Optional, Callable
+from concurrent.futures import ProcessPoolExecutor
 from xml.etree import ElementTree
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from urllib.parse import urlparse
 from dotenv import load_dotenv
 import re
-import html2text
+import random
+import httpx
 
 # Add the parent directory to sys.path to allow importing from the parent directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.utils import get_env_var
+from archon.utils.embeddings import get_embedding_service, EmbeddingBatcher
+from archon.utils.llm_cache import cached_completion
+from archon.utils.model_client import get_openai_client
+from archon.utils.html_markdown import html_to_markdown
+from archon.utils.vector_index import get_site_pages_index
+from archon.utils.supabase_repository import refresh_site_page_urls
 
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
-from openai import AsyncOpenAI
 from supabase import create_client, Client
 
 load_dotenv()
@@ -32,25 +40,23 @@ is_ollama = "localhost" in base_url.lower()
 
 embedding_model = get_env_var('EMBEDDING_MODEL') or 'text-embedding-3-small'
 
-openai_client=None
+# Shared embedding cache, so unchanged chunks on a re-crawl cost no API call
+embedding_service = get_embedding_service()
 
+# Shared pooled client (see archon/utils/model_client.py)
 if is_ollama:
-    openai_client = AsyncOpenAI(base_url=base_url,api_key=api_key)
+    openai_client = get_openai_client(base_url, api_key)
 else:
-    openai_client = AsyncOpenAI(api_key=get_env_var("OPENAI_API_KEY"))
+    openai_client = get_openai_client(api_key=get_env_var("OPENAI_API_KEY"))
+if openai_client is None:
+    # Fail before crawling rather than storing zero-vector embeddings and error titles
+    raise RuntimeError("No model provider configured for the crawler: set OPENAI_API_KEY or BASE_URL/LLM_API_KEY")
 
 supabase: Client = create_client(
     get_env_var("SUPABASE_URL"),
     get_env_var("SUPABASE_SERVICE_KEY")
 )
 
-# Initialize HTML to Markdown converter
-html_converter = html2text.HTML2Text()
-html_converter.ignore_links = False
-html_converter.ignore_images = False
-html_converter.ignore_tables = False
-html_converter.body_width = 0  # No wrapping
-
 @dataclass
 class ProcessedChunk:
     url: str
@@ -61,6 +67,29 @@ class ProcessedChunk:
     metadata: Dict[str, Any]
     embedding: List[float]
 
+@dataclass
+class PageState:
+    """HTTP validators and content hashes recorded for a crawled page."""
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    chunk_hashes: List[str] = field(default_factory=list)
+
+@dataclass
+class FetchResult:
+    """Result of a (possibly conditional) page fetch."""
+    url: str
+    status: int
+    markdown: str = ""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    
+    @property
+    def not_modified(self) -> bool:
+        """Return True if the server answered 304 Not Modified."""
+        return self.status == 304
+
 class CrawlProgressTracker:
     """Class to track progress of the crawling process."""
     
@@ -76,6 +105,7 @@ class CrawlProgressTracker:
         self.urls_processed = 0
         self.urls_succeeded = 0
         self.urls_failed = 0
+        self.urls_unchanged = 0
         self.chunks_stored = 0
         self.logs = []
         self.is_running = False
@@ -123,6 +153,7 @@ class CrawlProgressTracker:
             "urls_processed": self.urls_processed,
             "urls_succeeded": self.urls_succeeded,
             "urls_failed": self.urls_failed,
+            "urls_unchanged": self.urls_unchanged,
             "chunks_stored": self.chunks_stored,
             "progress_percentage": (self.urls_processed / self.urls_found * 100) if self.urls_found > 0 else 0,
             "logs": self.logs,
@@ -140,6 +171,10 @@ class CrawlProgressTracker:
         """Return True if the crawling process completed successfully."""
         return self.is_completed and self.urls_failed == 0 and self.urls_succeeded > 0
 
+def content_hash(text: str) -> str:
+    """Return the sha256 hex digest used to detect changed pages and chunks."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
 def chunk_text(text: str, chunk_size: int = 5000) -> List[str]:
     """Split text into chunks, respecting code blocks and paragraphs."""
     chunks = []
@@ -194,38 +229,54 @@ async def get_title_and_summary(chunk: str, url: str) -> Dict[str, str]:
     Keep both title and summary concise but informative."""
     
     try:
-        response = await openai_client.chat.completions.create(
+        # Unchanged chunks of a re-crawled page reuse their earlier title and summary
+        content = await cached_completion(
+            openai_client,
+            "get_title_and_summary",
             model=get_env_var("PRIMARY_MODEL") or "gpt-4o-mini",
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": f"URL: {url}\n\nContent:\n{chunk[:1000]}..."}  # Send first 1000 chars for context
             ],
+            validate=json.loads,
             response_format={ "type": "json_object" }
         )
-        return json.loads(response.choices[0].message.content)
+        return json.loads(content)
     except Exception as e:
         print(f"Error getting title and summary: {e}")
         return {"title": "Error processing title", "summary": "Error processing summary"}
 
 async def get_embedding(text: str) -> List[float]:
-    """Get embedding vector from OpenAI."""
+    """Get embedding vector from OpenAI, served from the shared embedding cache when possible."""
     try:
-        response = await openai_client.embeddings.create(
-            model= embedding_model,
-            input=text
-        )
-        return response.data[0].embedding
+        return await embedding_service.embed(text, openai_client, embedding_model)
+    except Exception as e:
+        print(f"Error getting embedding: {e}")
+        return [0] * 1536  # Return zero vector on error
+
+async def get_batched_embedding(text: str, batcher: EmbeddingBatcher) -> List[float]:
+    """Get embedding vector through a shared batcher, falling back to a zero vector on error."""
+    try:
+        return await batcher.embed(text)
     except Exception as e:
         print(f"Error getting embedding: {e}")
         return [0] * 1536  # Return zero vector on error
 
-async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChunk:
-    """Process a single chunk of text."""
-    # Get title and summary
-    extracted = await get_title_and_summary(chunk, url)
+async def process_chunk(chunk: str, chunk_number: int, url: str, batcher: Optional[EmbeddingBatcher] = None) -> ProcessedChunk:
+    """Process a single chunk of text.
     
-    # Get embedding
-    embedding = await get_embedding(chunk)
+    When a batcher is given the chunk's embedding is queued with chunks from
+    other documents and sent in a single batched request.
+    """
+    # Get title and summary and the embedding concurrently
+    if batcher:
+        embedding_task = get_batched_embedding(chunk, batcher)
+    else:
+        embedding_task = get_embedding(chunk)
+    extracted, embedding = await asyncio.gather(
+        get_title_and_summary(chunk, url),
+        embedding_task
+    )
     
     # Create metadata
     metadata = {
@@ -245,30 +296,144 @@ async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChu
         embedding=embedding
     )
 
+def chunk_to_row(chunk: ProcessedChunk) -> Dict[str, Any]:
+    """Convert a processed chunk into a site_pages row."""
+    return {
+        "url": chunk.url,
+        "chunk_number": chunk.chunk_number,
+        "title": chunk.title,
+        "summary": chunk.summary,
+        "content": chunk.content,
+        "metadata": chunk.metadata,
+        "embedding": chunk.embedding
+    }
+
 async def insert_chunk(chunk: ProcessedChunk):
-    """Insert a processed chunk into Supabase."""
+    """Insert a processed chunk into Supabase, replacing any existing row for the same URL and chunk number."""
     try:
-        data = {
-            "url": chunk.url,
-            "chunk_number": chunk.chunk_number,
-            "title": chunk.title,
-            "summary": chunk.summary,
-            "content": chunk.content,
-            "metadata": chunk.metadata,
-            "embedding": chunk.embedding
-        }
+        data = chunk_to_row(chunk)
         
-        result = supabase.table("site_pages").insert(data).execute()
+        result = supabase.table("site_pages").upsert(data, on_conflict="url,chunk_number").execute()
         print(f"Inserted chunk {chunk.chunk_number} for {chunk.url}")
         return result
     except Exception as e:
         print(f"Error inserting chunk: {e}")
         return None
 
-async def process_and_store_document(url: str, markdown: str, tracker: Optional[CrawlProgressTracker] = None):
-    """Process a document and store its chunks in parallel."""
+class SitePagesWriter:
+    """Buffers processed chunks and writes them to site_pages as multi-row upserts.
+    
+    Rows are upserted on the (url, chunk_number) unique constraint, so re-crawls
+    replace existing chunks instead of failing on duplicate keys. Producers wait
+    in add() once max_in_flight batches are being written.
+    """
+    
+    def __init__(self,
+                 client: Optional[Client] = None,
+                 tracker: Optional[CrawlProgressTracker] = None,
+                 batch_size: int = 100,
+                 max_in_flight: int = 2,
+                 max_retries: int = 3,
+                 retry_backoff: float = 1.0):
+        """Initialize the writer.
+        
+        Args:
+            client: Supabase client, defaults to the module client
+            tracker: Progress tracker credited with stored chunks
+            batch_size: Number of rows per upsert request
+            max_in_flight: Maximum number of upsert requests running at once
+            max_retries: Number of retries for a failed batch
+            retry_backoff: Base delay in seconds between retries, doubled on each attempt
+        """
+        self.client = client or supabase
+        self.tracker = tracker
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.rows_written = 0
+        self.rows_failed = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._in_flight = asyncio.Semaphore(max(1, max_in_flight))
+        self._tasks = set()
+    
+    async def __aenter__(self) -> "SitePagesWriter":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def add(self, chunk: ProcessedChunk):
+        """Buffer a chunk, sending a batch once the buffer is full."""
+        self._buffer.append(chunk_to_row(chunk))
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+    
+    async def add_many(self, chunks: List[ProcessedChunk]):
+        """Buffer several chunks."""
+        for chunk in chunks:
+            await self.add(chunk)
+    
+    async def flush(self):
+        """Send the buffered rows as one batch without waiting for it to finish."""
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        # Waiting here is what bounds the number of in-flight batches
+        await self._in_flight.acquire()
+        task = asyncio.create_task(self._write_batch(rows))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def close(self):
+        """Flush the remaining rows and wait for every batch to finish."""
+        await self.flush()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks))
+        print(f"Upserted {self.rows_written} site_pages rows ({self.rows_failed} failed)")
+    
+    async def _write_batch(self, rows: List[Dict[str, Any]]):
+        """Upsert one batch, retrying with exponential backoff and jitter."""
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await asyncio.to_thread(
+                        lambda: self.client.table("site_pages").upsert(rows, on_conflict="url,chunk_number").execute()
+                    )
+                    self.rows_written += len(rows)
+                    if self.tracker:
+                        self.tracker.chunks_stored += len(rows)
+                        self.tracker.log(f"Stored batch of {len(rows)} chunks")
+                    return
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        self.rows_failed += len(rows)
+                        message = f"Error upserting batch of {len(rows)} chunks after {attempt + 1} attempts: {e}"
+                        if self.tracker:
+                            self.tracker.log(message)
+                        else:
+                            print(message)
+                        return
+                    delay = self.retry_backoff * (2 ** attempt) * (0.5 + random.random())
+                    print(f"Upsert of {len(rows)} chunks failed ({e}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        finally:
+            self._in_flight.release()
+
+async def process_and_store_document(url: str, markdown: str, tracker: Optional[CrawlProgressTracker] = None,
+                                     batcher: Optional[EmbeddingBatcher] = None,
+                                     writer: Optional[SitePagesWriter] = None,
+                                     previous: Optional[PageState] = None) -> List[str]:
+    """Process a document and store its chunks, through the bulk writer if one is given.
+    
+    When the page's previous state is given, chunks are matched to the stored ones
+    by content hash: chunks whose hash was already stored reuse that row (moved to
+    their new chunk number if text was inserted or removed above them), only new
+    hashes are re-processed, and chunks past the new end of the page are deleted.
+    Returns the hashes of the document's chunks.
+    """
     # Split into chunks
     chunks = chunk_text(markdown)
+    chunk_hashes = [content_hash(chunk) for chunk in chunks]
     
     if tracker:
         tracker.log(f"Split document into {len(chunks)} chunks for {url}")
@@ -278,12 +443,54 @@ async def process_and_store_document(url: str, markdown: str, tracker: Optional[
     else:
         print(f"Split document into {len(chunks)} chunks for {url}")
     
+    # Match chunks to the previous crawl by hash, so text inserted near the top
+    # of a page doesn't make every chunk below it look changed
+    old_positions: Dict[str, int] = {}
+    for i, chunk_hash in enumerate(previous.chunk_hashes if previous else []):
+        old_positions.setdefault(chunk_hash, i)
+    changed = [i for i, chunk_hash in enumerate(chunk_hashes) if chunk_hash not in old_positions]
+    moves = {
+        i: old_positions[chunk_hash] for i, chunk_hash in enumerate(chunk_hashes)
+        if chunk_hash in old_positions and old_positions[chunk_hash] != i
+    }
+    
+    moved_chunks: List[ProcessedChunk] = []
+    if previous:
+        # Read the rows being moved before anything for this page is rewritten
+        if moves:
+            old_rows = await load_chunk_rows(url, sorted(set(moves.values())))
+            for i, old_number in moves.items():
+                row = old_rows.get(old_number)
+                if row is None:
+                    changed.append(i)
+                    continue
+                moved_chunks.append(ProcessedChunk(
+                    url=url,
+                    chunk_number=i,
+                    title=row['title'],
+                    summary=row['summary'],
+                    content=row['content'],
+                    metadata=row['metadata'],
+                    embedding=row['embedding']
+                ))
+            changed.sort()
+        # A reset state (no content hash) doesn't say how many chunks are stored
+        if previous.content_hash is None or len(previous.chunk_hashes) > len(chunks):
+            await delete_stale_chunks(url, len(chunks))
+        message = f"{len(changed)} of {len(chunks)} chunks changed, {len(moved_chunks)} moved for {url}"
+        if tracker:
+            tracker.log(message)
+        else:
+            print(message)
+        if not changed and not moved_chunks:
+            return chunk_hashes
+    
     # Process chunks in parallel
     tasks = [
-        process_chunk(chunk, i, url) 
-        for i, chunk in enumerate(chunks)
+        process_chunk(chunks[i], i, url, batcher) 
+        for i in changed
     ]
-    processed_chunks = await asyncio.gather(*tasks)
+    processed_chunks = list(await asyncio.gather(*tasks)) + moved_chunks
     
     if tracker:
         tracker.log(f"Processed {len(processed_chunks)} chunks for {url}")
@@ -293,6 +500,15 @@ async def process_and_store_document(url: str, markdown: str, tracker: Optional[
     else:
         print(f"Processed {len(processed_chunks)} chunks for {url}")
     
+    # Hand the chunks to the bulk writer, which credits the tracker as batches land
+    if writer:
+        await writer.add_many(processed_chunks)
+        if tracker:
+            tracker.log(f"Queued {len(processed_chunks)} chunks for storage for {url}")
+        else:
+            print(f"Queued {len(processed_chunks)} chunks for storage for {url}")
+        return chunk_hashes
+    
     # Store chunks in parallel
     insert_tasks = [
         insert_chunk(chunk) 
@@ -308,32 +524,143 @@ async def process_and_store_document(url: str, markdown: str, tracker: Optional[
             tracker.progress_callback(tracker.get_status())
     else:
         print(f"Stored {len(processed_chunks)} chunks for {url}")
+    
+    return chunk_hashes
 
-def fetch_url_content(url: str) -> str:
-    """Fetch content from a URL using requests and convert to markdown."""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+class AsyncPageFetcher:
+    """Async page fetcher sharing one keep-alive connection pool across the crawl.
     
-    try:
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        # Convert HTML to Markdown
-        markdown = html_converter.handle(response.text)
+    Requests are limited per host and retried with exponential backoff and
+    jitter on transport errors, 429 and 5xx responses. HTML to Markdown
+    conversion runs in a process pool so parsing doesn't block the event loop.
+    """
+    
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    
+    def __init__(self,
+                 max_connections: int = 20,
+                 per_host_limit: int = 5,
+                 max_retries: int = 3,
+                 retry_backoff: float = 0.5,
+                 timeout: float = 30.0,
+                 process_workers: Optional[int] = None):
+        """Initialize the fetcher.
         
-        # Clean up the markdown
-        markdown = re.sub(r'\n{3,}', '\n\n', markdown)  # Remove excessive newlines
+        Args:
+            max_connections: Size of the shared connection pool
+            per_host_limit: Maximum number of concurrent requests to one host
+            max_retries: Number of retries for a failed request
+            retry_backoff: Base delay in seconds between retries, doubled on each attempt
+            timeout: Request timeout in seconds
+            process_workers: Number of HTML conversion processes, defaults to min(4, CPU count)
+        """
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.process_workers = process_workers or min(4, os.cpu_count() or 1)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+    
+    async def __aenter__(self) -> "AsyncPageFetcher":
+        self._client = httpx.AsyncClient(
+            headers=REQUEST_HEADERS,
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            )
+        )
+        self._pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._client.aclose()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+    
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        """Return the concurrency limit for the URL's host."""
+        host = urlparse(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+    
+    async def _get(self, url: str, headers: Dict[str, str]) -> httpx.Response:
+        """GET a URL, retrying transient failures."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._host_limit(url):
+                    response = await self._client.get(url, headers=headers)
+                if response.status_code not in self.RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                reason = str(e) or type(e).__name__
+            delay = self.retry_backoff * (2 ** attempt) * (0.5 + random.random())
+            print(f"Fetching {url} failed ({reason}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+    
+    async def fetch(self, url: str, state: Optional[PageState] = None) -> FetchResult:
+        """Fetch a URL as markdown, conditionally when the page's previous state is given."""
+        headers = {}
+        if state and state.etag:
+            headers['If-None-Match'] = state.etag
+        if state and state.last_modified:
+            headers['If-Modified-Since'] = state.last_modified
         
-        return markdown
-    except Exception as e:
-        raise Exception(f"Error fetching {url}: {str(e)}")
+        try:
+            response = await self._get(url, headers)
+            if response.status_code == 304:
+                return FetchResult(url=url, status=304, etag=state.etag, last_modified=state.last_modified)
+            response.raise_for_status()
+            
+            # Parse in the process pool, the loop keeps serving other fetches
+            loop = asyncio.get_running_loop()
+            markdown = await loop.run_in_executor(self._pool, html_to_markdown, response.text)
+            
+            return FetchResult(
+                url=url,
+                status=response.status_code,
+                markdown=markdown,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+        except Exception as e:
+            raise Exception(f"Error fetching {url}: {str(e)}")
 
-async def crawl_parallel_with_requests(urls: List[str], tracker: Optional[CrawlProgressTracker] = None, max_concurrent: int = 5):
-    """Crawl multiple URLs in parallel with a concurrency limit using direct HTTP requests."""
+async def crawl_parallel_with_requests(urls: List[str], tracker: Optional[CrawlProgressTracker] = None, max_concurrent: int = 5,
+                                       crawl_state: Optional[Dict[str, PageState]] = None) -> Dict[str, PageState]:
+    """Crawl multiple URLs in parallel with a concurrency limit using direct HTTP requests.
+    
+    When crawl_state holds the pages' previous state the crawl is incremental:
+    pages are fetched with conditional GETs and only changed chunks are
+    re-processed. Returns the new state of every page that was crawled.
+    """
     # Create a semaphore to limit concurrency
     semaphore = asyncio.Semaphore(max_concurrent)
     
+    # New state per page, and the pages whose chunks were rewritten
+    page_states: Dict[str, PageState] = {}
+    changed_urls = set()
+    
+    # Share one embedding batcher across all documents so chunks are embedded in bulk
+    batcher = EmbeddingBatcher(openai_client, embedding_model)
+    
+    # Write chunks to site_pages as batched upserts instead of one insert per chunk
+    writer = SitePagesWriter(tracker=tracker)
+    
+    # Fetch over one pooled HTTP client instead of a new connection per URL
+    fetcher = AsyncPageFetcher(max_connections=max_concurrent * 2, per_host_limit=max_concurrent)
+    
     async def process_url(url: str):
         async with semaphore:
             if tracker:
@@ -345,15 +672,32 @@ async def crawl_parallel_with_requests(urls: List[str], tracker: Optional[CrawlP
                 print(f"Crawling: {url}")
             
             try:
-                # Use a thread pool to run the blocking HTTP request
-                loop = asyncio.get_running_loop()
                 if tracker:
                     tracker.log(f"Fetching content from: {url}")
                 else:
                     print(f"Fetching content from: {url}")
-                markdown = await loop.run_in_executor(None, fetch_url_content, url)
+                previous = crawl_state.get(url) if crawl_state else None
+                result = await fetcher.fetch(url, previous)
+                markdown = result.markdown
                 
-                if markdown:
+                if result.not_modified:
+                    page_states[url] = previous
+                    if tracker:
+                        tracker.urls_succeeded += 1
+                        tracker.urls_unchanged += 1
+                        tracker.log(f"Not modified: {url}")
+                    else:
+                        print(f"Not modified: {url}")
+                elif markdown and previous and previous.content_hash == content_hash(markdown):
+                    page_states[url] = PageState(url, result.etag, result.last_modified,
+                                                 previous.content_hash, previous.chunk_hashes)
+                    if tracker:
+                        tracker.urls_succeeded += 1
+                        tracker.urls_unchanged += 1
+                        tracker.log(f"Unchanged content: {url}")
+                    else:
+                        print(f"Unchanged content: {url}")
+                elif markdown:
                     if tracker:
                         tracker.urls_succeeded += 1
                         tracker.log(f"Successfully crawled: {url}")
@@ -363,7 +707,10 @@ async def crawl_parallel_with_requests(urls: List[str], tracker: Optional[CrawlP
                     else:
                         print(f"Successfully crawled: {url}")
                     
-                    await process_and_store_document(url, markdown, tracker)
+                    chunk_hashes = await process_and_store_document(url, markdown, tracker, batcher, writer, previous)
+                    page_states[url] = PageState(url, result.etag, result.last_modified,
+                                                 content_hash(markdown), chunk_hashes)
+                    changed_urls.add(url)
                 else:
                     if tracker:
                         tracker.urls_failed += 1
@@ -397,7 +744,17 @@ async def crawl_parallel_with_requests(urls: List[str], tracker: Optional[CrawlP
             tracker.progress_callback(tracker.get_status())
     else:
         print(f"Processing {len(urls)} URLs with concurrency {max_concurrent}")
-    await asyncio.gather(*[process_url(url) for url in urls])
+    async with batcher, writer, fetcher:
+        await asyncio.gather(*[process_url(url) for url in urls])
+    
+    # Some rows of the rewritten pages may never have landed while others were
+    # already rewritten, moved or deleted, so the stored hashes no longer describe
+    # them. Reset their state so the next incremental crawl rebuilds them from scratch
+    if writer.rows_failed:
+        for url in changed_urls:
+            page_states[url] = PageState(url)
+    
+    return page_states
 
 def get_pydantic_ai_docs_urls() -> List[str]:
     """Get URLs from Pydantic AI docs sitemap."""
@@ -428,8 +785,96 @@ async def clear_existing_records():
         print(f"Error clearing existing records: {e}")
         return None
 
-async def main_with_requests(tracker: Optional[CrawlProgressTracker] = None):
-    """Main function using direct HTTP requests instead of browser automation."""
+async def load_chunk_rows(url: str, chunk_numbers: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Load stored chunks of a page by chunk number, or none if they can't be read."""
+    try:
+        result = await asyncio.to_thread(
+            lambda: supabase.table("site_pages")
+                .select("chunk_number, title, summary, content, metadata, embedding")
+                .eq("url", url)
+                .in_("chunk_number", chunk_numbers)
+                .execute()
+        )
+        return {row['chunk_number']: row for row in result.data or []}
+    except Exception as e:
+        print(f"Error loading stored chunks for {url}: {e}")
+        return {}
+
+async def delete_stale_chunks(url: str, chunk_count: int):
+    """Delete the chunks of a page past its new last chunk."""
+    try:
+        await asyncio.to_thread(
+            lambda: supabase.table("site_pages").delete().eq("url", url).gte("chunk_number", chunk_count).execute()
+        )
+        print(f"Deleted stale chunks from {chunk_count} onwards for {url}")
+    except Exception as e:
+        print(f"Error deleting stale chunks for {url}: {e}")
+
+async def delete_stale_pages(urls: List[str], batch_size: int = 100):
+    """Delete the chunks and crawl state of pages that are no longer in the sitemap."""
+    for start in range(0, len(urls), batch_size):
+        batch = urls[start:start + batch_size]
+        try:
+            await asyncio.to_thread(lambda: supabase.table("site_pages").delete().in_("url", batch).execute())
+            await asyncio.to_thread(lambda: supabase.table("site_pages_state").delete().in_("url", batch).execute())
+            print(f"Deleted {len(batch)} pages no longer in the sitemap")
+        except Exception as e:
+            print(f"Error deleting stale pages: {e}")
+
+async def load_crawl_state(page_size: int = 1000) -> Optional[Dict[str, PageState]]:
+    """Load the per-page crawl state, or None if it can't be read."""
+    states = {}
+    try:
+        start = 0
+        while True:
+            result = await asyncio.to_thread(
+                lambda: supabase.table("site_pages_state")
+                    .select("url, etag, last_modified, content_hash, chunk_hashes")
+                    .range(start, start + page_size - 1)
+                    .execute()
+            )
+            for row in result.data:
+                states[row['url']] = PageState(
+                    url=row['url'],
+                    etag=row.get('etag'),
+                    last_modified=row.get('last_modified'),
+                    content_hash=row.get('content_hash'),
+                    chunk_hashes=row.get('chunk_hashes') or []
+                )
+            if len(result.data) < page_size:
+                return states
+            start += page_size
+    except Exception as e:
+        print(f"Error loading crawl state: {e}")
+        return None
+
+async def save_crawl_state(states: List[PageState], batch_size: int = 500):
+    """Upsert the per-page crawl state recorded by a crawl."""
+    rows = [
+        {
+            "url": state.url,
+            "etag": state.etag,
+            "last_modified": state.last_modified,
+            "content_hash": state.content_hash,
+            "chunk_hashes": state.chunk_hashes,
+            "crawled_at": datetime.now(timezone.utc).isoformat()
+        }
+        for state in states
+    ]
+    for start in range(0, len(rows), batch_size):
+        try:
+            batch = rows[start:start + batch_size]
+            await asyncio.to_thread(lambda: supabase.table("site_pages_state").upsert(batch, on_conflict="url").execute())
+        except Exception as e:
+            print(f"Error saving crawl state: {e}")
+
+async def main_with_requests(tracker: Optional[CrawlProgressTracker] = None, incremental: bool = False):
+    """Main function using direct HTTP requests instead of browser automation.
+    
+    With incremental=True, existing records are kept and only pages and chunks
+    that changed since the last crawl are re-processed. Falls back to a full
+    crawl when no previous crawl state is available.
+    """
     try:
         # Start tracking if tracker is provided
         if tracker:
@@ -437,16 +882,27 @@ async def main_with_requests(tracker: Optional[CrawlProgressTracker] = None):
         else:
             print("Starting crawling process...")
         
+        # Load the previous crawl state for an incremental crawl
+        crawl_state = await load_crawl_state() if incremental else None
+        if incremental and not crawl_state:
+            message = "No previous crawl state found, running a full crawl"
+            if tracker:
+                tracker.log(message)
+            else:
+                print(message)
+            crawl_state = None
+        
         # Clear existing records first
-        if tracker:
-            tracker.log("Clearing existing Pydantic AI docs records...")
-        else:
-            print("Clearing existing Pydantic AI docs records...")
-        await clear_existing_records()
-        if tracker:
-            tracker.log("Existing records cleared")
-        else:
-            print("Existing records cleared")
+        if crawl_state is None:
+            if tracker:
+                tracker.log("Clearing existing Pydantic AI docs records...")
+            else:
+                print("Clearing existing Pydantic AI docs records...")
+            await clear_existing_records()
+            if tracker:
+                tracker.log("Existing records cleared")
+            else:
+                print("Existing records cleared")
         
         # Get URLs from Pydantic AI docs
         if tracker:
@@ -470,7 +926,33 @@ async def main_with_requests(tracker: Optional[CrawlProgressTracker] = None):
             print(f"Found {len(urls)} URLs to crawl")
         
         # Crawl the URLs using direct HTTP requests
-        await crawl_parallel_with_requests(urls, tracker)
+        page_states = await crawl_parallel_with_requests(urls, tracker, crawl_state=crawl_state)
+        
+        # Remove pages that dropped out of the sitemap since the last crawl
+        if crawl_state:
+            stale_urls = sorted(set(crawl_state) - set(urls))
+            if stale_urls:
+                await delete_stale_pages(stale_urls)
+        
+        await save_crawl_state(list(page_states.values()))
+        
+        # Refresh the distinct page listing and drop cached copies of it
+        await asyncio.to_thread(refresh_site_page_urls, supabase)
+        
+        # Rebuild the local retrieval index, if enabled, from the fresh table
+        index = get_site_pages_index()
+        if index is not None:
+            try:
+                row_count = await asyncio.to_thread(index.refresh_from_supabase, supabase)
+                if tracker:
+                    tracker.log(f"Rebuilt local documentation index with {row_count} chunks")
+                else:
+                    print(f"Rebuilt local documentation index with {row_count} chunks")
+            except Exception as e:
+                if tracker:
+                    tracker.log(f"Error rebuilding local documentation index: {str(e)}")
+                else:
+                    print(f"Error rebuilding local documentation index: {str(e)}")
         
         # Mark as complete if tracker is provided
         if tracker:
@@ -485,13 +967,14 @@ async def main_with_requests(tracker: Optional[CrawlProgressTracker] = None):
         else:
             print(f"Error in crawling process: {str(e)}")
 
-def start_crawl_with_requests(progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> CrawlProgressTracker:
+def start_crawl_with_requests(progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                              incremental: bool = False) -> CrawlProgressTracker:
     """Start the crawling process using direct HTTP requests in a separate thread and return the tracker."""
     tracker = CrawlProgressTracker(progress_callback)
     
     def run_crawl():
         try:
-            asyncio.run(main_with_requests(tracker))
+            asyncio.run(main_with_requests(tracker, incremental))
         except Exception as e:
             print(f"Error in crawl thread: {e}")
             tracker.log(f"Thread error: {str(e)}")
@@ -507,5 +990,5 @@ def start_crawl_with_requests(progress_callback: Optional[Callable[[Dict[str, An
 if __name__ == "__main__":    
     # Run the main function directly
     print("Starting crawler...")
-    asyncio.run(main_with_requests())
+    asyncio.run(main_with_requests(incremental="--incremental" in sys.argv))
     print("Crawler finished.")
@@ -20,6 +20,10 @@ def copy_tools():
         shutil.copy2(os.path.join(source_dir, "tools.py"), os.path.join(target_dir, "tools.py"))
         print(f"Successfully copied tools.py to {target_dir}")
         
+        # tools.py imports the shared MCP session runtime from its own directory
+        shutil.copy2(os.path.join(source_dir, "mcp_runtime.py"), os.path.join(target_dir, "mcp_runtime.py"))
+        print(f"Successfully copied mcp_runtime.py to {target_dir}")
+        
         # Copy any other relevant files
         for file in os.listdir(source_dir):
             if file.endswith(".json"):
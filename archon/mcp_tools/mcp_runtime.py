@@ -0,0 +1,730 @@
+"""
+Runtime support for CrewAI tools that talk to MCP servers.
+
+This module is copied next to tools.py in every generated CrewAI project, so it
+must only depend on the standard library and the mcp package.
+
+MCP sessions are bound to the event loop that opened them, so the pool keeps
+them on a single background loop thread and every caller, sync or async, hands
+its calls to that loop. Sessions are opened once per server URL and reused,
+health-checked when idle and reopened when the connection drops.
+
+The same loop backs ``run_sync``, which lets a tool's synchronous ``_run`` wait
+for its ``_arun`` coroutine without creating an event loop per call, and works
+even when the caller is itself running inside an event loop.
+
+Tool catalogues (list_tools results) are cached process-wide per server URL
+with a TTL and can be persisted to disk, so instantiating a tool never touches
+the network and the catalogue is fetched once, on first use.
+
+Results of idempotent, read-only operations are cached with per-operation TTLs
+in an in-memory LRU and, optionally, a SQLite file shared across runs.
+
+``BatchOperationsMixin`` gives tools a ``run_batch`` that fans independent
+operations out concurrently over the pooled session.
+
+``ToolResult`` keeps a call's raw text, parses it at most once and only when
+needed, and can render a compact, truncated version that fits a token budget.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import atexit
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
+
+import mcp
+from mcp.client.websocket import websocket_client
+
+logger = logging.getLogger("mcp_runtime")
+
+T = TypeVar("T")
+
+
+def redact_url(url: str) -> str:
+    """Strip the query string, which carries the server credentials, before logging a URL."""
+    return url.split("?", 1)[0]
+
+
+class BackgroundLoop:
+    """An event loop running forever in a daemon thread, started on first use."""
+
+    def __init__(self, name: str = "mcp-runtime"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    ready.set()
+                    loop.run_forever()
+
+                thread = threading.Thread(target=run, name=self.name, daemon=True)
+                thread.start()
+                ready.wait()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    def in_loop(self) -> bool:
+        """Whether the caller is running on the background loop itself."""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> "concurrent.futures.Future[T]":
+        """Schedule a coroutine on the background loop."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def run_async(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Await a coroutine on the background loop from any other event loop."""
+        if self.in_loop():
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
+
+
+class PooledSession:
+    """
+    One initialized MCP session kept open by a long-lived task.
+
+    The websocket and session context managers have to be exited by the task
+    that entered them, so a holder task opens them, publishes the session and
+    waits until the session is closed.
+    """
+
+    def __init__(self, url: str, max_concurrent_calls: int):
+        self.url = url
+        self.session: Optional[mcp.ClientSession] = None
+        self.semaphore = asyncio.Semaphore(max_concurrent_calls)
+        self.last_used = time.monotonic()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def connect(self, timeout: float):
+        ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._hold(ready))
+        try:
+            await asyncio.wait_for(asyncio.shield(ready), timeout)
+        except BaseException:
+            await self.close()
+            raise
+        logger.info(f"Opened MCP session to {redact_url(self.url)}")
+
+    async def _hold(self, ready: asyncio.Future):
+        try:
+            async with websocket_client(self.url) as streams:
+                async with mcp.ClientSession(*streams) as session:
+                    await session.initialize()
+                    self.session = session
+                    ready.set_result(None)
+                    await self._closing.wait()
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e if isinstance(e, Exception) else ConnectionError(str(e) or "connection cancelled"))
+            elif not self._closing.is_set():
+                logger.warning(f"MCP session to {redact_url(self.url)} dropped: {e}")
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self.session = None
+
+    async def close(self, timeout: float = 5.0):
+        self._closing.set()
+        if self._task is not None and not self._task.done():
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except BaseException:
+                self._task.cancel()
+
+
+class MCPSessionPool:
+    """
+    Process-wide pool of warm MCP sessions, one per server URL.
+
+    Calls may come from any thread or event loop; they run on the pool's
+    background loop. Each session accepts a bounded number of concurrent calls,
+    is pinged before reuse once it has been idle for ``health_check_interval``
+    seconds, and is reopened when its connection has dropped.
+    """
+
+    def __init__(self,
+                 max_concurrent_calls: int = 4,
+                 health_check_interval: float = 60.0,
+                 connect_timeout: float = 30.0,
+                 call_timeout: float = 120.0,
+                 background: Optional[BackgroundLoop] = None):
+        self.max_concurrent_calls = max_concurrent_calls
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self.call_timeout = call_timeout
+        self.background = background or BackgroundLoop()
+        self._sessions: Dict[str, PooledSession] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def _healthy(self, pooled: PooledSession) -> bool:
+        try:
+            await asyncio.wait_for(pooled.session.send_ping(), 10)
+            return True
+        except Exception as e:
+            logger.warning(f"Health check failed for {redact_url(pooled.url)}: {e}")
+            return False
+
+    async def _acquire(self, url: str) -> PooledSession:
+        lock = self._locks.setdefault(url, asyncio.Lock())
+        async with lock:
+            pooled = self._sessions.get(url)
+            if pooled is not None and pooled.alive \
+                    and time.monotonic() - pooled.last_used > self.health_check_interval \
+                    and not await self._healthy(pooled):
+                await pooled.close()
+            if pooled is None or not pooled.alive:
+                pooled = PooledSession(url, self.max_concurrent_calls)
+                await pooled.connect(self.connect_timeout)
+                self._sessions[url] = pooled
+            return pooled
+
+    async def _with_session(self, url: str, fn: Callable[[mcp.ClientSession], Awaitable[T]]) -> T:
+        for attempt in range(2):
+            pooled = await self._acquire(url)
+            try:
+                async with pooled.semaphore:
+                    pooled.last_used = time.monotonic()
+                    return await asyncio.wait_for(fn(pooled.session), self.call_timeout)
+            except Exception as e:
+                # Retry once on a fresh session, but only when the connection itself went away
+                if attempt or pooled.alive or isinstance(e, asyncio.TimeoutError):
+                    raise
+                logger.warning(f"MCP session to {redact_url(url)} lost during a call, reconnecting: {e}")
+
+    async def call_tool(self, url: str, name: str, arguments: Optional[Dict[str, Any]] = None) -> Any:
+        """Call a tool on the MCP server at url over a pooled session."""
+        return await self.background.run_async(
+            self._with_session(url, lambda session: session.call_tool(name, arguments or {}))
+        )
+
+    async def list_tools(self, url: str) -> Any:
+        """Return the list_tools result of the MCP server at url."""
+        return await self.background.run_async(
+            self._with_session(url, lambda session: session.list_tools())
+        )
+
+    async def _close_all(self):
+        sessions, self._sessions = list(self._sessions.values()), {}
+        for pooled in sessions:
+            await pooled.close()
+
+    async def close(self):
+        """Close every pooled session."""
+        await self.background.run_async(self._close_all())
+
+    def close_sync(self, timeout: float = 5.0):
+        """Close every pooled session from synchronous code, e.g. at interpreter exit."""
+        if self._sessions and not self.background.in_loop():
+            try:
+                self.background.submit(self._close_all()).result(timeout)
+            except Exception as e:
+                logger.warning(f"Error closing MCP sessions: {e}")
+
+
+_background_loop = BackgroundLoop()
+
+
+def get_background_loop() -> BackgroundLoop:
+    """Return the loop thread shared by the session pool and run_sync."""
+    return _background_loop
+
+
+def run_sync(coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    """
+    Run a coroutine on the shared background loop and wait for its result.
+
+    Unlike asyncio.run this reuses one loop for every call and can be used from
+    a thread that already runs an event loop, which is how CrewAI invokes tools
+    from async crews. It cannot be called from the background loop itself.
+
+    Args:
+        coro: Coroutine to run
+        timeout: Seconds to wait before raising TimeoutError, None waits forever
+
+    Returns:
+        The coroutine's result
+    """
+    if _background_loop.in_loop():
+        coro.close()
+        raise RuntimeError("run_sync() called from the MCP runtime loop, await the coroutine instead")
+    return _background_loop.submit(coro).result(timeout)
+
+
+_session_pool: Optional[MCPSessionPool] = None
+_session_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> MCPSessionPool:
+    """Return the process-wide MCP session pool, configured from the environment on first use."""
+    global _session_pool
+    if _session_pool is None:
+        with _session_pool_lock:
+            if _session_pool is None:
+                _session_pool = MCPSessionPool(
+                    max_concurrent_calls=int(os.getenv("MCP_MAX_CONCURRENT_CALLS", "4")),
+                    health_check_interval=float(os.getenv("MCP_HEALTH_CHECK_INTERVAL", "60")),
+                    connect_timeout=float(os.getenv("MCP_CONNECT_TIMEOUT", "30")),
+                    call_timeout=float(os.getenv("MCP_CALL_TIMEOUT", "120")),
+                    background=_background_loop
+                )
+                atexit.register(_session_pool.close_sync)
+    return _session_pool
+
+
+def parse_tool_catalogue(tools_result: Any) -> Dict[str, Dict[str, Any]]:
+    """Turn a list_tools result into {name: {description, required, properties}}."""
+    catalogue = {}
+    for tool in getattr(tools_result, "tools", None) or []:
+        if not hasattr(tool, "name") or not hasattr(tool, "description"):
+            continue
+        schema = getattr(tool, "inputSchema", None)
+        if not isinstance(schema, dict):
+            schema = {}
+        catalogue[tool.name] = {
+            "description": tool.description,
+            "required": schema.get("required", []),
+            "properties": schema.get("properties", {})
+        }
+    return catalogue
+
+
+class ToolCatalogue:
+    """
+    TTL-bound cache of MCP tool catalogues keyed by server URL.
+
+    Catalogues are fetched lazily through the session pool, concurrent misses
+    for one URL share a single list_tools call, and when ``path`` is set the
+    cache is persisted as JSON so new processes start warm. URLs carry
+    credentials, so only their hashes are written to disk.
+    """
+
+    def __init__(self, pool: MCPSessionPool, ttl: float = 3600.0, path: Optional[str] = None):
+        self.pool = pool
+        self.ttl = ttl
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._disk_loaded = False
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _load_disk(self):
+        if self._disk_loaded:
+            return
+        self._disk_loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+            for key, entry in entries.items():
+                self._entries.setdefault(key, entry)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read tool catalogue cache {self.path}: {e}")
+
+    def _save_disk(self):
+        with self._lock:
+            entries = dict(self._entries)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write tool catalogue cache {self.path}: {e}")
+
+    def cached(self, url: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Return the catalogue for url if it is cached and fresh, without fetching."""
+        with self._lock:
+            self._load_disk()
+            entry = self._entries.get(self.key(url))
+        if entry is None or time.time() - entry["fetched_at"] > self.ttl:
+            return None
+        return entry["tools"]
+
+    async def get(self, url: str, refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the catalogue of the MCP server at url, fetching it on a miss.
+
+        Args:
+            url: Server URL
+            refresh: Fetch even when a fresh catalogue is cached
+
+        Returns:
+            Mapping of tool name to description, required parameters and properties
+        """
+        if not refresh:
+            tools = self.cached(url)
+            if tools is not None:
+                return tools
+        return await self.pool.background.run_async(self._get(url))
+
+    async def _get(self, url: str) -> Dict[str, Dict[str, Any]]:
+        # Runs on the background loop, so _pending needs no lock
+        key = self.key(url)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch(url, key))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _fetch(self, url: str, key: str) -> Dict[str, Dict[str, Any]]:
+        tools = parse_tool_catalogue(await self.pool.list_tools(url))
+        with self._lock:
+            self._entries[key] = {"fetched_at": time.time(), "tools": tools}
+        logger.info(f"Cached {len(tools)} tools from {redact_url(url)}")
+        if self.path:
+            await asyncio.get_running_loop().run_in_executor(None, self._save_disk)
+        return tools
+
+    def invalidate(self, url: Optional[str] = None):
+        """Drop the catalogue of one server, or of every server when url is None."""
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self.key(url), None)
+        if self.path:
+            self._save_disk()
+
+
+_tool_catalogue: Optional[ToolCatalogue] = None
+
+
+def get_tool_catalogue() -> ToolCatalogue:
+    """Return the process-wide tool catalogue cache, configured from the environment on first use."""
+    global _tool_catalogue
+    if _tool_catalogue is None:
+        pool = get_session_pool()
+        with _session_pool_lock:
+            if _tool_catalogue is None:
+                _tool_catalogue = ToolCatalogue(
+                    pool,
+                    ttl=float(os.getenv("MCP_CATALOGUE_TTL", "3600")),
+                    path=os.getenv("MCP_CATALOGUE_PATH") or None
+                )
+    return _tool_catalogue
+
+
+# Read-only operations whose results may be reused, with their TTLs in seconds
+DEFAULT_RESULT_TTLS: Dict[str, float] = {
+    "google_search": 3600.0,
+    "scrape": 3600.0,
+    "search_repositories": 900.0,
+    "search_code": 900.0,
+    "search_issues": 300.0,
+    "search_users": 900.0,
+    "get_file_contents": 300.0,
+    "list_commits": 300.0,
+    "list_issues": 120.0,
+    "get_issue": 120.0,
+    "list_pull_requests": 120.0,
+    "get_pull_request": 120.0
+}
+
+
+def canonical_parameters(parameters: Optional[Dict[str, Any]]) -> str:
+    """Serialize parameters deterministically, ignoring private keys such as _timestamp."""
+    public = {k: v for k, v in (parameters or {}).items() if not str(k).startswith("_")}
+    return json.dumps(public, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ResultCache:
+    """
+    TTL cache for the results of idempotent MCP operations.
+
+    Only operations listed in ``ttls`` are cached. Keys combine the server URL,
+    which identifies the account, the operation and the canonicalized
+    parameters. Entries live in an LRU memory tier and, when ``db_path`` is
+    set, in a SQLite tier that survives restarts.
+    """
+
+    def __init__(self,
+                 ttls: Optional[Dict[str, float]] = None,
+                 max_entries: int = 512,
+                 db_path: Optional[str] = None):
+        self.ttls = dict(DEFAULT_RESULT_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._puts = 0
+
+    def is_cacheable(self, operation: str) -> bool:
+        return self.ttls.get(operation, 0) > 0
+
+    @staticmethod
+    def key(url: str, operation: str, parameters: Optional[Dict[str, Any]]) -> str:
+        material = "\0".join([url, operation, canonical_parameters(parameters)])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(os.path.abspath(self.db_path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def get(self, url: str, operation: str, parameters: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Return the cached result of a call, or None on a miss or for uncacheable operations."""
+        if not self.is_cacheable(operation):
+            return None
+        key = self.key(url, operation, parameters)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._memory[key]
+                entry = None
+            if entry is None and self.db_path:
+                row = self._connection().execute(
+                    "SELECT expires_at, value FROM results WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, url: str, operation: str, parameters: Optional[Dict[str, Any]], value: str):
+        """Cache the result of a successful call if the operation is cacheable."""
+        if not self.is_cacheable(operation):
+            return
+        key = self.key(url, operation, parameters)
+        entry = (time.time() + self.ttls[operation], str(value))
+        with self._lock:
+            self._remember(key, entry)
+            if self.db_path:
+                db = self._connection()
+                db.execute("INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)", (key, value, entry[0]))
+                self._puts += 1
+                if self._puts % 100 == 0:
+                    db.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+                db.commit()
+
+    def _remember(self, key: str, entry: Tuple[float, str]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.db_path:
+                self._connection().execute("DELETE FROM results")
+                self._connection().commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._memory)
+            }
+
+
+def parse_ttl_overrides(value: str) -> Dict[str, float]:
+    """Parse "operation=seconds,operation=seconds", a TTL of 0 disables caching for an operation."""
+    ttls = {}
+    for item in value.split(","):
+        if "=" in item:
+            operation, seconds = item.split("=", 1)
+            ttls[operation.strip()] = float(seconds)
+    return ttls
+
+
+_result_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    """Return the process-wide result cache, configured from the environment on first use."""
+    global _result_cache
+    if _result_cache is None:
+        with _session_pool_lock:
+            if _result_cache is None:
+                ttls = dict(DEFAULT_RESULT_TTLS)
+                ttls.update(parse_ttl_overrides(os.getenv("MCP_RESULT_CACHE_TTLS", "")))
+                if os.getenv("MCP_RESULT_CACHE", "true").lower() in ("0", "false", "no"):
+                    ttls = {}
+                _result_cache = ResultCache(
+                    ttls=ttls,
+                    max_entries=int(os.getenv("MCP_RESULT_CACHE_SIZE", "512")),
+                    db_path=os.getenv("MCP_RESULT_CACHE_PATH") or None
+                )
+    return _result_cache
+
+
+BatchOperation = Union[Dict[str, Any], Sequence[Any]]
+
+
+def normalize_batch_operation(item: BatchOperation) -> Tuple[str, Dict[str, Any]]:
+    """Accept {"operation": ..., "parameters": ...} or (operation, parameters) and return the pair."""
+    if isinstance(item, dict):
+        return item["operation"], item.get("parameters") or {}
+    operation, parameters = (list(item) + [None])[:2]
+    return operation, parameters or {}
+
+
+class BatchOperationsMixin:
+    """
+    Adds concurrent batch calls to an MCP tool.
+
+    The tool must implement ``async call_operation(operation, parameters)``.
+    Calls share the tool's pooled session, at most ``max_concurrency`` run at
+    once, and results come back in input order as
+    {"operation", "parameters", "result", "error"} dicts, with the error of a
+    failed item recorded instead of failing the whole batch.
+    """
+
+    async def arun_batch(self,
+                         operations: List[BatchOperation],
+                         max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Run several independent operations concurrently, results in input order."""
+        limit = max_concurrency or int(os.getenv("MCP_BATCH_CONCURRENCY", "4"))
+        semaphore = asyncio.Semaphore(max(1, limit))
+
+        async def run_one(item: BatchOperation) -> Dict[str, Any]:
+            try:
+                operation, parameters = normalize_batch_operation(item)
+            except (KeyError, TypeError, ValueError) as e:
+                return {"operation": None, "parameters": None, "result": None, "error": f"Invalid batch item: {e}"}
+            async with semaphore:
+                try:
+                    result = await self.call_operation(operation, parameters)
+                    return {"operation": operation, "parameters": parameters, "result": result, "error": None}
+                except Exception as e:
+                    return {"operation": operation, "parameters": parameters, "result": None, "error": str(e)}
+
+        return list(await asyncio.gather(*(run_one(item) for item in operations)))
+
+    def run_batch(self,
+                  operations: List[BatchOperation],
+                  max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Synchronous arun_batch, run on the shared runtime loop."""
+        return run_sync(self.arun_batch(operations, max_concurrency))
+
+
+_UNPARSED = object()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token."""
+    return len(text) // 4 + 1
+
+
+def shrink_json(value: Any, max_items: int, max_chars: int) -> Any:
+    """Copy a JSON value keeping at most max_items per list and max_chars per string."""
+    if isinstance(value, dict):
+        return {key: shrink_json(item, max_items, max_chars) for key, item in value.items()}
+    if isinstance(value, list):
+        kept = [shrink_json(item, max_items, max_chars) for item in value[:max_items]]
+        if len(value) > max_items:
+            kept.append(f"... {len(value) - max_items} more items")
+        return kept
+    if isinstance(value, str) and len(value) > max_chars:
+        return f"{value[:max_chars]}... [{len(value) - max_chars} more characters]"
+    return value
+
+
+class ToolResult(str):
+    """
+    The text returned by an MCP call, usable anywhere a str is.
+
+    ``data`` parses the text as JSON on first access and caches it, so logging
+    a summary and rendering share one parse, and a result that is returned
+    unchanged is never parsed or re-serialized at all.
+    """
+
+    def __new__(cls, text: str, data: Any = _UNPARSED):
+        result = super().__new__(cls, text)
+        result._data = data
+        return result
+
+    @property
+    def data(self) -> Any:
+        """The parsed JSON, or None when the text isn't JSON."""
+        if self._data is _UNPARSED:
+            try:
+                self._data = json.loads(self)
+            except ValueError:
+                self._data = None
+        return self._data
+
+    @property
+    def is_json(self) -> bool:
+        return self.data is not None
+
+    def render(self, max_tokens: Optional[int] = None, compact: bool = False) -> "ToolResult":
+        """
+        Return the result sized for an LLM prompt.
+
+        Args:
+            max_tokens: Token budget, None keeps the result whole
+            compact: Re-serialize JSON without whitespace even when it fits
+
+        Returns:
+            This result when it already fits, otherwise a compact JSON
+            rendering with lists and strings cut down until it fits, or
+            truncated text for non-JSON results
+        """
+        fits = max_tokens is None or estimate_tokens(self) <= max_tokens
+        if fits and not compact:
+            return self
+        if self.data is None:
+            if fits:
+                return self
+            return ToolResult(f"{self[:max_tokens * 4]}... [truncated {len(self) - max_tokens * 4} characters]")
+
+        text = json.dumps(self.data, separators=(",", ":"), ensure_ascii=False)
+        if max_tokens is None or estimate_tokens(text) <= max_tokens:
+            return ToolResult(text, self.data)
+        for max_items, max_chars in ((20, 2000), (10, 1000), (5, 400), (3, 200), (1, 100)):
+            data = shrink_json(self.data, max_items, max_chars)
+            text = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+            if estimate_tokens(text) <= max_tokens:
+                return ToolResult(text, data)
+        return ToolResult(f"{text[:max_tokens * 4]}... [truncated]")
@@ -17,11 +17,62 @@ from typing import Dict, Any, List, Optional, Tuple
 from openai import AsyncOpenAI
 from supabase import Client
 from pydantic_ai import RunContext
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from archon.utils.embeddings import get_embedding_service
+from archon.utils.llm_cache import cached_completion
+from archon.utils.supabase_repository import get_supabase_repository, MCP_TEMPLATE_SUMMARY_COLUMNS
 
 # Setup logging
 logger = logging.getLogger('mcp_templates')
 
+# Shared embedding cache (see archon/utils/embeddings.py)
+embedding_service = get_embedding_service()
+
+class MCPTemplateRepository:
+    """
+    Projection-aware access to the mcp_templates table.
+    
+    Candidate templates are fetched with their summary columns only, in batches;
+    code columns are loaded separately for the template that is actually used.
+    Queries go through the shared non-blocking Supabase repository.
+    """
+    
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+        self.db = get_supabase_repository(supabase)
+    
+    async def fetch_summaries(self, template_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        """Fetch the summary columns of several templates in one query, keyed by id."""
+        return await self.db.fetch_mcp_template_summaries(template_ids)
+    
+    async def search_any(self, columns: List[str], terms: List[str]) -> List[Dict[str, Any]]:
+        """Return the summaries of templates where any column contains any term, in one OR-filtered query."""
+        return await self.db.search_mcp_templates(columns, terms)
+    
+    async def all_summaries(self) -> List[Dict[str, Any]]:
+        """Return the summaries of every template."""
+        return await self.db.list_mcp_template_summaries()
+    
+    async def top_k(self, query_embedding: List[float], k: int) -> List[Dict[str, Any]]:
+        """Return the k most similar templates from the local template index."""
+        return await self.db.top_mcp_templates(query_embedding, k)
+    
+    async def load_code(self, template_id: Any) -> Dict[str, str]:
+        """Load the code columns of a single template."""
+        return await self.db.get_mcp_template_code(template_id)
+    
+    def to_adapter(self, template: Dict[str, Any], similarity: float) -> "TemplateAdapter":
+        """Build a template adapter whose code is loaded on first use."""
+        return TemplateAdapter(
+            template_id=template['id'],
+            folder_name=template['folder_name'],
+            purpose=template['purpose'],
+            similarity=similarity,
+            metadata=template.get('metadata') or {},
+            repository=self,
+            code_loaded=False
+        )
+
 # Template adapter class to store required information
 @dataclass
 class TemplateAdapter:
@@ -29,12 +80,27 @@ class TemplateAdapter:
     folder_name: str
     purpose: str
     similarity: float
-    agents_code: str
-    tasks_code: str
-    crew_code: str
-    metadata: Dict[str, Any]
+    agents_code: str = ""
+    tasks_code: str = ""
+    crew_code: str = ""
+    metadata: Dict[str, Any] = field(default_factory=dict)
     main_code: str = ""  # Add main_code field with default empty string
     run_agent_code: str = ""  # Add run_agent_code field with default empty string
+    repository: Optional[MCPTemplateRepository] = field(default=None, repr=False, compare=False)
+    code_loaded: bool = True
+    
+    async def load_code(self) -> "TemplateAdapter":
+        """Load the template's code columns if they haven't been fetched yet."""
+        if not self.code_loaded and self.repository is not None:
+            code = await self.repository.load_code(self.template_id)
+            self.agents_code = code['agents_code']
+            self.tasks_code = code['tasks_code']
+            self.crew_code = code['crew_code']
+            self.main_code = code['main_code']
+            self.run_agent_code = code['run_agent_code']
+            self.code_loaded = True
+            logger.info(f"Loaded code for template {self.folder_name}")
+        return self
     
     @property
     def agent_names(self) -> List[str]:
@@ -42,7 +108,7 @@ class TemplateAdapter:
         if self.metadata and 'agent_names' in self.metadata:
             return self.metadata['agent_names']
         else:
-            # Extract agent names from code if not in metadata
+            # Extract agent names from code if not in metadata, which needs load_code() first
             matches = re.findall(r'([a-zA-Z0-9_]+)\s*=\s*Agent\(', self.agents_code)
             return matches
             
@@ -54,13 +120,9 @@ class TemplateAdapter:
         return []
 
 async def get_embedding(text: str, openai_client: AsyncOpenAI) -> List[float]:
-    """Get embedding vector from OpenAI."""
+    """Get embedding vector from OpenAI, served from the shared embedding cache when possible."""
     try:
-        response = await openai_client.embeddings.create(
-            model=os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small'),
-            input=text
-        )
-        return response.data[0].embedding
+        return await embedding_service.embed(text, openai_client)
     except Exception as e:
         logger.error(f"Error getting embedding: {e}")
         return [0] * 1536  # Return zero vector on error
@@ -94,6 +156,7 @@ async def find_matching_mcp_template(
     """
     try:
         logger.info(f"Searching for MCP templates matching query: '{user_query[:100]}...'")
+        repository = MCPTemplateRepository(supabase)
         
         # Extract tool types or names from tools_data
         tool_types = []
@@ -194,95 +257,50 @@ async def find_matching_mcp_template(
         logger.info(f"Combined search text: '{combined_search[:100]}...'")
         logger.info(f"Key matching terms: {', '.join(key_terms)}")
         
-        # Try direct purpose-based matching first
+        # Match literal tool names/types against purpose and folder_name in a single query,
+        # off the event loop since the supabase client is synchronous
+        search_terms = list(dict.fromkeys(term for term in tool_names + tool_types if term and len(term) >= 3))
         purpose_matches = []
+        folder_matches = []
         
-        # Get templates that might match the purpose semantically
-        # First try direct purpose search for literal tool names/types
-        for term in tool_names + tool_types:
-            if not term or len(term) < 3:
-                continue
-                
+        if search_terms:
             try:
-                # Search in purpose field
-                search_pattern = f"%{term}%"
-                purpose_result = supabase.table("mcp_templates").select("*").ilike("purpose", search_pattern).execute()
-                
-                if purpose_result.data:
-                    logger.info(f"Found {len(purpose_result.data)} purpose matches for '{term}'")
-                    
-                    for template in purpose_result.data:
-                        try:
-                            # Make sure all required fields are present
-                            if not all(k in template for k in ['id', 'folder_name', 'purpose', 'agents_code', 'tasks_code', 'crew_code']):
-                                logger.warning(f"Template {template.get('id', 'unknown')} is missing required fields, skipping")
-                                continue
-                                
-                            # Boost similarity score based on how specific the match is
-                            sim_score = 0.85  # Base score for purpose matches
-                            
-                            # Higher score for exact tool name matches
-                            folder_lower = template['folder_name'].lower()
-                            if any(t in folder_lower for t in tool_types) or any(n in folder_lower for n in tool_names):
-                                sim_score = 0.95
-                                logger.info(f"Boosted score for {template['folder_name']} - exact tool name/type match")
-                            
-                            adapter = TemplateAdapter(
-                                template_id=template['id'],
-                                folder_name=template['folder_name'],
-                                purpose=template['purpose'],
-                                similarity=sim_score,
-                                agents_code=template['agents_code'],
-                                tasks_code=template['tasks_code'],
-                                crew_code=template['crew_code'],
-                                metadata=template.get('metadata', {}),
-                                main_code=template.get('main_code', ''),
-                                run_agent_code=template.get('run_agent_code', '')
-                            )
-                            purpose_matches.append(adapter)
-                        except Exception as e:
-                            logger.warning(f"Error processing purpose match: {e}")
-                            continue
+                term_results = await repository.search_any(["purpose", "folder_name"], search_terms)
+                logger.info(f"Found {len(term_results)} purpose/folder matches for terms: {', '.join(search_terms)}")
             except Exception as e:
-                logger.warning(f"Error during purpose search for term '{term}': {e}")
-
-        # Try direct folder name matching next
-        folder_matches = []
-        for tool_type in tool_types + tool_names:
-            # Look for pattern in folder_name
-            if tool_type and len(tool_type) >= 3:
+                logger.warning(f"Error during purpose/folder search: {e}")
+                term_results = []
+            
+            seen_term_ids = set()
+            for template in term_results:
                 try:
-                    search_pattern = f"%{tool_type}%"
-                    folder_result = supabase.table("mcp_templates").select("*").ilike("folder_name", search_pattern).execute()
+                    # Make sure all required fields are present
+                    if not all(k in template for k in MCP_TEMPLATE_SUMMARY_COLUMNS):
+                        logger.warning(f"Template {template.get('id', 'unknown')} is missing required fields, skipping")
+                        continue
+                    if template['id'] in seen_term_ids:
+                        continue
+                    seen_term_ids.add(template['id'])
                     
-                    if folder_result.data:
-                        logger.info(f"Found {len(folder_result.data)} folder matches for '{tool_type}'")
+                    folder_lower = (template['folder_name'] or '').lower()
+                    purpose_lower = (template['purpose'] or '').lower()
+                    
+                    if any(ilike_contains(term, folder_lower) for term in search_terms):
+                        # High similarity for folder name matches
+                        folder_matches.append(repository.to_adapter(template, 0.92))
+                    elif any(ilike_contains(term, purpose_lower) for term in search_terms):
+                        # Boost similarity score based on how specific the match is
+                        sim_score = 0.85  # Base score for purpose matches
+                        
+                        # Higher score for exact tool name matches
+                        if any(t in folder_lower for t in tool_types) or any(n in folder_lower for n in tool_names):
+                            sim_score = 0.95
+                            logger.info(f"Boosted score for {template['folder_name']} - exact tool name/type match")
                         
-                        for template in folder_result.data:
-                            try:
-                                # Make sure all required fields are present
-                                if not all(k in template for k in ['id', 'folder_name', 'purpose', 'agents_code', 'tasks_code', 'crew_code']):
-                                    logger.warning(f"Template {template.get('id', 'unknown')} is missing required fields, skipping")
-                                    continue
-                                
-                                adapter = TemplateAdapter(
-                                    template_id=template['id'],
-                                    folder_name=template['folder_name'],
-                                    purpose=template['purpose'],
-                                    similarity=0.92,  # High similarity for folder name matches
-                                    agents_code=template['agents_code'],
-                                    tasks_code=template['tasks_code'],
-                                    crew_code=template['crew_code'],
-                                    metadata=template.get('metadata', {}),
-                                    main_code=template.get('main_code', ''),
-                                    run_agent_code=template.get('run_agent_code', '')
-                                )
-                                folder_matches.append(adapter)
-                            except Exception as e:
-                                logger.warning(f"Error processing folder match: {e}")
-                                continue
+                        purpose_matches.append(repository.to_adapter(template, sim_score))
                 except Exception as e:
-                    logger.warning(f"Error during folder name search for term '{tool_type}': {e}")
+                    logger.warning(f"Error processing purpose/folder match: {e}")
+                    continue
         
         # Combine and deduplicate direct matches
         direct_matches = []
@@ -314,24 +332,25 @@ async def find_matching_mcp_template(
             # Ensure the threshold is a float
             match_threshold = float(threshold)
             
-            res = supabase.rpc(
-                'match_mcp_templates',
-                {
-                    'query_embedding': query_embedding,
-                    'match_threshold': match_threshold,
-                    'match_count': int(limit * 3)  # Get more results for better filtering, ensure it's an integer
-                }
-            ).execute()
+            # Threshold-free top-k from the local template index, filtered client-side
+            candidates = await repository.top_k(
+                query_embedding,
+                int(limit * 3)  # Get more results for better filtering, ensure it's an integer
+            )
+            candidates = [item for item in candidates if float(item.get('similarity') or 0) > match_threshold]
             
-            if not res.data:
+            if not candidates:
                 logger.info("No matching templates found from embedding search.")
                 return []
                 
-            logger.info(f"Found {len(res.data)} potential template matches from embedding search")
+            logger.info(f"Found {len(candidates)} potential template matches from embedding search")
+            
+            # Fetch summaries in one query for any candidates that came back without them
+            missing_ids = [item['id'] for item in candidates if not all(k in item for k in MCP_TEMPLATE_SUMMARY_COLUMNS)]
+            summaries = await repository.fetch_summaries(missing_ids)
             
-            # Get complete template data for each match
             template_matches = []
-            for item in res.data:
+            for item in candidates:
                 try:
                     template_id = item['id']
                     
@@ -343,13 +362,9 @@ async def find_matching_mcp_template(
                         logger.warning(f"Could not convert similarity value to float: {item.get('similarity')}")
                         similarity = 0.5
                     
-                    # Get the complete template data
-                    template_data = supabase.table("mcp_templates").select("*").eq("id", template_id).execute()
-                    
-                    if not template_data.data:
+                    template = item if template_id not in summaries else {**item, **summaries[template_id]}
+                    if not all(k in template for k in MCP_TEMPLATE_SUMMARY_COLUMNS):
                         continue
-                        
-                    template = template_data.data[0]
                     
                     # Boost similarity score based on matches
                     similarity_score = similarity
@@ -385,19 +400,8 @@ async def find_matching_mcp_template(
                     # Cap similarity score at 0.99
                     similarity_score = min(similarity_score, 0.99)
                     
-                    # Create a template adapter
-                    adapter = TemplateAdapter(
-                        template_id=template_id,
-                        folder_name=template['folder_name'],
-                        purpose=template['purpose'],
-                        similarity=similarity_score,
-                        agents_code=template['agents_code'],
-                        tasks_code=template['tasks_code'],
-                        crew_code=template['crew_code'],
-                        metadata=template.get('metadata', {}),
-                        main_code=template.get('main_code', ''),
-                        run_agent_code=template.get('run_agent_code', '')
-                    )
+                    # Create a template adapter, its code is loaded only if it gets used
+                    adapter = repository.to_adapter(template, similarity_score)
                     
                     template_matches.append(adapter)
                 except Exception as e:
@@ -433,14 +437,14 @@ async def find_matching_mcp_template(
         logger.info("Attempting text-based matching as fallback")
         text_matches = []
         
-        # Get all templates
-        all_templates = supabase.table("mcp_templates").select("*").execute()
+        # Get all template summaries, without their code
+        all_templates = await repository.all_summaries()
         
-        if all_templates.data:
-            logger.info(f"Checking {len(all_templates.data)} templates for text-based matching")
+        if all_templates:
+            logger.info(f"Checking {len(all_templates)} templates for text-based matching")
             
             # Calculate simple text match scores
-            for template in all_templates.data:
+            for template in all_templates:
                 try:
                     # Calculate multiple similarity metrics
                     similarity_score = 0.0
@@ -489,22 +493,11 @@ async def find_matching_mcp_template(
                         scaled_score = min(0.95, similarity_score)
                         
                         # Make sure all required fields are present
-                        if not all(k in template for k in ['id', 'folder_name', 'purpose', 'agents_code', 'tasks_code', 'crew_code']):
+                        if not all(k in template for k in MCP_TEMPLATE_SUMMARY_COLUMNS):
                             logger.warning(f"Template {template.get('id', 'unknown')} is missing required fields, skipping")
                             continue
                         
-                        adapter = TemplateAdapter(
-                            template_id=template['id'],
-                            folder_name=template['folder_name'],
-                            purpose=template['purpose'],
-                            similarity=scaled_score,
-                            agents_code=template['agents_code'],
-                            tasks_code=template['tasks_code'],
-                            crew_code=template['crew_code'],
-                            metadata=template.get('metadata', {}),
-                            main_code=template.get('main_code', ''),
-                            run_agent_code=template.get('run_agent_code', '')
-                        )
+                        adapter = repository.to_adapter(template, scaled_score)
                         text_matches.append(adapter)
                 except Exception as e:
                     logger.warning(f"Error processing text-based match: {e}")
@@ -530,6 +523,11 @@ async def find_matching_mcp_template(
         logger.error(f"Error finding matching MCP templates: {e}")
         return []
 
+def ilike_contains(term: str, text: str) -> bool:
+    """Check whether text matches the SQL pattern %term% case-insensitively, as ilike would."""
+    pattern = re.escape(term.lower()).replace('_', '.').replace('%', '.*')
+    return re.search(pattern, text.lower()) is not None
+
 def extract_key_terms(text: str) -> set:
     """
     Extract key terms from text for better template matching.
@@ -1117,6 +1115,61 @@ This directory contains several Python scripts:
     except Exception as e:
         logger.error(f"Error creating executable scripts: {e}")
 
+def as_script(content: Any, file_name: str) -> str:
+    """
+    Normalize generated script content to a string starting with a python shebang.
+    
+    Args:
+        content: Generated content, possibly a dict keyed by file name
+        file_name: Name of the file the content is for
+        
+    Returns:
+        Script content
+    """
+    if not isinstance(content, str):
+        logger.warning(f"{file_name} code is not a string, it's a {type(content)}. Attempting to convert.")
+        if isinstance(content, dict) and file_name in content:
+            content = content[file_name]
+        else:
+            content = str(content)
+    if not content.startswith("#!/usr/bin/env python"):
+        content = "#!/usr/bin/env python3\n" + content
+    return content
+
+def write_files_atomically(output_dir: str, files: Dict[str, str], executable: Optional[set] = None) -> None:
+    """
+    Write generated files so each appears complete or not at all.
+    
+    Every file is written to a temporary name first and then renamed over the
+    target, so an interrupted run never leaves a half-written project.
+    
+    Args:
+        output_dir: Directory to write the files to
+        files: File contents keyed by file name
+        executable: Names of files to make executable
+    """
+    executable = executable or set()
+    os.makedirs(output_dir, exist_ok=True)
+    temp_paths = {}
+    try:
+        for file_name, content in files.items():
+            temp_path = os.path.join(output_dir, f".{file_name}.{os.getpid()}.tmp")
+            temp_paths[file_name] = temp_path
+            with open(temp_path, "w") as f:
+                f.write(content)
+            if file_name in executable:
+                try:
+                    os.chmod(temp_path, 0o755)
+                except Exception as e:
+                    logger.warning(f"Could not make {file_name} executable: {e}")
+        for file_name, temp_path in temp_paths.items():
+            os.replace(temp_path, os.path.join(output_dir, file_name))
+            logger.info(f"Saved {file_name} to {os.path.join(output_dir, file_name)}")
+    finally:
+        for temp_path in temp_paths.values():
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
 async def generate_from_template(
     user_query: str,
     tools_data: Dict[str, Any],
@@ -1154,177 +1207,85 @@ async def generate_from_template(
             logger.warning("No matching templates found")
             return {}
             
-        # Use the best matching template
-        template = templates[0]
+        # Use the best matching template, loading its code now that it's chosen
+        template = await templates[0].load_code()
         logger.info(f"Using template: {template.folder_name} (similarity: {template.similarity:.3f})")
         logger.info(f"Template purpose: {template.purpose[:100]}...")
         
-        # Adapt the agents code
-        logger.info("Adapting agents code...")
-        adapted_agents = await adapt_agents_code(
-            template,
-            tool_class_names,
-            openai_client,
-            model_name,
-            user_query
-        )
-        
-        # Save the adapted agents code to file
-        agents_file = os.path.join(output_dir, "agents.py")
-        with open(agents_file, "w") as f:
-            f.write(adapted_agents)
-        logger.info(f"Saved adapted agents.py to {agents_file}")
-        
-        # No need to extract agent names - go directly to modifying the code for user requirements
-        
-        # Prepare results
-        results = {"agents.py": adapted_agents}
-        
-        # Now adapt the tasks code
-        tasks_code = await direct_requirements_adaptation(
-            user_query,
-            {
-                "tasks.py": template.tasks_code
-            },
-            tools_data,
-            tool_class_names,
-            openai_client,
-            model_name
-        )
-        
-        # Save the tasks code
-        tasks_file = os.path.join(output_dir, "tasks.py")
-        with open(tasks_file, "w") as f:
-            f.write(tasks_code["tasks.py"])
-        logger.info(f"Saved adapted tasks.py to {tasks_file}")
-        
-        results["tasks.py"] = tasks_code["tasks.py"]
-        
-        # Now adapt the crew code
-        crew_code = await direct_requirements_adaptation(
-            user_query,
-            {
-                "crew.py": template.crew_code
-            },
-            tools_data,
-            tool_class_names,
-            openai_client,
-            model_name
-        )
+        # Extract the customization directives once and share them between the file adaptations
+        directives = await extract_customization_directives(user_query, openai_client)
         
-        # Save the crew code
-        crew_file = os.path.join(output_dir, "crew.py")
-        with open(crew_file, "w") as f:
-            f.write(crew_code["crew.py"])
-        logger.info(f"Saved adapted crew.py to {crew_file}")
+        # Independent files are adapted concurrently, bounded by ADAPTATION_CONCURRENCY;
+        # run_agent.py uses main.py as its reference so it waits for main.py only
+        semaphore = asyncio.Semaphore(max(1, int(os.getenv("ADAPTATION_CONCURRENCY", "4"))))
         
-        results["crew.py"] = crew_code["crew.py"]
+        async def bounded(coro):
+            async with semaphore:
+                return await coro
         
-        # Generate main.py if main_code is available in the template
-        if hasattr(template, 'main_code') and template.main_code:
-            logger.info("Adapting main.py code...")
-            main_code = await direct_requirements_adaptation(
+        async def adapt_file(file_name: str, template_code: str) -> str:
+            logger.info(f"Adapting {file_name} code...")
+            adapted = await bounded(direct_requirements_adaptation(
                 user_query,
                 {
-                    "main.py": template.main_code
+                    file_name: template_code
                 },
                 tools_data,
                 tool_class_names,
                 openai_client,
-                model_name
-            )
-            
-            # Save the main.py file
-            main_file = os.path.join(output_dir, "main.py")
-            content = main_code
-            if not isinstance(content, str):
-                logger.warning(f"main_code is not a string, it's a {type(content)}. Attempting to convert.")
-                if isinstance(content, dict) and "main.py" in content:
-                    content = content["main.py"]
-                else:
-                    content = str(content)
-                    
-            if not content.startswith("#!/usr/bin/env python"):
-                content = "#!/usr/bin/env python3\n" + content
-                
-            with open(main_file, "w") as f:
-                f.write(content)
-                
-            # Make it executable
-            try:
-                os.chmod(main_file, 0o755)
-                logger.info(f"Made main.py executable")
-            except Exception as e:
-                logger.warning(f"Could not make main.py executable: {e}")
-                
-            logger.info(f"Saved default main.py to {main_file}")
+                model_name,
+                directives=directives
+            ))
+            return adapted[file_name]
+        
+        async def adapt_main_and_run_agent() -> Tuple[str, str]:
+            if hasattr(template, 'main_code') and template.main_code:
+                main_code = await adapt_file("main.py", template.main_code)
+            else:
+                # Generate a default main.py file if not available in template
+                logger.info("Generating default main.py file...")
+                main_code = await bounded(generate_default_main_py(
+                    user_query,
+                    tool_class_names,
+                    openai_client,
+                    model_name
+                ))
+            main_code = as_script(main_code, "main.py")
             
-            results["main.py"] = content
-        else:
-            # Generate a default main.py file if not available in template
-            logger.info("Generating default main.py file...")
-            main_code = await generate_default_main_py(
+            logger.info("Generating run_agent.py file...")
+            run_agent_code = await bounded(generate_run_agent_py(
                 user_query,
                 tool_class_names,
                 openai_client,
-                model_name
-            )
-                
-            # Save the default main.py file
-            main_file = os.path.join(output_dir, "main.py")
-            content = main_code
-            if not isinstance(content, str):
-                logger.warning(f"main_code is not a string, it's a {type(content)}. Attempting to convert.")
-                if isinstance(content, dict) and "main.py" in content:
-                    content = content["main.py"]
-                else:
-                    content = str(content)
-                    
-            if not content.startswith("#!/usr/bin/env python"):
-                content = "#!/usr/bin/env python3\n" + content
-                
-            with open(main_file, "w") as f:
-                f.write(content)
-                
-            # Make it executable
-            try:
-                os.chmod(main_file, 0o755)
-                logger.info(f"Made main.py executable")
-            except Exception as e:
-                logger.warning(f"Could not make main.py executable: {e}")
-                
-            logger.info(f"Saved default main.py to {main_file}")
-            
-            results["main.py"] = content
-            
-        # Generate run_agent.py file
-        logger.info("Generating run_agent.py file...")
-        run_agent_code = await generate_run_agent_py(
-            user_query,
-            tool_class_names,
-            openai_client,
-            model_name,
-            results.get("main.py", "")
+                model_name,
+                main_code
+            ))
+            return main_code, as_script(run_agent_code, "run_agent.py")
+        
+        logger.info("Adapting agents code...")
+        adapted_agents, tasks_code, crew_code, (main_code, run_agent_code) = await asyncio.gather(
+            bounded(adapt_agents_code(
+                template,
+                tool_class_names,
+                openai_client,
+                model_name,
+                user_query
+            )),
+            adapt_file("tasks.py", template.tasks_code),
+            adapt_file("crew.py", template.crew_code),
+            adapt_main_and_run_agent()
         )
         
-        # Save the run_agent.py file
-        run_agent_file = os.path.join(output_dir, "run_agent.py")
-        with open(run_agent_file, "w") as f:
-            # Ensure it starts with shebang
-            if not run_agent_code.startswith("#!/usr/bin/env python"):
-                run_agent_code = "#!/usr/bin/env python3\n" + run_agent_code
-            f.write(run_agent_code)
-            
-        # Make it executable
-        try:
-            os.chmod(run_agent_file, 0o755)
-            logger.info(f"Made run_agent.py executable")
-        except Exception as e:
-            logger.warning(f"Could not make run_agent.py executable: {e}")
-            
-        logger.info(f"Saved run_agent.py to {run_agent_file}")
+        results = {
+            "agents.py": adapted_agents,
+            "tasks.py": tasks_code,
+            "crew.py": crew_code,
+            "main.py": main_code,
+            "run_agent.py": run_agent_code
+        }
         
-        results["run_agent.py"] = run_agent_code
+        # Write every file only once all adaptations have succeeded
+        write_files_atomically(output_dir, results, executable={"main.py", "run_agent.py"})
         
         # Also store tools.py content if available
         tools_py_path = os.path.join(output_dir, "tools.py")
@@ -1397,15 +1358,19 @@ async def extract_customization_directives(user_query: str, openai_client: Async
         For domain_terms, provide terms that are highly specific to the domain, not generic technology terms.
         """
         
-        response = await openai_client.chat.completions.create(
+        content = await cached_completion(
+            openai_client,
+            "extract_customization_directives",
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}],
+            similar_text=user_query,
+            validate=json.loads,
             temperature=0.3,
             max_tokens=500,
             response_format={"type": "json_object"}
         )
         
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         
         agent_count = result.get("agent_count", 3)  # Default to 3 if not specified
         domain_terms = result.get("domain_terms", ["specialized", "customized", "domain-specific"])
@@ -1698,7 +1663,8 @@ async def direct_requirements_adaptation(
     tools_data: Dict[str, Any],
     tool_class_names: List[str],
     openai_client: AsyncOpenAI,
-    model_name: str = "gpt-4o"
+    model_name: str = "gpt-4o",
+    directives: Optional[Tuple[int, List[str]]] = None
 ) -> Dict[str, str]:
     """
     Directly adapt template files to the user's requirements using a single prompt.
@@ -1713,6 +1679,7 @@ async def direct_requirements_adaptation(
         tool_class_names: List of tool class names
         openai_client: AsyncOpenAI client
         model_name: Model to use for adaptation
+        directives: (agent_count, domain_terms) from extract_customization_directives, extracted here if not given
         
     Returns:
         Dictionary of adapted files
@@ -1724,7 +1691,7 @@ async def direct_requirements_adaptation(
         detected_tool_types = tools_data.get("detected_tool_types", [])
         
         # Extract agent count and domain-specific terminology
-        agent_count, domain_terms = await extract_customization_directives(user_query, openai_client)
+        agent_count, domain_terms = directives or await extract_customization_directives(user_query, openai_client)
         
         # Create a comprehensive adaptation prompt for all files
         prompt = f"""
@@ -8,6 +8,7 @@ import os
 import sys
 import json
 import logging
+import shutil
 from typing import Dict, Any, List, Optional, Tuple
 from pydantic import BaseModel
 from pydantic_ai import Agent, ModelRetry, RunContext
@@ -19,6 +20,9 @@ from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter
 
 # Import template integration module
 from .mcp_template_integration import generate_from_template
+from archon.utils.embeddings import get_embedding_service
+from archon.utils.llm_cache import cached_completion
+from archon.utils.supabase_repository import get_supabase_repository
 
 # Create logs directory if it doesn't exist
 logs_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'logs')
@@ -37,10 +41,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger('mcp_tools')
 
+# Shared embedding cache (see archon/utils/embeddings.py)
+embedding_service = get_embedding_service()
+
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
+# Runtime module shipped with generated projects, it pools MCP sessions per server URL
+MCP_RUNTIME_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_runtime.py")
+
 # Reference examples of CrewAI-compatible MCP tools
 REFERENCE_EXAMPLES = {
     "serper": '''
@@ -52,11 +62,11 @@ import mcp
 import logging
 import datetime
 import time
-from mcp.client.websocket import websocket_client
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
+from mcp_runtime import get_session_pool, get_tool_catalogue, get_result_cache, run_sync, BatchOperationsMixin, ToolResult
 
 # Configure enhanced logging
 def setup_logging():
@@ -98,13 +108,15 @@ class SerperMCPToolParams(BaseModel):
         description="Parameters for the Serper operation"
     )
 
-class SerperMCPTool(BaseTool):
-    """Tool for interacting with Serper API using MCP"""
+class SerperMCPTool(BatchOperationsMixin, BaseTool):
+    """Tool for interacting with Serper API using MCP, run_batch() runs several operations concurrently"""
     name: str = "serper_mcp_tool"
     description: str = "Interact with Serper API to perform search operations, web scraping, and research."
     args_schema: type[BaseModel] = SerperMCPToolParams
     serper_api_key: str = ""
     url: str = ""
+    # Token budget for results returned to the agent, 0 returns them whole
+    max_result_tokens: int = int(os.getenv("MCP_RESULT_MAX_TOKENS", "0"))
     
     def __init__(self):
         super().__init__()
@@ -123,39 +135,27 @@ class SerperMCPTool(BaseTool):
             }
         )
         
-        # Cache for available operations
-        self._available_operations = None
-        
-        # Try to preload available operations
-        try:
-            asyncio.run(self._preload_operations())
-        except Exception as e:
-            serper_logger.warning(f"Could not preload operations: {str(e)}")
-        
         # Log initialization
         serper_logger.info("SerperMCPTool initialized")
         serper_logger.info(f"Serper API key: {self.serper_api_key[:5]}...{self.serper_api_key[-5:]}")
     
-    async def _preload_operations(self):
-        """Preload available operations for better logging"""
-        serper_logger.info("Preloading available Serper operations...")
-        async with websocket_client(self.url) as streams:
-            serper_logger.info("Connection established for preloading operations")
-            async with mcp.ClientSession(*streams) as session:
-                self._available_operations = await self._get_available_operations(session)
-                serper_logger.info(f"Preloaded {len(self._available_operations)} Serper operations")
-                
-                # Log all available operations
-                serper_logger.info("=" * 80)
-                serper_logger.info("AVAILABLE SERPER OPERATIONS:")
-                for i, (op_name, op_info) in enumerate(self._available_operations.items(), 1):
-                    serper_logger.info(f"{i}. {op_name}: {op_info.get('description', 'No description')}")
-                    if op_info.get('required'):
-                        serper_logger.info(f"   Required parameters: {', '.join(op_info.get('required', []))}")
-                serper_logger.info("=" * 80)
-    
     def _run(self, operation: str, parameters: Dict[str, Any] = None) -> str:
         """Run the Serper operation"""
+        # Wait on the shared runtime loop, which also works when called from a running event loop
+        try:
+            return run_sync(self.call_operation(operation, parameters))
+        except Exception as e:
+            return f"Error executing Serper operation: {str(e)}"
+    
+    async def _arun(self, operation: str, parameters: Dict[str, Any] = None) -> str:
+        """Run the Serper operation natively in async crews"""
+        try:
+            return await self.call_operation(operation, parameters)
+        except Exception as e:
+            return f"Error executing Serper operation: {str(e)}"
+    
+    async def call_operation(self, operation: str, parameters: Dict[str, Any] = None) -> str:
+        """Run the Serper operation with logging, raising on failure (used by run_batch)"""
         if parameters is None:
             parameters = {}
         
@@ -171,9 +171,9 @@ class SerperMCPTool(BaseTool):
         # Track execution time
         start_time = time.time()
         
-        # Run the async operation and wait for result
+        # Run the async operation
         try:
-            result = asyncio.run(self._run_async(operation, parameters))
+            result = await self._run_async(operation, parameters)
             
             # Calculate execution time
             execution_time = time.time() - start_time
@@ -190,7 +190,7 @@ class SerperMCPTool(BaseTool):
             execution_time = time.time() - start_time
             serper_logger.error(f"ERROR ({execution_time:.2f}s): {str(e)}")
             serper_logger.info("=" * 80)
-            return f"Error executing Serper operation: {str(e)}"
+            raise
     
     def _get_safe_parameters(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Create a copy of parameters safe for logging (no sensitive data)"""
@@ -210,10 +210,9 @@ class SerperMCPTool(BaseTool):
         if not result:
             return "Empty result"
             
-        # For JSON results
-        try:
-            result_obj = json.loads(result)
-            
+        # For JSON results, parsed at most once and shared with rendering
+        result_obj = result.data if isinstance(result, ToolResult) else ToolResult(result).data
+        if result_obj is not None:
             if isinstance(result_obj, dict):
                 # For dictionary responses
                 if 'organic' in result_obj:
@@ -228,7 +227,7 @@ class SerperMCPTool(BaseTool):
             elif isinstance(result_obj, list):
                 return f"Array with {len(result_obj)} items"
                 
-        except json.JSONDecodeError:
+        else:
             # For non-JSON results
             if len(result) > 100:
                 return f"Text response ({len(result)} characters)"
@@ -238,112 +237,80 @@ class SerperMCPTool(BaseTool):
     
     async def _run_async(self, operation: str, parameters: Dict[str, Any]) -> str:
         """Run the Serper operation asynchronously"""
-        # Log connection attempt
-        serper_logger.info("Connecting to Serper API...")
-        
-        # Connect to the Smithery server
-        async with websocket_client(self.url) as streams:
-            serper_logger.info("Connection established")
-            
-            async with mcp.ClientSession(*streams) as session:
-                # Get available operations if not cached
-                if self._available_operations is None:
-                    serper_logger.info("Fetching available Serper operations...")
-                    self._available_operations = await self._get_available_operations(session)
-                    
-                    # Log all available operations
-                    serper_logger.info("AVAILABLE SERPER OPERATIONS:")
-                    for i, (op_name, op_info) in enumerate(self._available_operations.items(), 1):
-                        serper_logger.info(f"{i}. {op_name}: {op_info.get('description', 'No description')}")
-                    
-                    serper_logger.info(f"Found {len(self._available_operations)} available operations")
-                
-                # Check if the operation is valid
-                if operation not in self._available_operations:
-                    available_ops = ", ".join(self._available_operations.keys())
-                    error_msg = f"Invalid operation: {operation}. Available operations: {available_ops}"
-                    serper_logger.error(error_msg)
-                    return error_msg
-                
-                # Get the operation details
-                op_details = self._available_operations[operation]
-                serper_logger.info("-" * 60)
-                serper_logger.info(f"OPERATION SELECTED: {operation}")
-                serper_logger.info(f"Description: {op_details.get('description', 'No description')}")
-                
-                # Validate parameters
-                required_params = op_details.get("required", [])
-                serper_logger.info(f"Required parameters: {', '.join(required_params)}")
-                
-                missing_params = [param for param in required_params if param not in parameters]
-                if missing_params:
-                    error_msg = f"Missing required parameters for {operation}: {', '.join(missing_params)}"
-                    serper_logger.error(error_msg)
-                    return error_msg
-                
-                # Log call
-                serper_logger.info(f"Calling Serper API: {operation}")
-                call_start_time = time.time()
-                
-                # Call the operation
-                result = await session.call_tool(operation, parameters)
-                
-                # Log call completion
-                call_duration = time.time() - call_start_time
-                serper_logger.info(f"API call completed in {call_duration:.2f} seconds")
-                
-                # Process the result
-                if hasattr(result, 'content') and result.content:
-                    try:
-                        # Parse JSON response
-                        response_data = json.loads(result.content[0].text)
-                        json_result = json.dumps(response_data, indent=2)
-                        
-                        # Log result size
-                        serper_logger.info(f"Result size: {len(json_result)} characters")
-                        
-                        return json_result
-                    except json.JSONDecodeError:
-                        # Return raw text if not JSON
-                        raw_text = result.content[0].text
-                        serper_logger.info(f"Non-JSON result received ({len(raw_text)} characters)")
-                        return raw_text
-                else:
-                    serper_logger.warning(f"Operation {operation} returned no content")
-                    return f"Operation {operation} executed successfully but returned no content."
+        # Serve repeated read-only calls from the result cache
+        result_cache = get_result_cache()
+        cached_result = result_cache.get(self.url, operation, parameters)
+        if cached_result is not None:
+            serper_logger.info(f"Result cache hit for {operation} ({len(cached_result)} characters)")
+            return ToolResult(cached_result).render(self.max_result_tokens or None)
+        
+        # Calls reuse a warm session from the process-wide pool instead of reconnecting
+        pool = get_session_pool()
+        
+        # Get available operations from the shared catalogue cache
+        available_operations = await self._get_available_operations()
+        
+        # Check if the operation is valid
+        if operation not in available_operations:
+            available_ops = ", ".join(available_operations.keys())
+            error_msg = f"Invalid operation: {operation}. Available operations: {available_ops}"
+            serper_logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        # Get the operation details
+        op_details = available_operations[operation]
+        serper_logger.info("-" * 60)
+        serper_logger.info(f"OPERATION SELECTED: {operation}")
+        serper_logger.info(f"Description: {op_details.get('description', 'No description')}")
+        
+        # Validate parameters
+        required_params = op_details.get("required", [])
+        serper_logger.info(f"Required parameters: {', '.join(required_params)}")
+        
+        missing_params = [param for param in required_params if param not in parameters]
+        if missing_params:
+            error_msg = f"Missing required parameters for {operation}: {', '.join(missing_params)}"
+            serper_logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        # Log call
+        serper_logger.info(f"Calling Serper API: {operation}")
+        call_start_time = time.time()
+        
+        # Call the operation
+        result = await pool.call_tool(self.url, operation, parameters)
+        
+        # Log call completion
+        call_duration = time.time() - call_start_time
+        serper_logger.info(f"API call completed in {call_duration:.2f} seconds")
+        
+        # Process the result, keeping the raw text and parsing it only when needed
+        if hasattr(result, 'content') and result.content:
+            tool_result = ToolResult(result.content[0].text)
+            
+            # Log result size
+            serper_logger.info(f"Result size: {len(tool_result)} characters")
+            
+            # Tool errors are raised so run_batch records them as failed items
+            if getattr(result, 'isError', False):
+                serper_logger.error(f"Operation {operation} failed: {tool_result}")
+                raise RuntimeError(str(tool_result))
+            result_cache.put(self.url, operation, parameters, tool_result)
+            
+            # Compact and trim the result when it exceeds the token budget
+            return tool_result.render(self.max_result_tokens or None)
+        else:
+            serper_logger.warning(f"Operation {operation} returned no content")
+            return f"Operation {operation} executed successfully but returned no content."
     
-    async def _get_available_operations(self, session) -> Dict[str, Dict]:
-        """Get available Serper operations from the API"""
-        tools_result = await session.list_tools()
-        
-        ops_dict = {}
-        if hasattr(tools_result, 'tools'):
-            for tool in tools_result.tools:
-                if hasattr(tool, 'name') and hasattr(tool, 'description'):
-                    # Extract tool schema
-                    schema = {}
-                    if hasattr(tool, 'inputSchema'):
-                        schema = tool.inputSchema
-                    
-                    # Parse required parameters and properties
-                    required = []
-                    properties = {}
-                    if isinstance(schema, dict):
-                        required = schema.get('required', [])
-                        properties = schema.get('properties', {})
-                    
-                    ops_dict[tool.name] = {
-                        "description": tool.description,
-                        "required": required,
-                        "properties": properties
-                    }
-        
-        return ops_dict
+    async def _get_available_operations(self) -> Dict[str, Dict]:
+        """Get available Serper operations from the API, cached per server URL"""
+        return await get_tool_catalogue().get(self.url)
     
     def get_available_operations(self) -> str:
         """Get a formatted list of available Serper operations"""
         serper_logger.info("Getting formatted list of Serper operations")
-        operations = asyncio.run(self.list_available_operations())
+        operations = run_sync(self.list_available_operations())
         
         # Format the output
         result = "# Available Serper Operations\n\n"
@@ -360,28 +327,26 @@ class SerperMCPTool(BaseTool):
     async def list_available_operations(self) -> List[Dict[str, str]]:
         """List all available Serper operations with descriptions"""
         serper_logger.info("Listing all available Serper operations")
-        async with websocket_client(self.url) as streams:
-            async with mcp.ClientSession(*streams) as session:
-                ops_dict = await self._get_available_operations(session)
-                
-                operations = []
-                for name, details in ops_dict.items():
-                    operations.append({
-                        "name": name,
-                        "description": details["description"],
-                        "required_params": details.get("required", [])
-                    })
-                
-                serper_logger.info(f"Found {len(operations)} available operations")
-                
-                # Log all available operations
-                serper_logger.info("AVAILABLE OPERATIONS:")
-                for i, op in enumerate(operations, 1):
-                    serper_logger.info(f"{i}. {op['name']}: {op['description']}")
-                    if op['required_params']:
-                        serper_logger.info(f"   Required parameters: {', '.join(op['required_params'])}")
-                
-                return operations
+        ops_dict = await self._get_available_operations()
+        
+        operations = []
+        for name, details in ops_dict.items():
+            operations.append({
+                "name": name,
+                "description": details["description"],
+                "required_params": details.get("required", [])
+            })
+        
+        serper_logger.info(f"Found {len(operations)} available operations")
+        
+        # Log all available operations
+        serper_logger.info("AVAILABLE OPERATIONS:")
+        for i, op in enumerate(operations, 1):
+            serper_logger.info(f"{i}. {op['name']}: {op['description']}")
+            if op['required_params']:
+                serper_logger.info(f"   Required parameters: {', '.join(op['required_params'])}")
+        
+        return operations
 
 # Example implementation using the CrewAI wrapper
 class SerperDevTool(SerperMCPTool):
@@ -394,7 +359,11 @@ class SerperDevTool(SerperMCPTool):
     
     def _run(self, query: str) -> str:
         """Simplified interface that just takes a query string"""
-        return super()._run("search", {"query": query}) 
+        return super()._run("search", {"query": query})
+    
+    async def _arun(self, query: str) -> str:
+        """Async version of the simplified search interface"""
+        return await super()._arun("search", {"query": query})
     ''',
     "github": '''
 import os
@@ -405,11 +374,11 @@ import mcp
 import logging
 import datetime
 import time
-from mcp.client.websocket import websocket_client
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
+from mcp_runtime import get_session_pool, get_tool_catalogue, get_result_cache, run_sync, BatchOperationsMixin, ToolResult
 
 # Configure enhanced logging
 def setup_logging():
@@ -451,13 +420,15 @@ class GitHubMCPToolParams(BaseModel):
         description="Parameters for the GitHub operation"
     )
 
-class GitHubMCPTool(BaseTool):
-    """Tool for interacting with GitHub API using MCP"""
+class GitHubMCPTool(BatchOperationsMixin, BaseTool):
+    """Tool for interacting with GitHub API using MCP, run_batch() runs several operations concurrently"""
     name: str = "github_mcp_tool"
     description: str = "Interact with GitHub API to perform various operations like searching repositories, creating repositories, managing issues, etc."
     args_schema: type[BaseModel] = GitHubMCPToolParams
     github_token: str = ""
     url: str = ""
+    # Token budget for results returned to the agent, 0 returns them whole
+    max_result_tokens: int = int(os.getenv("MCP_RESULT_MAX_TOKENS", "0"))
     
     def __init__(self):
         super().__init__()
@@ -474,39 +445,27 @@ class GitHubMCPTool(BaseTool):
             {"githubPersonalAccessToken": self.github_token}
         )
         
-        # Cache for available tools
-        self._available_tools = None
-        
-        # Try to preload available tools
-        try:
-            asyncio.run(self._preload_tools())
-        except Exception as e:
-            github_logger.warning(f"Could not preload tools: {str(e)}")
-        
         # Log initialization
         github_logger.info("GitHubMCPTool initialized")
         github_logger.info(f"GitHub token: {self.github_token[:5]}...{self.github_token[-5:]}")
     
-    async def _preload_tools(self):
-        """Preload available tools for better logging"""
-        github_logger.info("Preloading available GitHub tools...")
-        async with websocket_client(self.url) as streams:
-            github_logger.info("Connection established for preloading tools")
-            async with mcp.ClientSession(*streams) as session:
-                self._available_tools = await self._get_available_tools(session)
-                github_logger.info(f"Preloaded {len(self._available_tools)} GitHub tools")
-                
-                # Log all available tools
-                github_logger.info("=" * 80)
-                github_logger.info("AVAILABLE GITHUB TOOLS:")
-                for i, (tool_name, tool_info) in enumerate(self._available_tools.items(), 1):
-                    github_logger.info(f"{i}. {tool_name}: {tool_info.get('description', 'No description')}")
-                    if tool_info.get('required'):
-                        github_logger.info(f"   Required parameters: {', '.join(tool_info.get('required', []))}")
-                github_logger.info("=" * 80)
-    
     def _run(self, operation: str, parameters: Dict[str, Any] = None) -> str:
         """Run the GitHub operation"""
+        # Wait on the shared runtime loop, which also works when called from a running event loop
+        try:
+            return run_sync(self.call_operation(operation, parameters))
+        except Exception as e:
+            return f"Error executing GitHub operation: {str(e)}"
+    
+    async def _arun(self, operation: str, parameters: Dict[str, Any] = None) -> str:
+        """Run the GitHub operation natively in async crews"""
+        try:
+            return await self.call_operation(operation, parameters)
+        except Exception as e:
+            return f"Error executing GitHub operation: {str(e)}"
+    
+    async def call_operation(self, operation: str, parameters: Dict[str, Any] = None) -> str:
+        """Run the GitHub operation with logging, raising on failure (used by run_batch)"""
         if parameters is None:
             parameters = {}
         
@@ -522,9 +481,9 @@ class GitHubMCPTool(BaseTool):
         # Track execution time
         start_time = time.time()
         
-        # Run the async operation and wait for result
+        # Run the async operation
         try:
-            result = asyncio.run(self._run_async(operation, parameters))
+            result = await self._run_async(operation, parameters)
             
             # Calculate execution time
             execution_time = time.time() - start_time
@@ -541,7 +500,7 @@ class GitHubMCPTool(BaseTool):
             execution_time = time.time() - start_time
             github_logger.error(f"ERROR ({execution_time:.2f}s): {str(e)}")
             github_logger.info("=" * 80)
-            return f"Error executing GitHub operation: {str(e)}"
+            raise
     
     def _get_safe_parameters(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Create a copy of parameters safe for logging (no sensitive data)"""
@@ -561,10 +520,9 @@ class GitHubMCPTool(BaseTool):
         if not result:
             return "Empty result"
             
-        # For JSON results
-        try:
-            result_obj = json.loads(result)
-            
+        # For JSON results, parsed at most once and shared with rendering
+        result_obj = result.data if isinstance(result, ToolResult) else ToolResult(result).data
+        if result_obj is not None:
             if isinstance(result_obj, dict):
                 # For dictionary responses
                 if 'total_count' in result_obj:
@@ -581,7 +539,7 @@ class GitHubMCPTool(BaseTool):
             elif isinstance(result_obj, list):
                 return f"Array with {len(result_obj)} items"
                 
-        except json.JSONDecodeError:
+        else:
             # For non-JSON results
             if len(result) > 100:
                 return f"Text response ({len(result)} characters)"
@@ -597,111 +555,82 @@ class GitHubMCPTool(BaseTool):
         # Normalize parameters for specific operations
         parameters = self._normalize_parameters(operation, parameters)
         
-        # Connect to the Smithery server
-        async with websocket_client(self.url) as streams:
-            github_logger.info("Connection established")
-            
-            async with mcp.ClientSession(*streams) as session:
-                # Get available tools if not cached
-                if self._available_tools is None:
-                    github_logger.info("Fetching available GitHub tools...")
-                    self._available_tools = await self._get_available_tools(session)
-                    
-                    # Log all available tools
-                    github_logger.info("AVAILABLE GITHUB TOOLS:")
-                    for i, (tool_name, tool_info) in enumerate(self._available_tools.items(), 1):
-                        github_logger.info(f"{i}. {tool_name}: {tool_info.get('description', 'No description')}")
-                    
-                    github_logger.info(f"Found {len(self._available_tools)} available tools")
-                
-                # Check if the operation is valid
-                if operation not in self._available_tools:
-                    available_ops = ", ".join(self._available_tools.keys())
-                    error_msg = f"Invalid operation: {operation}. Available operations: {available_ops}"
-                    github_logger.error(error_msg)
-                    return error_msg
-                
-                # Get the tool details
-                tool_details = self._available_tools[operation]
-                github_logger.info("-" * 60)
-                github_logger.info(f"TOOL SELECTED: {operation}")
-                github_logger.info(f"Description: {tool_details.get('description', 'No description')}")
-                
-                # Validate parameters
-                required_params = tool_details.get("required", [])
-                github_logger.info(f"Required parameters: {', '.join(required_params)}")
-                
-                missing_params = [param for param in required_params if param not in parameters]
-                if missing_params:
-                    error_msg = f"Missing required parameters for {operation}: {', '.join(missing_params)}"
-                    github_logger.error(error_msg)
-                    return error_msg
-                
-                # Log call
-                github_logger.info(f"Calling GitHub API: {operation}")
-                call_start_time = time.time()
-                
-                # Call the tool
-                result = await session.call_tool(operation, parameters)
-                
-                # Log call completion
-                call_duration = time.time() - call_start_time
-                github_logger.info(f"API call completed in {call_duration:.2f} seconds")
-                
-                # Process the result
-                if hasattr(result, 'content') and result.content:
-                    try:
-                        # Parse JSON response
-                        response_data = json.loads(result.content[0].text)
-                        json_result = json.dumps(response_data, indent=2)
-                        
-                        # Log result size
-                        github_logger.info(f"Result size: {len(json_result)} characters")
-                        
-                        return json_result
-                    except json.JSONDecodeError:
-                        # Return raw text if not JSON
-                        raw_text = result.content[0].text
-                        github_logger.info(f"Non-JSON result received ({len(raw_text)} characters)")
-                        return raw_text
-                else:
-                    github_logger.warning(f"Operation {operation} returned no content")
-                    return f"Operation {operation} executed successfully but returned no content."
+        # Serve repeated read-only calls from the result cache
+        result_cache = get_result_cache()
+        cached_result = result_cache.get(self.url, operation, parameters)
+        if cached_result is not None:
+            github_logger.info(f"Result cache hit for {operation} ({len(cached_result)} characters)")
+            return ToolResult(cached_result).render(self.max_result_tokens or None)
+        
+        # Calls reuse a warm session from the process-wide pool instead of reconnecting
+        pool = get_session_pool()
+        
+        # Get available tools from the shared catalogue cache
+        available_tools = await self._get_available_tools()
+        
+        # Check if the operation is valid
+        if operation not in available_tools:
+            available_ops = ", ".join(available_tools.keys())
+            error_msg = f"Invalid operation: {operation}. Available operations: {available_ops}"
+            github_logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        # Get the tool details
+        tool_details = available_tools[operation]
+        github_logger.info("-" * 60)
+        github_logger.info(f"TOOL SELECTED: {operation}")
+        github_logger.info(f"Description: {tool_details.get('description', 'No description')}")
+        
+        # Validate parameters
+        required_params = tool_details.get("required", [])
+        github_logger.info(f"Required parameters: {', '.join(required_params)}")
+        
+        missing_params = [param for param in required_params if param not in parameters]
+        if missing_params:
+            error_msg = f"Missing required parameters for {operation}: {', '.join(missing_params)}"
+            github_logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        # Log call
+        github_logger.info(f"Calling GitHub API: {operation}")
+        call_start_time = time.time()
+        
+        # Call the tool
+        result = await pool.call_tool(self.url, operation, parameters)
+        
+        # Log call completion
+        call_duration = time.time() - call_start_time
+        github_logger.info(f"API call completed in {call_duration:.2f} seconds")
+        
+        # Process the result, keeping the raw text and parsing it only when needed
+        if hasattr(result, 'content') and result.content:
+            tool_result = ToolResult(result.content[0].text)
+            
+            # Log result size
+            github_logger.info(f"Result size: {len(tool_result)} characters")
+            
+            # Tool errors are raised so run_batch records them as failed items
+            if getattr(result, 'isError', False):
+                github_logger.error(f"Operation {operation} failed: {tool_result}")
+                raise RuntimeError(str(tool_result))
+            result_cache.put(self.url, operation, parameters, tool_result)
+            
+            # Compact and trim the result when it exceeds the token budget
+            return tool_result.render(self.max_result_tokens or None)
+        else:
+            github_logger.warning(f"Operation {operation} returned no content")
+            return f"Operation {operation} executed successfully but returned no content."
     
-    async def _get_available_tools(self, session) -> Dict[str, Dict]:
-        """Get available GitHub tools from the API"""
-        tools_result = await session.list_tools()
-        
-        tools_dict = {}
-        if hasattr(tools_result, 'tools'):
-            for tool in tools_result.tools:
-                if hasattr(tool, 'name') and hasattr(tool, 'description'):
-                    # Extract tool schema
-                    schema = {}
-                    if hasattr(tool, 'inputSchema'):
-                        schema = tool.inputSchema
-                    
-                    # Parse required parameters and properties
-                    required = []
-                    properties = {}
-                    if isinstance(schema, dict):
-                        required = schema.get('required', [])
-                        properties = schema.get('properties', {})
-                    
-                    tools_dict[tool.name] = {
-                        "description": tool.description,
-                        "required": required,
-                        "properties": properties
-                    }
-        
-        return tools_dict
+    async def _get_available_tools(self) -> Dict[str, Dict]:
+        """Get available GitHub tools from the API, cached per server URL"""
+        return await get_tool_catalogue().get(self.url)
     
     def get_authenticated_user(self) -> str:
         """Get the authenticated user's GitHub username"""
         github_logger.info("Getting authenticated GitHub user")
         try:
             # Run this synchronously
-            username = asyncio.run(self._get_authenticated_user())
+            username = run_sync(self._get_authenticated_user())
             github_logger.info(f"Authenticated as: {username}")
             return username
         except Exception as e:
@@ -716,54 +645,50 @@ class GitHubMCPTool(BaseTool):
     
     async def _get_authenticated_user(self) -> str:
         """Get the authenticated user's GitHub username asynchronously"""
-        async with websocket_client(self.url) as streams:
-            async with mcp.ClientSession(*streams) as session:
-                # Call API to get user info
-                github_logger.info("Calling get_authenticated_user API")
-                result = await session.call_tool("get_authenticated_user", {})
-                
-                if hasattr(result, 'content') and result.content:
-                    # Parse response
-                    try:
-                        user_data = json.loads(result.content[0].text)
-                        return user_data.get('login', 'unknown')
-                    except json.JSONDecodeError:
-                        github_logger.warning("Failed to parse user data JSON")
-                        return "unknown"
-                
-                github_logger.warning("No content returned from get_authenticated_user")
+        # Call API to get user info
+        github_logger.info("Calling get_authenticated_user API")
+        result = await get_session_pool().call_tool(self.url, "get_authenticated_user", {})
+        
+        if hasattr(result, 'content') and result.content:
+            # Parse response
+            try:
+                user_data = json.loads(result.content[0].text)
+                return user_data.get('login', 'unknown')
+            except json.JSONDecodeError:
+                github_logger.warning("Failed to parse user data JSON")
                 return "unknown"
+        
+        github_logger.warning("No content returned from get_authenticated_user")
+        return "unknown"
     
     async def list_available_operations(self) -> List[Dict[str, str]]:
         """List all available GitHub operations with descriptions"""
         github_logger.info("Listing all available GitHub operations")
-        async with websocket_client(self.url) as streams:
-            async with mcp.ClientSession(*streams) as session:
-                tools_dict = await self._get_available_tools(session)
-                
-                operations = []
-                for name, details in tools_dict.items():
-                    operations.append({
-                        "name": name,
-                        "description": details["description"],
-                        "required_params": details.get("required", [])
-                    })
-                
-                github_logger.info(f"Found {len(operations)} available operations")
-                
-                # Log all available operations
-                github_logger.info("AVAILABLE OPERATIONS:")
-                for i, op in enumerate(operations, 1):
-                    github_logger.info(f"{i}. {op['name']}: {op['description']}")
-                    if op['required_params']:
-                        github_logger.info(f"   Required parameters: {', '.join(op['required_params'])}")
-                
-                return operations
+        tools_dict = await self._get_available_tools()
+        
+        operations = []
+        for name, details in tools_dict.items():
+            operations.append({
+                "name": name,
+                "description": details["description"],
+                "required_params": details.get("required", [])
+            })
+        
+        github_logger.info(f"Found {len(operations)} available operations")
+        
+        # Log all available operations
+        github_logger.info("AVAILABLE OPERATIONS:")
+        for i, op in enumerate(operations, 1):
+            github_logger.info(f"{i}. {op['name']}: {op['description']}")
+            if op['required_params']:
+                github_logger.info(f"   Required parameters: {', '.join(op['required_params'])}")
+        
+        return operations
 
     def get_available_operations(self) -> str:
         """Get a formatted list of available GitHub operations"""
         github_logger.info("Getting formatted list of GitHub operations")
-        operations = asyncio.run(self.list_available_operations())
+        operations = run_sync(self.list_available_operations())
         
         # Format the output
         result = "# Available GitHub Operations\n\n"
@@ -853,13 +778,9 @@ through the Model Context Protocol framework.
 )
 
 async def get_embedding(text: str, openai_client: AsyncOpenAI) -> List[float]:
-    """Get embedding vector from OpenAI."""
+    """Get embedding vector from OpenAI, served from the shared embedding cache when possible."""
     try:
-        response = await openai_client.embeddings.create(
-            model=os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small'),
-            input=text
-        )
-        return response.data[0].embedding
+        return await embedding_service.embed(text, openai_client)
     except Exception as e:
         logger.error(f"Error getting embedding: {e}")
         return [0] * 1536  # Return zero vector on error
@@ -890,14 +811,17 @@ async def extract_tools_from_query(query: str, openai_client: AsyncOpenAI) -> Li
         The response should contain ONLY the 4-5 letter service names in lowercase, separated by commas. No additional text.
         """
         
-        response = await openai_client.chat.completions.create(
+        tools_text = await cached_completion(
+            openai_client,
+            "extract_tools_from_query",
             model=os.getenv('PRIMARY_MODEL', 'gpt-4o-mini'),
             messages=[{"role": "user", "content": prompt}],
+            similar_text=query,
             max_tokens=100,
             temperature=0.1  # Low temperature for more deterministic answers
         )
         
-        tools_text = response.choices[0].message.content.strip().lower()
+        tools_text = tools_text.strip().lower()
         
         # Clean up the response
         tools_text = tools_text.replace(".", "").replace("and", ",")
@@ -977,34 +901,18 @@ async def find_relevant_mcp_tools(ctx: RunContext[MCPToolDeps], user_query: str)
         logger.info("MCP TOOL SEARCH: Query embedding generated successfully")
         
         # Search for similar MCP tools
-        result = ctx.deps.supabase.rpc(
-            'match_mcp_tools',
-            {
-                'query_embedding': query_embedding,
-                'match_threshold': 0.5,
-                'match_count': 20  # Increased to get more candidate tools
-            }
-        ).execute()
+        db = get_supabase_repository(ctx.deps.supabase)
+        tools = await db.match_mcp_tools(query_embedding, 0.5, 20)  # Increased to get more candidate tools
         
-        if not result.data:
+        if not tools:
             logger.info("MCP TOOL SEARCH: No matching tools with high threshold, trying lower threshold")
             # Try with lower threshold and even more results
-            result = ctx.deps.supabase.rpc(
-                'match_mcp_tools',
-                {
-                    'query_embedding': query_embedding,
-                    'match_threshold': 0.3,
-                    'match_count': 25  # Increased to get more candidate tools
-                }
-            ).execute()
+            tools = await db.match_mcp_tools(query_embedding, 0.3, 25)
         
-        if not result.data:
+        if not tools:
             logger.info("MCP TOOL SEARCH: No relevant tools found in database")
             return {"found": False}
         
-        # Get all matching tools that meet the threshold
-        tools = result.data
-        
         # Filter tools based on mentioned tools if any were detected
         if mentioned_tools:
             filtered_tools = []
@@ -1111,6 +1019,8 @@ try:
     from mcp.client.websocket import websocket_client
 except ImportError:
     print("MCP package not found. Installing required dependencies may be needed.")
+# Shipped next to this file, so a missing runtime is an error rather than an optional dependency
+from mcp_runtime import get_session_pool, get_tool_catalogue, get_result_cache, run_sync, BatchOperationsMixin, ToolResult
 try:
     import smithery
 except ImportError:
@@ -1270,6 +1180,9 @@ async def generate_complete_crewai_project(ctx: RunContext[MCPToolDeps],
                 logger.error("Failed to generate tools.py file")
                 return {}
         
+        # Generated tools share MCP sessions through the runtime module
+        write_mcp_runtime(output_dir)
+        
         # Extract tool class names from tools.py content
         tool_class_names = extract_class_names_from_tools(tools_py_content)
         logger.info(f"Extracted tool class names: {tool_class_names}")
@@ -1327,6 +1240,21 @@ async def generate_complete_crewai_project(ctx: RunContext[MCPToolDeps],
         logger.error(f"Error generating complete CrewAI project: {e}", exc_info=True)
         return {}
 
+def write_mcp_runtime(output_dir: str) -> str:
+    """
+    Copy the MCP runtime module (session pool) next to a generated tools.py.
+    
+    Args:
+        output_dir: Directory of the generated project
+        
+    Returns:
+        Path of the copied module
+    """
+    runtime_path = os.path.join(output_dir, "mcp_runtime.py")
+    shutil.copyfile(MCP_RUNTIME_SOURCE, runtime_path)
+    logger.info(f"Copied MCP runtime to {runtime_path}")
+    return runtime_path
+
 def extract_imports(code: str) -> List[str]:
     """
     Extract import statements from the code to preserve them.
@@ -1486,7 +1414,7 @@ async def convert_to_crewai_tool(ctx: RunContext[MCPToolDeps],
         {reference_section}
         
         REQUIREMENTS:
-        1. Create a class that inherits from crewai.tools.BaseTool
+        1. Create a class that inherits from BatchOperationsMixin and crewai.tools.BaseTool, in that order
         2. Include all authentication and setup within the tool class
         3. If there are multiple functionalities, convert them into methods
         4. Add proper Field annotations and docs
@@ -1495,12 +1423,22 @@ async def convert_to_crewai_tool(ctx: RunContext[MCPToolDeps],
         7. Include example code as a docstring
         8. Make sure the tool follows the CrewAI pattern with a _run method
         9. Follow the same structure and patterns as the reference examples
-        10. Implement both _run and _arun methods if applicable
-        11. DO NOT include imports in your response - common imports will be added separately
-        12. Use descriptive class name that reflects the tool's purpose
-        13. IMPORTANT: Preserve ALL functionality from the original code - do not remove any features
-        14. If the original code has helper functions, preserve them as methods inside the class
-        15. If any code might need to be preserved outside the class, keep it in your response
+        10. Implement the logic in an async call_operation(operation, parameters) method that raises on failure,
+            make _arun await it and _run return run_sync(self.call_operation(...)) from mcp_runtime, both turning
+            exceptions into error messages; never call asyncio.run() inside a tool. call_operation is what
+            run_batch() fans out concurrently
+        11. Wrap result.content[0].text in ToolResult and return tool_result.render(self.max_result_tokens or None)
+            instead of parsing and re-serializing it with json.loads/json.dumps
+        12. DO NOT include imports in your response - common imports will be added separately
+        13. Use descriptive class name that reflects the tool's purpose
+        14. IMPORTANT: Preserve ALL functionality from the original code - do not remove any features
+        15. If the original code has helper functions, preserve them as methods inside the class
+        16. If any code might need to be preserved outside the class, keep it in your response
+        17. Make MCP calls through get_session_pool().call_tool(url, ...) instead of opening a websocket_client
+            and ClientSession per call, and look operations up with get_tool_catalogue().get(url) on first use;
+            never connect to the server in __init__
+        18. For read-only operations, check get_result_cache().get(url, operation, parameters) before calling
+            the server and put() successful results afterwards
         
         Return ONLY the CrewAI tool class code with no explanation or imports.
         """
@@ -3400,6 +3338,7 @@ async def generate_tools_py(ctx: RunContext[MCPToolDeps],
         tools_file_path = os.path.join(output_dir, "tools.py")
         with open(tools_file_path, "w") as f:
             f.write(tools_py_content)
+        write_mcp_runtime(output_dir)
             
         # Create an error_list.md file documenting known errors and their fixes
         error_list_path = os.path.join(output_dir, "error_list.md")
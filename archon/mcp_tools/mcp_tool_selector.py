@@ -10,6 +10,7 @@ from typing import List, Dict, Any, Optional, Tuple
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
+from archon.utils.llm_cache import cached_completion
 
 # Create logs directory if it doesn't exist
 logs_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'logs')
@@ -93,15 +94,19 @@ async def extract_structured_requirements(query: str, openai_client: AsyncOpenAI
         Return ONLY valid JSON without explanations or comments.
         """
         
-        response = await openai_client.chat.completions.create(
+        result_text = await cached_completion(
+            openai_client,
+            "extract_structured_requirements",
             model=os.getenv('PRIMARY_MODEL', 'gpt-4o-mini'),
             messages=[{"role": "user", "content": prompt}],
+            similar_text=query,
+            validate=lambda text: UserRequirements.model_validate(json.loads(text)),
             max_tokens=1500,
             temperature=0.1,
             response_format={"type": "json_object"}
         )
         
-        result_text = response.choices[0].message.content.strip()
+        result_text = result_text.strip()
         
         # Parse the JSON response
         try:
@@ -402,14 +407,18 @@ async def get_crewai_tool_requirements(query: str, openai_client: AsyncOpenAI) -
         ONLY return valid JSON with no additional text.
         """
         
-        response = await openai_client.chat.completions.create(
+        result_text = await cached_completion(
+            openai_client,
+            "get_crewai_tool_requirements",
             model=os.getenv('PRIMARY_MODEL', 'gpt-4o-mini'),
             messages=[{"role": "user", "content": prompt}],
+            similar_text=query,
+            validate=json.loads,
             max_tokens=1000,
             temperature=0.1
         )
         
-        result_text = response.choices[0].message.content.strip()
+        result_text = result_text.strip()
         
         try:
             requirements = json.loads(result_text)
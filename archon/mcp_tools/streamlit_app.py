@@ -3,7 +3,6 @@ import asyncio
 import os
 import sys
 import logging
-from openai import AsyncOpenAI
 from supabase import Client
 import logfire
 
@@ -15,6 +14,7 @@ sys.path.append(parent_dir)
 # Import MCP tool specific functions
 from archon.mcp_tools.mcp_tool_graph import mcp_tool_flow, combined_adaptive_flow
 from archon.mcp_tools.mcp_tool_coder import MCPToolDeps
+from archon.utils.model_client import get_openai_client
 
 # Load environment variables
 from dotenv import load_dotenv
@@ -39,12 +39,8 @@ base_url = os.getenv('BASE_URL', 'https://api.openai.com/v1')
 api_key = os.getenv('LLM_API_KEY', 'no-llm-api-key-provided')
 is_ollama = "localhost" in base_url.lower()
 
-if is_ollama:
-    openai_client = AsyncOpenAI(base_url=base_url, api_key=api_key)
-elif os.getenv("OPENAI_API_KEY"):
-    openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-else:
-    openai_client = None
+# Shared pooled client, None when no model provider is configured
+openai_client = get_openai_client(base_url, api_key) if is_ollama else get_openai_client()
 
 # Initialize Supabase client
 if os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_SERVICE_KEY"):
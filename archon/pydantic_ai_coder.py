@@ -17,6 +17,10 @@ from pydantic_ai.models.openai import OpenAIModel
 from openai import AsyncOpenAI
 from supabase import Client
 from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter
+from archon.utils.embeddings import get_embedding_service
+from archon.utils.llm_cache import cached_completion
+from archon.utils.prompt_budget import truncate_to_tokens
+from archon.utils.supabase_repository import get_supabase_repository
 
 # Set up logging
 import os
@@ -37,6 +41,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger('agent_templates')
 
+# Shared embedding cache (see archon/utils/embeddings.py)
+embedding_service = get_embedding_service()
+
 # Load environment variables
 load_dotenv()
 
@@ -785,20 +792,18 @@ async def retrieve_relevant_documentation(ctx: RunContext[PydanticAIDeps], user_
     """
     try:
         query_embedding = await get_embedding(user_query, ctx.deps.openai_client)
-        result = ctx.deps.supabase.rpc(
-            'match_site_pages',
-            {
-                'query_embedding': query_embedding,
-                'match_count': 4,
-                'filter': {'source': 'pydantic_ai_docs'}
-            }
-        ).execute()
+        # Served from the local index when SITE_PAGES_INDEX_PATH is set, else the RPC
+        docs = await get_supabase_repository(ctx.deps.supabase).match_site_pages(
+            query_embedding,
+            match_count=4,
+            filter={'source': 'pydantic_ai_docs'}
+        )
         
-        if not result.data:
+        if not docs:
             return "No relevant documentation found."
             
         formatted_chunks = []
-        for doc in result.data:
+        for doc in docs:
             chunk_text = f"""
 # {doc['title']}
 
@@ -815,16 +820,7 @@ async def retrieve_relevant_documentation(ctx: RunContext[PydanticAIDeps], user_
 async def list_documentation_pages_helper(supabase: Client) -> List[str]:
     """Helper function to list documentation pages."""
     try:
-        result = supabase.from_('site_pages') \
-            .select('url') \
-            .eq('metadata->>source', 'pydantic_ai_docs') \
-            .execute()
-        
-        if not result.data:
-            return []
-            
-        urls = sorted(set(doc['url'] for doc in result.data))
-        return urls
+        return await get_supabase_repository(supabase).list_site_page_urls('pydantic_ai_docs')
         
     except Exception as e:
         print(f"Error retrieving documentation pages: {e}")
@@ -839,23 +835,23 @@ async def list_documentation_pages(ctx: RunContext[PydanticAIDeps]) -> List[str]
 async def get_page_content(ctx: RunContext[PydanticAIDeps], url: str) -> str:
     """Get content of a specific documentation page."""
     try:
-        result = ctx.deps.supabase.from_('site_pages') \
-            .select('title, content, chunk_number') \
-            .eq('url', url) \
-            .eq('metadata->>source', 'pydantic_ai_docs') \
-            .order('chunk_number') \
-            .execute()
+        chunks = await get_supabase_repository(ctx.deps.supabase).get_page_chunks(url, 'pydantic_ai_docs')
         
-        if not result.data:
+        if not chunks:
             return f"No content found for URL: {url}"
             
-        page_title = result.data[0]['title'].split(' - ')[0]
+        page_title = chunks[0]['title'].split(' - ')[0]
         formatted_content = [f"# {page_title}\n"]
         
-        for chunk in result.data:
+        for chunk in chunks:
             formatted_content.append(chunk['content'])
             
-        return "\n\n".join(formatted_content)[:20000]
+        # Cut by tokens rather than characters so code-heavy pages don't overflow the context
+        return truncate_to_tokens(
+            "\n\n".join(formatted_content),
+            int(os.getenv('PAGE_CONTENT_MAX_TOKENS', '5000')),
+            os.getenv('PRIMARY_MODEL', 'gpt-4o-mini')
+        )
         
     except Exception as e:
         print(f"Error retrieving page content: {e}")
@@ -886,53 +882,21 @@ async def find_similar_agent_templates(ctx: RunContext[PydanticAIDeps], query: s
         # Set a lower threshold for fallback
         low_threshold = 0.45  # Lowered from 0.7
         
-        # Log all templates to understand what we have available
-        try:
-            all_templates = ctx.deps.supabase.table('agent_templates').select('*').execute()
-            templates_data = all_templates.data
-            logger.info(f"Found {len(templates_data)} total templates")
-            for template in templates_data:
-                purpose = template.get('purpose', 'Unknown purpose')
-                folder = template.get('folder_name', 'Unknown folder')
-                logger.info(f"Template: {purpose} in folder {folder}")
-        except Exception as e:
-            logger.error(f"Error listing all templates: {str(e)}")
-            
-        # Search for similar templates
+        # Search for similar templates once, without a threshold, in the local template index
         try:
-            similar_templates = ctx.deps.supabase.rpc(
-                "match_agent_templates",
-                {
-                    "query_embedding": query_embedding,
-                    "match_threshold": high_threshold,
-                    "match_count": 5
-                }
-            ).execute()
-            
-            templates = similar_templates.data
-            
+            candidates = await get_supabase_repository(ctx.deps.supabase).top_agent_templates(query_embedding, 5)
         except Exception as search_error:
             logger.error(f"Error finding similar templates: {str(search_error)}")
             # Handle Supabase API errors gracefully
-            templates = []
+            candidates = []
+        
+        # Apply the threshold cascade to the single result set
+        templates = [t for t in candidates if t.get('similarity', 0) > high_threshold]
             
         # If no templates found with high threshold, try with lower threshold
         if not templates or len(templates) == 0:
             logger.warning("No similar templates found with high threshold, trying with lower threshold")
-            try:
-                similar_templates = ctx.deps.supabase.rpc(
-                    "match_agent_templates",
-                    {
-                        "query_embedding": query_embedding,
-                        "match_threshold": low_threshold,
-                        "match_count": 5
-                    }
-                ).execute()
-                
-                templates = similar_templates.data
-            except Exception as fallback_error:
-                logger.error(f"Error finding similar templates with lower threshold: {str(fallback_error)}")
-                templates = []
+            templates = [t for t in candidates if t.get('similarity', 0) > low_threshold]
         
         # If templates found, return the highest similarity match
         if templates and len(templates) > 0:
@@ -948,6 +912,11 @@ async def find_similar_agent_templates(ctx: RunContext[PydanticAIDeps], query: s
             similarity = best_template.get('similarity', 0)
             logger.info(f"Using best template with similarity {similarity}")
             
+            # The index only holds light columns, load the code for the chosen template
+            if 'agents_code' not in best_template:
+                code = await get_supabase_repository(ctx.deps.supabase).get_agent_template_code(best_template['id'])
+                best_template = {**best_template, **code}
+            
             template_code = {
                 "agents_code": best_template.get('agents_code', ''),
                 "tools_code": best_template.get('tools_code', ''),
@@ -1167,13 +1136,9 @@ def apply_direct_adaptations(code, user_request, file_type, keywords=None, proje
     return code
 
 async def get_embedding(text: str, openai_client: AsyncOpenAI) -> List[float]:
-    """Get embedding vector from OpenAI."""
+    """Get embedding vector from OpenAI, served from the shared embedding cache when possible."""
     try:
-        response = await openai_client.embeddings.create(
-            model=os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small'),
-            input=text
-        )
-        return response.data[0].embedding
+        return await embedding_service.embed(text, openai_client)
     except Exception as e:
         logger.error(f"Error getting embedding: {e}")
         return [0] * 1536  # Return zero vector on error
@@ -1259,13 +1224,16 @@ async def determine_template_type(ctx: RunContext[PydanticAIDeps], user_request:
         
         if hasattr(ctx.deps, 'openai_client') and ctx.deps.openai_client is not None:
             logger.info("Determining template type with AsyncOpenAI")
-            response = await ctx.deps.openai_client.chat.completions.create(
+            result = await cached_completion(
+                ctx.deps.openai_client,
+                "determine_template_type",
                 model=os.getenv("TEMPLATE_MODEL", "gpt-4o-mini"),
                 messages=[{"role": "user", "content": prompt}],
+                similar_text=user_request,
                 temperature=0.1,
                 max_tokens=20
             )
-            result = response.choices[0].message.content.strip().lower()
+            result = result.strip().lower()
         else:
             logger.warning("No OpenAI client available, defaulting to standard_template")
             result = "standard_template"
@@ -1,5 +1,28 @@
 """Utility functions for the Archon project."""
 
+from importlib import import_module
+
 from .json_utils import clean_and_parse_json
 
-__all__ = ['clean_and_parse_json'] 
\ No newline at end of file
+# Re-exports are imported on first access, so importing one submodule (e.g.
+# html_markdown in a crawler process-pool worker) doesn't load the others
+_LAZY_EXPORTS = {
+    'EmbeddingCache': '.embeddings',
+    'EmbeddingService': '.embeddings',
+    'EmbeddingBatcher': '.embeddings',
+    'get_embedding_service': '.embeddings',
+    'LLMResponseCache': '.llm_cache',
+    'LLMService': '.llm_cache',
+    'get_llm_service': '.llm_cache',
+    'cached_completion': '.llm_cache',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        return getattr(import_module(_LAZY_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ['clean_and_parse_json', 'EmbeddingCache', 'EmbeddingService', 'EmbeddingBatcher', 'get_embedding_service',
+           'LLMResponseCache', 'LLMService', 'get_llm_service', 'cached_completion']
@@ -0,0 +1,161 @@
+"""
+Admission control for agent runs in the API server.
+
+Every chat request starts a full agentic_flow run with several LLM calls, file
+writes and database queries. ``AdmissionController`` caps how many runs execute
+at once, globally and per session, and queues the rest in FIFO order with a
+bounded queue, so a load spike waits in line instead of slowing every run down
+together. Callers waiting in the queue can be told their position as it
+changes, and cancelling a waiting or running caller frees its place.
+"""
+
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger('admission')
+
+PositionCallback = Callable[[int], Awaitable[Any]]
+
+
+class QueueFullError(Exception):
+    """Raised when a run can't start and the wait queue is already full."""
+
+
+class _Waiter:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.granted = False
+        self.moved = asyncio.Event()
+
+
+class AdmissionController:
+    """
+    Global and per-session concurrency limits with a bounded FIFO wait queue.
+
+    Args:
+        max_running: Runs allowed at once across all sessions
+        max_per_session: Runs allowed at once for one session
+        max_queued: Callers allowed to wait; beyond this acquire raises QueueFullError
+    """
+
+    def __init__(self, max_running: int = 4, max_per_session: int = 1, max_queued: int = 32):
+        self.max_running = max_running
+        self.max_per_session = max_per_session
+        self.max_queued = max_queued
+        self._running = 0
+        self._per_session: Dict[str, int] = {}
+        self._waiters: List[_Waiter] = []
+        self.admitted = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    def _dispatch(self):
+        # Grant slots in arrival order, skipping waiters whose session is already at its limit
+        granted = False
+        for waiter in list(self._waiters):
+            if self._running >= self.max_running:
+                break
+            if self._per_session.get(waiter.session_id, 0) >= self.max_per_session:
+                continue
+            self._waiters.remove(waiter)
+            self._running += 1
+            self._per_session[waiter.session_id] = self._per_session.get(waiter.session_id, 0) + 1
+            waiter.granted = True
+            waiter.moved.set()
+            granted = True
+        if granted:
+            # Everyone behind a granted waiter moved up
+            for waiter in self._waiters:
+                waiter.moved.set()
+
+    @property
+    def queue_full(self) -> bool:
+        """Whether a new run would be rejected right now."""
+        return self._running >= self.max_running and len(self._waiters) >= self.max_queued
+
+    def release(self, session_id: str):
+        """Give back a slot taken by acquire."""
+        self._running -= 1
+        remaining = self._per_session.get(session_id, 1) - 1
+        if remaining > 0:
+            self._per_session[session_id] = remaining
+        else:
+            self._per_session.pop(session_id, None)
+        self._dispatch()
+
+    async def acquire(self, session_id: str, on_position: Optional[PositionCallback] = None):
+        """
+        Wait for a run slot for a session.
+
+        Args:
+            session_id: Session the run belongs to
+            on_position: Awaited with the 1-based queue position whenever it changes while waiting
+
+        Raises:
+            QueueFullError: If the run has to wait and the queue is full
+        """
+        waiter = _Waiter(session_id)
+        self._waiters.append(waiter)
+        self._dispatch()
+        if waiter.granted:
+            self.admitted += 1
+            return
+        if len(self._waiters) > self.max_queued:
+            self._waiters.remove(waiter)
+            self.rejected += 1
+            raise QueueFullError(f"Server busy: {self.max_queued} requests already queued")
+
+        try:
+            position = None
+            while not waiter.granted:
+                current = self._waiters.index(waiter) + 1
+                waiter.moved.clear()
+                if on_position and current != position:
+                    position = current
+                    await on_position(position)
+                if not waiter.granted:
+                    await waiter.moved.wait()
+        except BaseException:
+            # Cancelled while waiting (e.g. the client went away), or granted just as it was cancelled
+            if waiter.granted:
+                self.release(session_id)
+            else:
+                self._waiters.remove(waiter)
+                for other in self._waiters:
+                    other.moved.set()
+            self.cancelled += 1
+            raise
+        self.admitted += 1
+
+    @asynccontextmanager
+    async def slot(self, session_id: str, on_position: Optional[PositionCallback] = None) -> AsyncIterator[None]:
+        """Hold a run slot for the duration of the block, see acquire."""
+        await self.acquire(session_id, on_position)
+        try:
+            yield
+        finally:
+            self.release(session_id)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'running': self._running,
+            'queued': len(self._waiters),
+            'max_running': self.max_running,
+            'max_per_session': self.max_per_session,
+            'max_queued': self.max_queued,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'cancelled': self.cancelled
+        }
+
+
+def create_admission_controller() -> AdmissionController:
+    """Build a controller from MAX_CONCURRENT_RUNS, MAX_RUNS_PER_SESSION and MAX_QUEUED_RUNS."""
+    return AdmissionController(
+        max_running=int(os.getenv('MAX_CONCURRENT_RUNS', '4')),
+        max_per_session=int(os.getenv('MAX_RUNS_PER_SESSION', '1')),
+        max_queued=int(os.getenv('MAX_QUEUED_RUNS', '32'))
+    )
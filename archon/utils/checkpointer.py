@@ -0,0 +1,630 @@
+"""
+Persistent LangGraph checkpointers for agentic_flow.
+
+``CompactingCheckpointSaver`` implements LangGraph's checkpoint saver interface
+on top of a small storage backend:
+
+- ``SQLiteCheckpointStore`` keeps checkpoints in a local SQLite file, for a
+  single node.
+- ``SupabaseCheckpointStore`` keeps them in the project's Supabase Postgres
+  database (tables in utils/site_pages.sql), so several API workers behind a load
+  balancer share conversation state.
+
+Channel values are stored once per channel version instead of inside every
+checkpoint, so unchanged channels such as scope and architecture aren't copied
+at each step, and serialized values above a size threshold, such as the
+``messages`` list of serialized model messages, are zlib-compressed. Each
+thread keeps only its latest checkpoints, and threads idle for longer than the
+TTL are evicted.
+"""
+
+import os
+import time
+import zlib
+import base64
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+logger = logging.getLogger('checkpointer')
+
+COMPRESSED_PREFIX = 'z:'
+
+# Threads whose puts are counted towards compaction; the least recently written are forgotten
+MAX_TRACKED_THREADS = 4096
+
+
+class CompressingSerializer:
+    """Wraps a serializer and zlib-compresses payloads larger than min_size bytes."""
+
+    def __init__(self, inner: Optional[SerializerProtocol] = None, min_size: int = 1024, level: int = 6):
+        self.inner = inner or JsonPlusSerializer()
+        self.min_size = min_size
+        self.level = level
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        if len(data) >= self.min_size:
+            compressed = zlib.compress(data, self.level)
+            if len(compressed) < len(data):
+                return COMPRESSED_PREFIX + type_, compressed
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.startswith(COMPRESSED_PREFIX):
+            type_, payload = type_[len(COMPRESSED_PREFIX):], zlib.decompress(payload)
+        return self.inner.loads_typed((type_, payload))
+
+
+class SQLiteCheckpointStore:
+    """Checkpoint rows in a local SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT,
+                    type TEXT,
+                    checkpoint BLOB,
+                    metadata_type TEXT,
+                    metadata BLOB,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+                );
+                CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    channel TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    blob BLOB,
+                    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+                );
+                CREATE TABLE IF NOT EXISTS checkpoint_writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT,
+                    blob BLOB,
+                    task_path TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                );
+                CREATE INDEX IF NOT EXISTS idx_checkpoints_created_at ON checkpoints (created_at);
+            """)
+            self._conn.commit()
+
+    def put_checkpoint(self, row: Dict[str, Any], blobs: List[Dict[str, Any]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO checkpoint_blobs (thread_id, checkpoint_ns, channel, version, type, blob) "
+                "VALUES (:thread_id, :checkpoint_ns, :channel, :version, :type, :blob)",
+                blobs
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+                "type, checkpoint, metadata_type, metadata, created_at) VALUES (:thread_id, :checkpoint_ns, "
+                ":checkpoint_id, :parent_checkpoint_id, :type, :checkpoint, :metadata_type, :metadata, :created_at)",
+                row
+            )
+            self._conn.commit()
+
+    def put_writes(self, rows: List[Dict[str, Any]], replace: bool):
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock:
+            self._conn.executemany(
+                f"{verb} INTO checkpoint_writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, "
+                "type, blob, task_path) VALUES (:thread_id, :checkpoint_ns, :checkpoint_id, :task_id, :idx, "
+                ":channel, :type, :blob, :task_path)",
+                rows
+            )
+            self._conn.commit()
+
+    def _rows(self, sql: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def list_checkpoints(self,
+                         thread_id: Optional[str],
+                         checkpoint_ns: Optional[str],
+                         checkpoint_id: Optional[str] = None,
+                         before: Optional[str] = None,
+                         limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        for column, value, op in (("thread_id", thread_id, "="), ("checkpoint_ns", checkpoint_ns, "="),
+                                  ("checkpoint_id", checkpoint_id, "="), ("checkpoint_id", before, "<")):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        sql = "SELECT * FROM checkpoints"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY checkpoint_id DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._rows(sql, params)
+
+    def get_blobs(self, thread_id: str, checkpoint_ns: str, versions: Dict[str, str]) -> List[Dict[str, Any]]:
+        if not versions:
+            return []
+        pairs = " OR ".join("(channel = ? AND version = ?)" for _ in versions)
+        params: List[Any] = [thread_id, checkpoint_ns]
+        for channel, version in versions.items():
+            params.extend([channel, str(version)])
+        return self._rows(
+            f"SELECT channel, type, blob FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? AND ({pairs})",
+            params
+        )
+
+    def get_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[Dict[str, Any]]:
+        return self._rows(
+            "SELECT task_id, channel, type, blob FROM checkpoint_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            [thread_id, checkpoint_ns, checkpoint_id]
+        )
+
+    def compact(self, thread_id: str, checkpoint_ns: str, oldest_kept_id: str, min_versions: Dict[str, str]):
+        with self._lock:
+            params = (thread_id, checkpoint_ns, oldest_kept_id)
+            self._conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?", params)
+            self._conn.execute(
+                "DELETE FROM checkpoint_writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?", params)
+            rows = self._conn.execute(
+                "SELECT channel, version FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+                (thread_id, checkpoint_ns)
+            ).fetchall()
+            stale = [(thread_id, checkpoint_ns, channel, version) for channel, version in rows
+                     if channel not in min_versions or version < min_versions[channel]]
+            self._conn.executemany(
+                "DELETE FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                stale
+            )
+            self._conn.commit()
+
+    def expired_threads(self, older_than: float) -> List[str]:
+        rows = self._rows(
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?", [older_than])
+        return [row['thread_id'] for row in rows]
+
+    def delete_threads(self, thread_ids: List[str]):
+        with self._lock:
+            for table in ("checkpoints", "checkpoint_blobs", "checkpoint_writes"):
+                self._conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in thread_ids])
+            self._conn.commit()
+
+
+class SupabaseCheckpointStore:
+    """Checkpoint rows in the Supabase Postgres database, binary columns stored as base64 text."""
+
+    BINARY_COLUMNS = ('checkpoint', 'metadata', 'blob')
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def _encode(cls, row: Dict[str, Any]) -> Dict[str, Any]:
+        encoded = dict(row)
+        for column in cls.BINARY_COLUMNS:
+            if encoded.get(column) is not None:
+                encoded[column] = base64.b64encode(encoded[column]).decode('ascii')
+        return encoded
+
+    @classmethod
+    def _decode(cls, row: Dict[str, Any]) -> Dict[str, Any]:
+        decoded = dict(row)
+        for column in cls.BINARY_COLUMNS:
+            if decoded.get(column) is not None:
+                decoded[column] = base64.b64decode(decoded[column])
+        return decoded
+
+    def put_checkpoint(self, row: Dict[str, Any], blobs: List[Dict[str, Any]]):
+        if blobs:
+            self.client.table('checkpoint_blobs').upsert(
+                [self._encode(b) for b in blobs],
+                on_conflict='thread_id,checkpoint_ns,channel,version',
+                ignore_duplicates=True
+            ).execute()
+        self.client.table('checkpoints').upsert(
+            self._encode(row), on_conflict='thread_id,checkpoint_ns,checkpoint_id'
+        ).execute()
+
+    def put_writes(self, rows: List[Dict[str, Any]], replace: bool):
+        self.client.table('checkpoint_writes').upsert(
+            [self._encode(r) for r in rows],
+            on_conflict='thread_id,checkpoint_ns,checkpoint_id,task_id,idx',
+            ignore_duplicates=not replace
+        ).execute()
+
+    def list_checkpoints(self,
+                         thread_id: Optional[str],
+                         checkpoint_ns: Optional[str],
+                         checkpoint_id: Optional[str] = None,
+                         before: Optional[str] = None,
+                         limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        query = self.client.table('checkpoints').select('*')
+        if thread_id is not None:
+            query = query.eq('thread_id', thread_id)
+        if checkpoint_ns is not None:
+            query = query.eq('checkpoint_ns', checkpoint_ns)
+        if checkpoint_id is not None:
+            query = query.eq('checkpoint_id', checkpoint_id)
+        if before is not None:
+            query = query.lt('checkpoint_id', before)
+        query = query.order('checkpoint_id', desc=True)
+        if limit:
+            query = query.limit(limit)
+        return [self._decode(row) for row in query.execute().data or []]
+
+    def get_blobs(self, thread_id: str, checkpoint_ns: str, versions: Dict[str, str]) -> List[Dict[str, Any]]:
+        if not versions:
+            return []
+        # One query for every channel, then keep the requested version of each
+        rows = self.client.table('checkpoint_blobs') \
+            .select('channel, version, type, blob') \
+            .eq('thread_id', thread_id) \
+            .eq('checkpoint_ns', checkpoint_ns) \
+            .in_('channel', list(versions)) \
+            .execute().data or []
+        return [self._decode(row) for row in rows if row['version'] == str(versions[row['channel']])]
+
+    def get_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[Dict[str, Any]]:
+        rows = self.client.table('checkpoint_writes') \
+            .select('task_id, channel, type, blob') \
+            .eq('thread_id', thread_id) \
+            .eq('checkpoint_ns', checkpoint_ns) \
+            .eq('checkpoint_id', checkpoint_id) \
+            .order('task_id').order('idx') \
+            .execute().data or []
+        return [self._decode(row) for row in rows]
+
+    def compact(self, thread_id: str, checkpoint_ns: str, oldest_kept_id: str, min_versions: Dict[str, str]):
+        for table in ('checkpoints', 'checkpoint_writes'):
+            self.client.table(table).delete() \
+                .eq('thread_id', thread_id) \
+                .eq('checkpoint_ns', checkpoint_ns) \
+                .lt('checkpoint_id', oldest_kept_id) \
+                .execute()
+        rows = self.client.table('checkpoint_blobs') \
+            .select('channel') \
+            .eq('thread_id', thread_id) \
+            .eq('checkpoint_ns', checkpoint_ns) \
+            .execute().data or []
+        channels = {row['channel'] for row in rows}
+        # One request per live channel for its older versions, one more for channels no longer live
+        for channel in channels & set(min_versions):
+            self.client.table('checkpoint_blobs').delete() \
+                .eq('thread_id', thread_id) \
+                .eq('checkpoint_ns', checkpoint_ns) \
+                .eq('channel', channel) \
+                .lt('version', str(min_versions[channel])) \
+                .execute()
+        dropped = sorted(channels - set(min_versions))
+        if dropped:
+            self.client.table('checkpoint_blobs').delete() \
+                .eq('thread_id', thread_id) \
+                .eq('checkpoint_ns', checkpoint_ns) \
+                .in_('channel', dropped) \
+                .execute()
+
+    def expired_threads(self, older_than: float) -> List[str]:
+        result = self.client.rpc('expired_checkpoint_threads', {'older_than': older_than}).execute()
+        return [row['thread_id'] for row in result.data or []]
+
+    def delete_threads(self, thread_ids: List[str]):
+        for table in ('checkpoints', 'checkpoint_blobs', 'checkpoint_writes'):
+            self.client.table(table).delete().in_('thread_id', thread_ids).execute()
+
+
+class CompactingCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpoint saver over a SQLite or Supabase checkpoint store.
+
+    Args:
+        store: SQLiteCheckpointStore or SupabaseCheckpointStore
+        keep_last: Checkpoints kept per thread, older ones are compacted away (0 keeps all)
+        ttl: Seconds after its last checkpoint before a thread is evicted (0 never evicts)
+        maintenance_interval: Minimum seconds between TTL eviction sweeps
+        serde: Serializer, compressed with CompressingSerializer by default
+    """
+
+    def __init__(self,
+                 store,
+                 keep_last: int = 20,
+                 ttl: float = 7 * 24 * 3600,
+                 maintenance_interval: float = 600.0,
+                 serde: Optional[SerializerProtocol] = None):
+        super().__init__(serde=serde or CompressingSerializer())
+        self.store = store
+        self.keep_last = keep_last
+        self.ttl = ttl
+        self.maintenance_interval = maintenance_interval
+        self._puts_since_compaction: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._counts_lock = threading.Lock()
+        self._last_eviction = 0.0
+
+    # versions
+
+    def get_next_version(self, current: Optional[str], channel: Any) -> str:
+        # Zero-padded so versions sort as text, which compaction relies on
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # reads
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        rows = self.store.list_checkpoints(
+            configurable["thread_id"],
+            configurable.get("checkpoint_ns", ""),
+            checkpoint_id=configurable.get("checkpoint_id"),
+            limit=1
+        )
+        return self._to_tuple(rows[0]) if rows else None
+
+    def list(self,
+             config: Optional[RunnableConfig],
+             *,
+             filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None,
+             limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        configurable = (config or {}).get("configurable", {})
+        rows = self.store.list_checkpoints(
+            configurable.get("thread_id"),
+            configurable.get("checkpoint_ns"),
+            checkpoint_id=configurable.get("checkpoint_id"),
+            before=before["configurable"]["checkpoint_id"] if before else None,
+            limit=None if filter else limit
+        )
+        returned = 0
+        for row in rows:
+            checkpoint_tuple = self._to_tuple(row)
+            if filter and not all(checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            yield checkpoint_tuple
+            returned += 1
+            if limit and returned >= limit:
+                return
+
+    def _to_tuple(self, row: Dict[str, Any]) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id = row["thread_id"], row["checkpoint_ns"], row["checkpoint_id"]
+        checkpoint = self.serde.loads_typed((row["type"], row["checkpoint"]))
+        blobs = self.store.get_blobs(thread_id, checkpoint_ns, checkpoint.get("channel_versions", {}))
+        checkpoint["channel_values"] = {
+            blob["channel"]: self.serde.loads_typed((blob["type"], blob["blob"]))
+            for blob in blobs if blob["type"] != "empty"
+        }
+        writes = self.store.get_writes(thread_id, checkpoint_ns, checkpoint_id)
+        parent_id = row.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=checkpoint,
+            metadata=self.serde.loads_typed((row["metadata_type"], row["metadata"])),
+            parent_config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+            if parent_id else None,
+            pending_writes=[
+                (write["task_id"], write["channel"], self.serde.loads_typed((write["type"], write["blob"])))
+                for write in writes
+            ]
+        )
+
+    # writes
+
+    def put(self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+
+        # Channel values are stored once per new version, the checkpoint only references them
+        stored = dict(checkpoint)
+        values = stored.pop("channel_values", {})
+        blobs = []
+        for channel, version in new_versions.items():
+            type_, blob = self.serde.dumps_typed(values[channel]) if channel in values else ("empty", None)
+            blobs.append({"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "channel": channel,
+                          "version": str(version), "type": type_, "blob": blob})
+        type_, data = self.serde.dumps_typed(stored)
+        metadata_type, metadata_data = self.serde.dumps_typed(metadata)
+        self.store.put_checkpoint({
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": configurable.get("checkpoint_id"),
+            "type": type_,
+            "checkpoint": data,
+            "metadata_type": metadata_type,
+            "metadata": metadata_data,
+            "created_at": time.time()
+        }, blobs)
+
+        self._maintain(thread_id, checkpoint_ns)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self,
+                   config: RunnableConfig,
+                   writes: Sequence[Tuple[str, Any]],
+                   task_id: str,
+                   task_path: str = "") -> None:
+        configurable = config["configurable"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            rows.append({
+                "thread_id": configurable["thread_id"],
+                "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+                "checkpoint_id": configurable["checkpoint_id"],
+                "task_id": task_id,
+                "idx": WRITES_IDX_MAP.get(channel, idx),
+                "channel": channel,
+                "type": type_,
+                "blob": blob,
+                "task_path": task_path
+            })
+        # Special channels (errors, interrupts) overwrite, regular writes are idempotent
+        self.store.put_writes(rows, replace=all(channel in WRITES_IDX_MAP for channel, _ in writes))
+
+    # maintenance
+
+    def _maintain(self, thread_id: str, checkpoint_ns: str):
+        key = (thread_id, checkpoint_ns)
+        with self._counts_lock:
+            puts = self._puts_since_compaction.pop(key, 0) + 1
+            due = bool(self.keep_last) and puts >= self.keep_last
+            self._puts_since_compaction[key] = 0 if due else puts
+            while len(self._puts_since_compaction) > MAX_TRACKED_THREADS:
+                # A forgotten count only delays that thread's next compaction
+                self._puts_since_compaction.popitem(last=False)
+        if due:
+            try:
+                self.compact(thread_id, checkpoint_ns)
+            except Exception as e:
+                logger.warning(f"Checkpoint compaction failed for thread {thread_id}: {e}")
+        if self.ttl and time.time() - self._last_eviction > self.maintenance_interval:
+            self._last_eviction = time.time()
+            try:
+                self.evict_expired()
+            except Exception as e:
+                logger.warning(f"Checkpoint eviction failed: {e}")
+
+    def compact(self, thread_id: str, checkpoint_ns: str = ""):
+        """Drop all but the latest keep_last checkpoints of a thread, with their writes and unreferenced blobs."""
+        rows = self.store.list_checkpoints(thread_id, checkpoint_ns, limit=self.keep_last)
+        if len(rows) < self.keep_last:
+            return
+        min_versions: Dict[str, str] = {}
+        for row in rows:
+            checkpoint = self.serde.loads_typed((row["type"], row["checkpoint"]))
+            for channel, version in checkpoint.get("channel_versions", {}).items():
+                version = str(version)
+                if channel not in min_versions or version < min_versions[channel]:
+                    min_versions[channel] = version
+        self.store.compact(thread_id, checkpoint_ns, rows[-1]["checkpoint_id"], min_versions)
+
+    def evict_expired(self) -> int:
+        """Delete threads whose last checkpoint is older than the TTL, returning how many were evicted."""
+        thread_ids = self.store.expired_threads(time.time() - self.ttl)
+        if thread_ids:
+            self._delete_threads(thread_ids)
+            logger.info(f"Evicted {len(thread_ids)} expired conversation threads")
+        return len(thread_ids)
+
+    def _delete_threads(self, thread_ids: List[str]):
+        self.store.delete_threads(thread_ids)
+        deleted = set(thread_ids)
+        with self._counts_lock:
+            for key in [key for key in self._puts_since_compaction if key[0] in deleted]:
+                del self._puts_since_compaction[key]
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete every checkpoint and write of a thread."""
+        self._delete_threads([thread_id])
+
+    # async variants, the stores are synchronous so they run in worker threads
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self,
+                    config: Optional[RunnableConfig],
+                    *,
+                    filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        tuples = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(self,
+                   config: RunnableConfig,
+                   checkpoint: Checkpoint,
+                   metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self,
+                          config: RunnableConfig,
+                          writes: Sequence[Tuple[str, Any]],
+                          task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def default_checkpoint_path() -> str:
+    """Default SQLite checkpoint file, workbench/checkpoints.sqlite at the project root."""
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(root, 'workbench', 'checkpoints.sqlite')
+
+
+def create_checkpointer(backend: Optional[str] = None, supabase=None) -> BaseCheckpointSaver:
+    """
+    Build the checkpointer selected by CHECKPOINT_BACKEND.
+
+    Backends are "sqlite" (default, CHECKPOINT_DB_PATH), "supabase" for shared
+    multi-node state, and "memory" for the old non-persistent MemorySaver.
+    CHECKPOINT_KEEP_LAST and CHECKPOINT_TTL tune compaction and eviction.
+
+    Args:
+        backend: Overrides CHECKPOINT_BACKEND
+        supabase: Supabase client for the supabase backend
+
+    Returns:
+        A LangGraph checkpoint saver
+    """
+    backend = (backend or os.getenv('CHECKPOINT_BACKEND', 'sqlite')).lower()
+    keep_last = int(os.getenv('CHECKPOINT_KEEP_LAST', '20'))
+    ttl = float(os.getenv('CHECKPOINT_TTL', str(7 * 24 * 3600)))
+
+    if backend == 'memory':
+        return MemorySaver()
+    if backend == 'supabase':
+        if supabase is None:
+            logger.warning("Supabase checkpoint backend selected without a Supabase client, using SQLite")
+        else:
+            return CompactingCheckpointSaver(SupabaseCheckpointStore(supabase), keep_last=keep_last, ttl=ttl)
+    elif backend != 'sqlite':
+        logger.warning(f"Unknown CHECKPOINT_BACKEND {backend}, using SQLite")
+
+    path = os.getenv('CHECKPOINT_DB_PATH') or default_checkpoint_path()
+    return CompactingCheckpointSaver(SQLiteCheckpointStore(path), keep_last=keep_last, ttl=ttl)
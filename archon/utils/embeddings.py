@@ -0,0 +1,420 @@
+"""
+Embedding Service Module
+
+Shared access to the embeddings API for the coder agents, MCP template matching
+and the documentation crawler. Vectors are cached by a content hash of the model
+name and input text in a size-bounded in-memory LRU, with an optional SQLite tier
+that keeps them across processes and restarts.
+"""
+
+import os
+import array
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger('embeddings')
+
+DEFAULT_EMBEDDING_MODEL = 'text-embedding-3-small'
+EMBEDDING_DIMENSIONS = 1536
+
+
+def embedding_cache_key(text: str, model: str) -> str:
+    """
+    Build the content-hash key used to cache an embedding.
+
+    Args:
+        text: Text being embedded
+        model: Embedding model name
+
+    Returns:
+        Hex digest identifying the (model, text) pair
+    """
+    digest = hashlib.sha256()
+    digest.update(model.encode('utf-8'))
+    digest.update(b'\x00')
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """Size-bounded LRU of embedding vectors with an optional SQLite tier."""
+
+    def __init__(self, max_entries: int = 4096, db_path: Optional[str] = None):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of vectors held in memory
+            db_path: Path of the SQLite file for the persistent tier, or None to disable it
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL)"
+                )
+                self._db.commit()
+                logger.info(f"Embedding cache persisted to {db_path}")
+            except sqlite3.Error as e:
+                logger.error(f"Could not open embedding cache database {db_path}: {e}")
+                self._db = None
+
+    def _remember(self, key: str, vector: List[float]):
+        """Insert a vector into the memory tier, evicting the least recently used."""
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Return the cached vector for a key, or None on a miss."""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"Embedding cache lookup failed: {e}")
+                    row = None
+                if row is not None:
+                    vector = array.array('f', row[0]).tolist()
+                    self._remember(key, vector)
+                    self.hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, vector: List[float], model: str = DEFAULT_EMBEDDING_MODEL):
+        """Store a vector in the memory tier and, if enabled, the SQLite tier."""
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                        (key, model, array.array('f', vector).tobytes())
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Embedding cache write failed: {e}")
+
+    def clear(self):
+        """Drop every cached vector from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the number of resident vectors."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries)
+        }
+
+
+class EmbeddingService:
+    """Cached front end to the embeddings API shared by every caller."""
+
+    def __init__(self, cache: EmbeddingCache):
+        """Initialize the service.
+
+        Args:
+            cache: Cache consulted before any API call
+        """
+        self.cache = cache
+        # Requests currently on the wire, so concurrent callers asking for the
+        # same text wait on one API call instead of issuing their own
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def resolve_model(model: Optional[str] = None) -> str:
+        """Return the embedding model to use, defaulting to EMBEDDING_MODEL."""
+        return model or os.getenv('EMBEDDING_MODEL', DEFAULT_EMBEDDING_MODEL)
+
+    async def embed(self, text: str, openai_client, model: Optional[str] = None) -> List[float]:
+        """
+        Get the embedding for a single text, using the cache when possible.
+
+        Args:
+            text: Text to embed
+            openai_client: AsyncOpenAI client used on a cache miss
+            model: Embedding model, defaults to EMBEDDING_MODEL
+
+        Returns:
+            Embedding vector
+        """
+        model = self.resolve_model(model)
+        key = embedding_cache_key(text, model)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(key)
+        while pending is not None and pending.get_loop() is loop:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The caller making the request was cancelled, so one of its waiters takes over
+                pending = self._pending.get(key)
+
+        future = loop.create_future()
+        self._pending[key] = future
+        try:
+            response = await openai_client.embeddings.create(model=model, input=text)
+            vector = response.data[0].embedding
+            self.cache.put(key, vector, model)
+            future.set_result(vector)
+            return vector
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        except BaseException:
+            # Cancelled: wake the waiters instead of leaving them on a future that never resolves
+            future.cancel()
+            raise
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    async def embed_many(self, texts: Sequence[str], openai_client, model: Optional[str] = None) -> List[List[float]]:
+        """
+        Get embeddings for several texts with a single API call for the cache misses.
+
+        Args:
+            texts: Texts to embed
+            openai_client: AsyncOpenAI client used for the cache misses
+            model: Embedding model, defaults to EMBEDDING_MODEL
+
+        Returns:
+            Embedding vectors in the same order as texts
+        """
+        model = self.resolve_model(model)
+        keys = [embedding_cache_key(text, model) for text in texts]
+        results: List[Optional[List[float]]] = [self.cache.get(key) for key in keys]
+
+        # Embed each distinct missing text once
+        missing: Dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, results):
+            if vector is None and key not in missing:
+                missing[key] = text
+
+        if missing:
+            missing_keys = list(missing.keys())
+            response = await openai_client.embeddings.create(
+                model=model,
+                input=[missing[key] for key in missing_keys]
+            )
+            fetched = {}
+            for item in response.data:
+                key = missing_keys[item.index]
+                fetched[key] = item.embedding
+                self.cache.put(key, item.embedding, model)
+            results = [vector if vector is not None else fetched[key] for key, vector in zip(keys, results)]
+
+        return results
+
+
+_embedding_service: Optional[EmbeddingService] = None
+_embedding_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """
+    Return the process-wide embedding service.
+
+    The memory tier holds EMBEDDING_CACHE_SIZE vectors (default 4096). Setting
+    EMBEDDING_CACHE_PATH enables the SQLite tier at that path.
+    """
+    global _embedding_service
+    if _embedding_service is None:
+        with _embedding_service_lock:
+            if _embedding_service is None:
+                cache = EmbeddingCache(
+                    max_entries=int(os.getenv('EMBEDDING_CACHE_SIZE', '4096')),
+                    db_path=os.getenv('EMBEDDING_CACHE_PATH') or None
+                )
+                _embedding_service = EmbeddingService(cache)
+    return _embedding_service
+
+
+async def get_embedding(text: str, openai_client, model: Optional[str] = None) -> List[float]:
+    """Get an embedding vector through the shared, cached embedding service."""
+    return await get_embedding_service().embed(text, openai_client, model)
+
+
+# Queued by EmbeddingBatcher.close() to stop the worker after the last batch
+_CLOSE = object()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token) used for batch sizing."""
+    return len(text) // 4 + 1
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces individual embedding requests into batched API calls.
+
+    Callers await embed() for one text at a time; a background worker gathers
+    queued texts until the batch reaches its token budget or item limit, or the
+    flush timeout expires, then embeds them in one request and hands each caller
+    its own vector back.
+    """
+
+    def __init__(self,
+                 openai_client,
+                 model: Optional[str] = None,
+                 service: Optional[EmbeddingService] = None,
+                 max_batch_tokens: int = 100000,
+                 max_batch_size: int = 256,
+                 flush_interval: float = 0.2,
+                 max_queue: int = 1024):
+        """Initialize the batcher.
+
+        Args:
+            openai_client: AsyncOpenAI client used for the batched calls
+            model: Embedding model, defaults to EMBEDDING_MODEL
+            service: Embedding service to batch through, defaults to the shared one
+            max_batch_tokens: Estimated token budget of a single request
+            max_batch_size: Maximum number of inputs in a single request
+            flush_interval: Seconds to wait for more inputs before sending a partial batch
+            max_queue: Maximum number of queued texts before embed() applies backpressure
+        """
+        self.openai_client = openai_client
+        self.service = service or get_embedding_service()
+        self.model = self.service.resolve_model(model)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.requests_sent = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._carry = None
+
+    async def __aenter__(self) -> "EmbeddingBatcher":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def start(self):
+        """Start the background worker on the running event loop."""
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Flush every queued text and stop the background worker."""
+        if self._worker is None:
+            return
+        await self._queue.put(_CLOSE)
+        await self._worker
+        self._worker = None
+        logger.info(f"Embedding batcher sent {self.requests_sent} batched requests")
+
+    async def embed(self, text: str) -> List[float]:
+        """
+        Queue a text for the next batch and wait for its vector.
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            Embedding vector
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _next_item(self, timeout: Optional[float]):
+        """Return the carried-over item or the next queued one, or None on timeout."""
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+            return item
+        if timeout is None:
+            return await self._queue.get()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def _run(self):
+        """Worker loop: build batches by token budget and flush them."""
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            first = await self._next_item(None)
+            if first is _CLOSE:
+                break
+
+            batch = [first]
+            tokens = estimate_tokens(first[0])
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch_size:
+                item = await self._next_item(max(0.0, deadline - loop.time()))
+                if item is None:
+                    break
+                if item is _CLOSE:
+                    closing = True
+                    break
+                item_tokens = estimate_tokens(item[0])
+                if tokens + item_tokens > self.max_batch_tokens:
+                    self._carry = item
+                    break
+                batch.append(item)
+                tokens += item_tokens
+
+            await self._flush(batch)
+
+        if self._carry is not None:
+            await self._flush([self._carry])
+            self._carry = None
+
+    async def _flush(self, batch):
+        """Embed one batch and resolve the waiting futures."""
+        texts = [text for text, _ in batch]
+        try:
+            vectors = await self.service.embed_many(texts, self.openai_client, self.model)
+            self.requests_sent += 1
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+        except Exception as e:
+            logger.error(f"Error embedding batch of {len(batch)} texts: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
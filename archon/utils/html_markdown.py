@@ -0,0 +1,34 @@
+"""
+HTML to Markdown conversion for crawled documentation pages.
+
+Kept free of import-time side effects (no API clients) so it can run in
+process-pool workers without re-initializing the crawler.
+"""
+
+import re
+import html2text
+
+_html_converter = None
+
+
+def _get_converter() -> html2text.HTML2Text:
+    """Return this process's HTML to Markdown converter, creating it on first use."""
+    global _html_converter
+    if _html_converter is None:
+        _html_converter = html2text.HTML2Text()
+        _html_converter.ignore_links = False
+        _html_converter.ignore_images = False
+        _html_converter.ignore_tables = False
+        _html_converter.body_width = 0  # No wrapping
+    return _html_converter
+
+
+def html_to_markdown(html: str) -> str:
+    """Convert an HTML page to cleaned-up markdown."""
+    # Convert HTML to Markdown
+    markdown = _get_converter().handle(html)
+
+    # Clean up the markdown
+    markdown = re.sub(r'\n{3,}', '\n\n', markdown)  # Remove excessive newlines
+
+    return markdown
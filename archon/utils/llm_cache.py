@@ -0,0 +1,375 @@
+"""
+LLM Response Cache Module
+
+Shared wrapper for the low-temperature classification and extraction prompts
+(tool detection, template type, customization directives, requirement
+extraction, documentation titles) whose answers are stable for the same input.
+Responses are cached by a hash of the model, messages and request parameters in
+a size-bounded in-memory LRU with a TTL, backed by SQLite so they survive
+restarts. Callers can also opt into an embedding-similarity tier that answers
+near-duplicate requests from the response to an earlier, almost identical one.
+"""
+
+import os
+import json
+import math
+import time
+import array
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from archon.utils.embeddings import get_embedding_service
+
+logger = logging.getLogger('llm_cache')
+
+
+def llm_cache_key(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """
+    Build the content-hash key used to cache a chat completion.
+
+    Args:
+        model: Chat model name
+        messages: Chat messages sent to the model
+        params: Remaining request parameters (temperature, max_tokens, ...)
+
+    Returns:
+        Hex digest identifying the request
+    """
+    payload = json.dumps({'model': model, 'messages': messages, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def similarity_scope(name: str, model: str, params: Dict[str, Any]) -> str:
+    """Key grouping the requests that may answer each other by similarity: same call site, model and parameters."""
+    payload = json.dumps({'name': name, 'model': model, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class LLMResponseCache:
+    """Size-bounded, expiring LRU of completion texts with a SQLite tier and an optional similarity index."""
+
+    def __init__(self,
+                 max_entries: int = 2048,
+                 ttl: float = 7 * 24 * 3600,
+                 db_path: Optional[str] = None,
+                 max_similar_per_scope: int = 512):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of responses held in memory and in SQLite
+            ttl: Seconds a response stays valid (0 keeps it until evicted)
+            db_path: Path of the SQLite file for the persistent tier, or None to disable it
+            max_similar_per_scope: Embeddings kept per similarity scope for near-duplicate lookups
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_similar_per_scope = max_similar_per_scope
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._vectors: Dict[str, "OrderedDict[str, List[float]]"] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, model TEXT NOT NULL, content TEXT NOT NULL, "
+                    "scope TEXT, embedding BLOB, created_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_scope ON responses (scope)")
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_created_at ON responses (created_at)")
+                self._db.commit()
+                logger.info(f"LLM response cache persisted to {db_path}")
+            except sqlite3.Error as e:
+                logger.error(f"Could not open LLM response cache database {db_path}: {e}")
+                self._db = None
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, content: str, created_at: float):
+        """Insert a response into the memory tier, evicting the least recently used."""
+        self._entries[key] = (content, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if not self._expired(entry[1]):
+                self._entries.move_to_end(key)
+                return entry[0]
+            del self._entries[key]
+
+        if self._db is not None:
+            try:
+                row = self._db.execute(
+                    "SELECT content, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"LLM response cache lookup failed: {e}")
+                row = None
+            if row is not None and not self._expired(row[1]):
+                self._remember(key, row[0], row[1])
+                return row[0]
+        return None
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None on a miss."""
+        with self._lock:
+            content = self._lookup(key)
+            if content is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return content
+
+    def _scope_vectors(self, scope: str) -> "OrderedDict[str, List[float]]":
+        """Return the similarity index of a scope, loading it from SQLite on first use."""
+        vectors = self._vectors.get(scope)
+        if vectors is None:
+            vectors = OrderedDict()
+            if self._db is not None:
+                try:
+                    rows = self._db.execute(
+                        "SELECT key, embedding FROM responses WHERE scope = ? AND embedding IS NOT NULL "
+                        "ORDER BY created_at DESC LIMIT ?",
+                        (scope, self.max_similar_per_scope)
+                    ).fetchall()
+                except sqlite3.Error as e:
+                    logger.warning(f"LLM response cache similarity load failed: {e}")
+                    rows = []
+                for key, blob in reversed(rows):
+                    vectors[key] = array.array('f', blob).tolist()
+            self._vectors[scope] = vectors
+        return vectors
+
+    def get_similar(self, scope: str, embedding: List[float], threshold: float) -> Optional[str]:
+        """Return the response of the most similar cached request in a scope, if it clears the threshold."""
+        with self._lock:
+            best_key, best_score = None, threshold
+            for key, vector in self._scope_vectors(scope).items():
+                score = cosine_similarity(embedding, vector)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            content = self._lookup(best_key)
+            if content is None:
+                self._vectors[scope].pop(best_key, None)
+                return None
+            self.similar_hits += 1
+            logger.info(f"LLM response cache similarity hit ({best_score:.3f})")
+            return content
+
+    def put(self,
+            key: str,
+            content: str,
+            model: str,
+            scope: Optional[str] = None,
+            embedding: Optional[List[float]] = None):
+        """Store a response in the memory tier and, if enabled, the SQLite tier."""
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, content, created_at)
+            if scope is not None and embedding is not None:
+                vectors = self._scope_vectors(scope)
+                vectors[key] = embedding
+                while len(vectors) > self.max_similar_per_scope:
+                    vectors.popitem(last=False)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses (key, model, content, scope, embedding, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, model, content, scope,
+                         array.array('f', embedding).tobytes() if embedding is not None else None, created_at)
+                    )
+                    # Keep the persistent tier within the same bounds as the memory tier
+                    if self.ttl:
+                        self._db.execute("DELETE FROM responses WHERE created_at < ?", (created_at - self.ttl,))
+                    self._db.execute(
+                        "DELETE FROM responses WHERE key NOT IN "
+                        "(SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)",
+                        (self.max_entries,)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"LLM response cache write failed: {e}")
+
+    def clear(self):
+        """Drop every cached response from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the number of resident responses."""
+        return {
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "entries": len(self._entries)
+        }
+
+
+class LLMService:
+    """Cached front end to chat completions for deterministic prompts."""
+
+    def __init__(self, cache: Optional[LLMResponseCache], similarity_threshold: Optional[float] = None):
+        """Initialize the service.
+
+        Args:
+            cache: Cache consulted before any API call, or None to always call the API
+            similarity_threshold: Cosine similarity needed for a near-duplicate hit, or None to disable that tier
+        """
+        self.cache = cache
+        self.similarity_threshold = similarity_threshold
+        # Requests currently on the wire, so concurrent identical prompts share one API call
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def complete(self,
+                       openai_client,
+                       name: str,
+                       model: str,
+                       messages: List[Dict[str, Any]],
+                       similar_text: Optional[str] = None,
+                       validate: Optional[Callable[[str], Any]] = None,
+                       **params) -> str:
+        """
+        Run a chat completion, answering from the cache when possible.
+
+        Args:
+            openai_client: AsyncOpenAI client used on a cache miss
+            name: Call site name, which scopes similarity matches
+            model: Chat model name
+            messages: Chat messages
+            similar_text: Text whose near-duplicates may share this response (usually the user query)
+            validate: Called with the response text; responses it rejects by raising are returned but not cached
+            **params: Other chat.completions.create parameters
+
+        Returns:
+            The response message content
+        """
+        if self.cache is None:
+            response = await openai_client.chat.completions.create(model=model, messages=messages, **params)
+            return response.choices[0].message.content
+
+        key = llm_cache_key(model, messages, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        scope, embedding = None, None
+        if similar_text and self.similarity_threshold is not None:
+            scope = similarity_scope(name, model, params)
+            try:
+                embedding = await get_embedding_service().embed(similar_text, openai_client)
+                cached = self.cache.get_similar(scope, embedding, self.similarity_threshold)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                logger.warning(f"LLM response cache similarity lookup failed for {name}: {e}")
+                scope, embedding = None, None
+
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(key)
+        while pending is not None and pending.get_loop() is loop:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The caller making the request was cancelled, so one of its waiters takes over
+                pending = self._pending.get(key)
+
+        future = loop.create_future()
+        self._pending[key] = future
+        try:
+            response = await openai_client.chat.completions.create(model=model, messages=messages, **params)
+            content = response.choices[0].message.content
+            future.set_result(content)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        except BaseException:
+            # Cancelled: wake the waiters instead of leaving them on a future that never resolves
+            future.cancel()
+            raise
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+        try:
+            if validate is not None:
+                validate(content)
+            self.cache.put(key, content, model, scope, embedding)
+        except Exception as e:
+            logger.warning(f"Not caching invalid {name} response: {e}")
+        return content
+
+
+_llm_service: Optional[LLMService] = None
+_llm_service_lock = threading.Lock()
+
+
+def get_llm_service() -> LLMService:
+    """
+    Return the process-wide cached LLM service.
+
+    LLM_CACHE=0 disables caching. The cache holds LLM_CACHE_SIZE responses
+    (default 2048) for LLM_CACHE_TTL seconds (default a week) and persists them
+    to LLM_CACHE_PATH (default workbench/llm_cache.sqlite). Setting
+    LLM_SIMILARITY_THRESHOLD (e.g. 0.97) enables near-duplicate matching.
+    """
+    global _llm_service
+    if _llm_service is None:
+        with _llm_service_lock:
+            if _llm_service is None:
+                cache = None
+                if os.getenv('LLM_CACHE', '1') != '0':
+                    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+                    cache = LLMResponseCache(
+                        max_entries=int(os.getenv('LLM_CACHE_SIZE', '2048')),
+                        ttl=float(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600))),
+                        db_path=os.getenv('LLM_CACHE_PATH') or os.path.join(root, 'workbench', 'llm_cache.sqlite')
+                    )
+                threshold = os.getenv('LLM_SIMILARITY_THRESHOLD')
+                _llm_service = LLMService(cache, float(threshold) if threshold else None)
+    return _llm_service
+
+
+async def cached_completion(openai_client,
+                            name: str,
+                            model: str,
+                            messages: List[Dict[str, Any]],
+                            similar_text: Optional[str] = None,
+                            validate: Optional[Callable[[str], Any]] = None,
+                            **params) -> str:
+    """Run a chat completion through the shared, cached LLM service and return its content."""
+    return await get_llm_service().complete(
+        openai_client, name, model, messages, similar_text=similar_text, validate=validate, **params
+    )
@@ -0,0 +1,354 @@
+"""
+Model Client Module
+
+Single access point to the chat models for every graph node. Each provider
+(base URL and API key) gets one AsyncOpenAI client on a pooled httpx transport,
+so keep-alive connections and TLS sessions are reused across nodes and turns
+instead of being rebuilt by each caller. ``ModelClient.run`` adds retries with
+jittered exponential backoff and paces requests per model from the rate-limit
+headers the provider returns, so concurrent runs slow down together before
+they hit 429s rather than after.
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+logger = logging.getLogger('model_client')
+
+DEFAULT_BASE_URL = 'https://api.openai.com/v1'
+NO_API_KEY = 'no-llm-api-key-provided'
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def parse_reset_seconds(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a rate-limit reset header into seconds.
+
+    Accepts plain seconds ("1.5") and OpenAI's duration format ("6m0s", "20ms").
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Return the delay requested by retry-after-ms or retry-after, if any."""
+    if headers is None:
+        return None
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    return parse_reset_seconds(headers.get('retry-after'))
+
+
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """
+    Pooled httpx transport with one connection pool per event loop.
+
+    Pooled connections belong to the loop that opened them, and Streamlit and
+    the CLI each run the graph on their own loops, so the pool is kept per loop
+    while the provider's client is shared.
+    """
+
+    def __init__(self, limits: httpx.Limits):
+        self.limits = limits
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = \
+            weakref.WeakKeyDictionary()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(limits=self.limits)
+            self._transports[loop] = transport
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self):
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+@dataclass
+class RateLimitState:
+    """Latest rate-limit budget reported for one model."""
+    remaining_requests: Optional[int] = None
+    requests_reset_at: float = 0.0
+    remaining_tokens: Optional[int] = None
+    tokens_reset_at: float = 0.0
+    blocked_until: float = 0.0
+
+    def delay(self, now: float) -> float:
+        """Seconds to wait before the next request may be sent."""
+        delay = max(0.0, self.blocked_until - now)
+        if self.remaining_requests is not None and self.remaining_requests <= 0:
+            delay = max(delay, self.requests_reset_at - now)
+        if self.remaining_tokens is not None and self.remaining_tokens <= 0:
+            delay = max(delay, self.tokens_reset_at - now)
+        return delay
+
+
+class RateLimiter:
+    """Per-model request pacing driven by x-ratelimit-* response headers."""
+
+    def __init__(self):
+        self._states: Dict[str, RateLimitState] = {}
+        self._lock = threading.Lock()
+
+    def state(self, model: str) -> RateLimitState:
+        with self._lock:
+            return self._states.setdefault(model, RateLimitState())
+
+    async def wait(self, model: str):
+        """Wait until the model's budget allows another request, then reserve it."""
+        state = self.state(model)
+        while True:
+            delay = state.delay(time.monotonic())
+            if delay <= 0:
+                break
+            logger.info(f"Pacing {model} for {delay:.2f}s to stay within its rate limit")
+            await asyncio.sleep(delay)
+        with self._lock:
+            # Reserve the request locally so concurrent callers don't all spend the last one
+            if state.remaining_requests is not None:
+                state.remaining_requests -= 1
+
+    def update(self, model: str, headers):
+        """Record the budget reported by a response."""
+        if headers is None:
+            return
+        state = self.state(model)
+        now = time.monotonic()
+        with self._lock:
+            if headers.get('x-ratelimit-remaining-requests') is not None:
+                try:
+                    state.remaining_requests = int(headers['x-ratelimit-remaining-requests'])
+                    state.requests_reset_at = now + (parse_reset_seconds(headers.get('x-ratelimit-reset-requests')) or 0.0)
+                except ValueError:
+                    pass
+            if headers.get('x-ratelimit-remaining-tokens') is not None:
+                try:
+                    state.remaining_tokens = int(headers['x-ratelimit-remaining-tokens'])
+                    state.tokens_reset_at = now + (parse_reset_seconds(headers.get('x-ratelimit-reset-tokens')) or 0.0)
+                except ValueError:
+                    pass
+
+    def block(self, model: str, seconds: float):
+        """Hold every request for a model for a while, e.g. after a 429."""
+        state = self.state(model)
+        with self._lock:
+            state.blocked_until = max(state.blocked_until, time.monotonic() + seconds)
+
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError
+)
+
+
+class ModelClient:
+    """
+    Shared, pooled chat-completion client.
+
+    Args:
+        max_retries: Retries after a rate-limit, connection, timeout or server error
+        backoff_base: First backoff ceiling in seconds, doubled on every retry
+        backoff_max: Largest backoff ceiling in seconds
+        max_connections: Connections per provider and event loop
+        timeout: Request timeout in seconds
+    """
+
+    def __init__(self,
+                 max_retries: int = 4,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 30.0,
+                 max_connections: int = 20,
+                 timeout: float = 120.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter()
+        self._clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def resolve_provider(base_url: Optional[str] = None, api_key: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """
+        Return the (base_url, api_key) to use, or None when no model is configured.
+
+        Defaults to a local (Ollama) BASE_URL with LLM_API_KEY, and to the OpenAI
+        API with OPENAI_API_KEY otherwise, matching how the nodes configured their
+        clients.
+        """
+        if base_url is None:
+            env_url = os.getenv('BASE_URL') or DEFAULT_BASE_URL
+            base_url = env_url if 'localhost' in env_url.lower() else DEFAULT_BASE_URL
+        if api_key is None:
+            if 'localhost' in base_url.lower():
+                api_key = os.getenv('LLM_API_KEY') or NO_API_KEY
+            else:
+                api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            return None
+        return base_url, api_key
+
+    def get_client(self, base_url: Optional[str] = None, api_key: Optional[str] = None) -> Optional[AsyncOpenAI]:
+        """
+        Return the shared AsyncOpenAI client of a provider, or None when no model is configured.
+
+        The client keeps the SDK's own retries for callers that use it directly.
+        """
+        provider = self.resolve_provider(base_url, api_key)
+        if provider is None:
+            return None
+        with self._lock:
+            client = self._clients.get(provider)
+            if client is None:
+                client = AsyncOpenAI(
+                    base_url=provider[0],
+                    api_key=provider[1],
+                    http_client=httpx.AsyncClient(transport=LoopLocalTransport(self.limits), timeout=self.timeout)
+                )
+                self._clients[provider] = client
+            return client
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Full jitter, but never sooner than the provider asked for
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        requested = retry_after_seconds(getattr(getattr(error, 'response', None), 'headers', None))
+        return max(delay, requested or 0.0)
+
+    async def complete(self,
+                       messages: List[Dict[str, Any]],
+                       model: Optional[str] = None,
+                       base_url: Optional[str] = None,
+                       api_key: Optional[str] = None,
+                       **params) -> Any:
+        """
+        Create a chat completion with pacing and retries.
+
+        Args:
+            messages: Chat messages
+            model: Model name, defaults to PRIMARY_MODEL
+            base_url: Provider base URL, defaults to BASE_URL
+            api_key: Provider API key, see resolve_provider
+            **params: Other chat.completions.create parameters
+
+        Returns:
+            The ChatCompletion
+        """
+        client = self.get_client(base_url, api_key)
+        if client is None:
+            raise RuntimeError("No model provider configured: set OPENAI_API_KEY or BASE_URL/LLM_API_KEY")
+        model = model or os.getenv('PRIMARY_MODEL', 'gpt-4o-mini')
+        # Retries are handled here so they respect the shared pacing
+        client = client.with_options(max_retries=0)
+
+        attempt = 0
+        while True:
+            await self.rate_limiter.wait(model)
+            try:
+                raw = await client.chat.completions.with_raw_response.create(model=model, messages=messages, **params)
+                self.rate_limiter.update(model, raw.headers)
+                return raw.parse()
+            except RETRYABLE_ERRORS as e:
+                response = getattr(e, 'response', None)
+                if response is not None:
+                    self.rate_limiter.update(model, response.headers)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                if isinstance(e, openai.RateLimitError):
+                    self.rate_limiter.block(model, delay)
+                attempt += 1
+                logger.warning(f"{type(e).__name__} from {model}, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def run(self,
+                  prompt: str,
+                  model: Optional[str] = None,
+                  max_tokens: Optional[int] = None,
+                  system: Optional[str] = None,
+                  **params) -> str:
+        """
+        Send a single prompt and return the response text.
+
+        Args:
+            prompt: User prompt
+            model: Model name, defaults to PRIMARY_MODEL
+            max_tokens: Completion token limit
+            system: Optional system prompt
+            **params: Other chat.completions.create parameters
+
+        Returns:
+            The response message content
+        """
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        if max_tokens is not None:
+            params['max_tokens'] = max_tokens
+        response = await self.complete(messages, model=model, **params)
+        return response.choices[0].message.content or ""
+
+
+_model_client: Optional[ModelClient] = None
+_model_client_lock = threading.Lock()
+
+
+def get_model_client() -> ModelClient:
+    """
+    Return the process-wide model client.
+
+    MODEL_MAX_RETRIES (default 4), MODEL_MAX_CONNECTIONS (default 20) and
+    MODEL_TIMEOUT (default 120 seconds) tune it.
+    """
+    global _model_client
+    if _model_client is None:
+        with _model_client_lock:
+            if _model_client is None:
+                _model_client = ModelClient(
+                    max_retries=int(os.getenv('MODEL_MAX_RETRIES', '4')),
+                    max_connections=int(os.getenv('MODEL_MAX_CONNECTIONS', '20')),
+                    timeout=float(os.getenv('MODEL_TIMEOUT', '120'))
+                )
+    return _model_client
+
+
+def get_openai_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> Optional[AsyncOpenAI]:
+    """Return the shared, pooled AsyncOpenAI client of a provider, or None when no model is configured."""
+    return get_model_client().get_client(base_url, api_key)
+
+
+async def run(prompt: str, model: Optional[str] = None, max_tokens: Optional[int] = None, **params) -> str:
+    """Send a single prompt through the shared model client and return the response text."""
+    return await get_model_client().run(prompt, model=model, max_tokens=max_tokens, **params)
@@ -0,0 +1,248 @@
+"""
+Prompt Budget Module
+
+Token-aware prompt assembly for the graph nodes. Prompts used to embed whole
+artefacts (the scope in create_architecture, the architecture in
+create_implementation_plan) and documentation pages cut at a fixed character
+count. Here tokens are counted with a cached tiktoken encoder, and prompt
+sections are trimmed or summarized lowest priority first until the prompt fits
+the model's context window minus the room reserved for the completion. Prompt
+and completion token counts are recorded per node.
+"""
+
+import os
+import logging
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    # Counting falls back to a four-characters-per-token estimate
+    tiktoken = None
+
+from archon.utils.model_client import run
+
+logger = logging.getLogger('prompt_budget')
+
+# Context windows by model name prefix, longest prefix wins
+CONTEXT_WINDOWS = {
+    'gpt-4.1': 1047576,
+    'gpt-4o': 128000,
+    'gpt-4-turbo': 128000,
+    'gpt-4': 8192,
+    'gpt-3.5-turbo': 16385,
+    'o1': 200000,
+    'o3': 200000,
+    'o4': 200000,
+    'claude': 200000,
+}
+DEFAULT_CONTEXT_WINDOW = 32000
+DEFAULT_COMPLETION_RESERVE = 4096
+
+TRIM_MARKER = "\n\n[... trimmed {count} tokens to fit the context window ...]"
+
+Summarizer = Callable[[str, int], Awaitable[str]]
+
+
+@lru_cache(maxsize=32)
+def get_encoder(model: str):
+    """Return the tiktoken encoding for a model, cached per model name, or None without tiktoken."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Unknown or non-OpenAI models are counted with the closest general-purpose encoding
+            return tiktoken.get_encoding('o200k_base' if model.startswith(('gpt-4o', 'gpt-4.1', 'o')) else 'cl100k_base')
+    except Exception as e:
+        # tiktoken downloads encodings on first use, which fails offline
+        logger.warning(f"Could not load a tokenizer for {model}, estimating token counts instead: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = 'gpt-4o-mini') -> int:
+    """Count the tokens of a text for a model."""
+    if not text:
+        return 0
+    encoder = get_encoder(model)
+    if encoder is None:
+        return len(text) // 4 + 1
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def context_window(model: str) -> int:
+    """Return a model's context window in tokens, overridable with MODEL_CONTEXT_WINDOW."""
+    override = os.getenv('MODEL_CONTEXT_WINDOW')
+    if override:
+        return int(override)
+    name = model.split('/')[-1].split(':')[-1]
+    matches = [prefix for prefix in CONTEXT_WINDOWS if name.startswith(prefix)]
+    return CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = 'gpt-4o-mini') -> str:
+    """
+    Cut a text to at most max_tokens, marking how much was removed.
+
+    Args:
+        text: Text to cut
+        max_tokens: Token budget for the result
+        model: Model whose tokenizer is used
+
+    Returns:
+        The text unchanged if it fits, else its head followed by a trim marker
+    """
+    total = count_tokens(text, model)
+    if total <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(TRIM_MARKER.format(count=total), model))
+    encoder = get_encoder(model)
+    if encoder is None:
+        head = text[:keep * 4]
+    else:
+        head = encoder.decode(encoder.encode(text, disallowed_special=())[:keep])
+    return head + TRIM_MARKER.format(count=total - keep)
+
+
+@dataclass
+class PromptSection:
+    """
+    One variable part of a prompt.
+
+    Attributes:
+        name: Placeholder name in the template
+        text: Section content
+        priority: Higher priorities are shrunk last
+        min_tokens: The section is never shrunk below this
+        summarize: Shrink by summarizing instead of truncating
+    """
+    name: str
+    text: str
+    priority: int = 0
+    min_tokens: int = 0
+    summarize: bool = False
+
+
+def prompt_budget(model: str, reserve: int = DEFAULT_COMPLETION_RESERVE) -> int:
+    """Tokens available to a prompt: the context window minus the completion reserve, capped by PROMPT_MAX_TOKENS."""
+    budget = context_window(model) - reserve
+    cap = os.getenv('PROMPT_MAX_TOKENS')
+    return min(budget, int(cap)) if cap else budget
+
+
+async def assemble_prompt(template: str,
+                          sections: List[PromptSection],
+                          model: str = 'gpt-4o-mini',
+                          budget: Optional[int] = None,
+                          summarizer: Optional[Summarizer] = None) -> str:
+    """
+    Fill a template with sections, shrinking them by priority to fit a token budget.
+
+    Sections are shrunk lowest priority first, each only as far as needed and
+    never below its min_tokens. Sections marked summarize go through the
+    summarizer when one is given, falling back to truncation.
+
+    Args:
+        template: str.format template with a placeholder per section name
+        sections: Sections to fill in
+        model: Model whose tokenizer and context window apply
+        budget: Prompt token budget, defaults to prompt_budget(model)
+        summarizer: Async callable(text, max_tokens) returning a shorter text
+
+    Returns:
+        The formatted prompt
+    """
+    budget = budget if budget is not None else prompt_budget(model)
+    texts = {section.name: section.text or "" for section in sections}
+    fixed = count_tokens(template.format(**{name: "" for name in texts}), model)
+    sizes = {name: count_tokens(text, model) for name, text in texts.items()}
+    excess = fixed + sum(sizes.values()) - budget
+
+    for section in sorted(sections, key=lambda s: s.priority):
+        if excess <= 0:
+            break
+        size = sizes[section.name]
+        target = max(section.min_tokens, size - excess)
+        if target >= size:
+            continue
+        shrunk = None
+        if section.summarize and summarizer is not None:
+            try:
+                shrunk = await summarizer(texts[section.name], target)
+                if count_tokens(shrunk, model) > target:
+                    shrunk = truncate_to_tokens(shrunk, target, model)
+            except Exception as e:
+                logger.warning(f"Summarizing prompt section {section.name} failed, truncating instead: {e}")
+                shrunk = None
+        if shrunk is None:
+            shrunk = truncate_to_tokens(texts[section.name], target, model)
+        new_size = count_tokens(shrunk, model)
+        logger.info(f"Shrunk prompt section {section.name} from {size} to {new_size} tokens")
+        texts[section.name] = shrunk
+        excess -= size - new_size
+        sizes[section.name] = new_size
+
+    if excess > 0:
+        logger.warning(f"Prompt still exceeds its {budget} token budget by {excess} tokens")
+    return template.format(**texts)
+
+
+def model_summarizer(model: Optional[str] = None) -> Summarizer:
+    """Return a summarizer that condenses text with the shared model client."""
+    async def summarize(text: str, max_tokens: int) -> str:
+        return await run(
+            f"Condense the following document to at most {max_tokens} tokens. "
+            f"Keep every requirement, component, name and decision; drop repetition and prose.\n\n{text}",
+            model=model,
+            max_tokens=max_tokens
+        )
+    return summarize
+
+
+class TokenUsage:
+    """Per-node prompt and completion token counters."""
+
+    def __init__(self):
+        self._nodes: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, node: str, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            usage = self._nodes.setdefault(node, {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+            usage['calls'] += 1
+            usage['prompt_tokens'] += prompt_tokens
+            usage['completion_tokens'] += completion_tokens
+        logger.info(f"{node}: {prompt_tokens} prompt tokens, {completion_tokens} completion tokens")
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {node: dict(usage) for node, usage in self._nodes.items()}
+
+
+token_usage = TokenUsage()
+
+
+def record_usage(node: str, result: Any = None, prompt: str = "", completion: str = "", model: str = 'gpt-4o-mini'):
+    """
+    Record a node's token usage.
+
+    Uses the provider-reported usage of a pydantic-ai run result when available,
+    and counts the prompt and completion text otherwise.
+    """
+    usage = None
+    if result is not None and hasattr(result, 'usage'):
+        try:
+            usage = result.usage()
+        except Exception:
+            usage = None
+    prompt_tokens = getattr(usage, 'request_tokens', None)
+    completion_tokens = getattr(usage, 'response_tokens', None)
+    if prompt_tokens is None:
+        prompt_tokens = count_tokens(prompt, model)
+    if completion_tokens is None:
+        completion_tokens = count_tokens(completion, model)
+    token_usage.record(node, prompt_tokens, completion_tokens)
@@ -0,0 +1,288 @@
+"""
+Bounded storage for API chat sessions.
+
+api_server used to keep every session's agent state and message history in a
+module-level dict for the life of the process. The stores here bound that:
+
+- ``MemorySessionStore`` keeps the most recently used sessions in memory, evicts
+  the least recently used past ``max_sessions`` and drops sessions idle for
+  longer than ``ttl``. Evicted sessions can be spilled to disk and are reloaded
+  transparently on their next request.
+- ``SQLiteSessionStore`` is a Redis-like key/value store with per-key expiry in
+  a local SQLite file, so several API worker processes on one host share
+  sessions.
+
+Both report resident sessions and bytes through ``metrics()``.
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger('session_store')
+
+
+def new_session(**agent_state: Any) -> Dict[str, Any]:
+    """Return an empty session with the agent state fields the graph expects."""
+    state = {
+        'messages': [],
+        'scope': '',
+        'architecture': '',
+        'latest_user_message': ''
+    }
+    state.update(agent_state)
+    return {'messages': [], 'agent_state': state}
+
+
+def session_size(session: Dict[str, Any]) -> int:
+    """Return the serialized size of a session in bytes."""
+    return len(pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class SessionStore:
+    """
+    Interface of the session stores.
+
+    Sessions are plain dicts; callers mutate the dict returned by ``get`` and
+    then ``put`` it back so every backend sees the change.
+    """
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, session_id: str, session: Dict[str, Any]):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def metrics(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get_or_create(self, session_id: str, **agent_state: Any) -> Dict[str, Any]:
+        """Return a session, creating and storing a new one when it doesn't exist."""
+        session = self.get(session_id)
+        if session is None:
+            session = new_session(**agent_state)
+            self.put(session_id, session)
+        return session
+
+
+@dataclass
+class _Entry:
+    session: Dict[str, Any]
+    size: int
+    touched: float = field(default_factory=time.time)
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-memory LRU session store with TTL expiry and optional disk spill.
+
+    Args:
+        max_sessions: Sessions kept in memory before the least recently used is evicted
+        ttl: Seconds a session may stay idle before it is dropped (0 keeps it until evicted)
+        spill_dir: Directory evicted sessions are written to, or None to discard them
+    """
+
+    def __init__(self, max_sessions: int = 256, ttl: float = 3600.0, spill_dir: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+        self.spills = 0
+        self.reloads = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha256(session_id.encode()).hexdigest() + '.pickle')
+
+    def _expired(self, touched: float) -> bool:
+        return bool(self.ttl) and time.time() - touched > self.ttl
+
+    def _spill(self, session_id: str, entry: _Entry):
+        path = self._spill_path(session_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((entry.touched, entry.session), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self.spills += 1
+        except OSError as e:
+            logger.warning(f"Could not spill session {session_id}: {e}")
+
+    def _reload(self, session_id: str) -> Optional[_Entry]:
+        path = self._spill_path(session_id)
+        try:
+            with open(path, 'rb') as f:
+                touched, session = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"Could not reload spilled session {session_id}: {e}")
+            return None
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        if self._expired(touched):
+            self.expirations += 1
+            return None
+        self.reloads += 1
+        return _Entry(session, session_size(session), touched)
+
+    def _evict(self):
+        # Expired sessions go first, then least recently used ones past the limit
+        for session_id in [sid for sid, e in self._entries.items() if self._expired(e.touched)]:
+            del self._entries[session_id]
+            self.expirations += 1
+        while len(self._entries) > self.max_sessions:
+            session_id, entry = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self.spill_dir:
+                self._spill(session_id, entry)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and self._expired(entry.touched):
+                del self._entries[session_id]
+                self.expirations += 1
+                entry = None
+            if entry is None and self.spill_dir:
+                entry = self._reload(session_id)
+                if entry is not None:
+                    self._entries[session_id] = entry
+            if entry is None:
+                return None
+            entry.touched = time.time()
+            self._entries.move_to_end(session_id)
+            self._evict()
+            return entry.session
+
+    def put(self, session_id: str, session: Dict[str, Any]):
+        with self._lock:
+            self._entries[session_id] = _Entry(session, session_size(session))
+            self._entries.move_to_end(session_id)
+            self._evict()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+            if self.spill_dir and os.path.exists(self._spill_path(session_id)):
+                os.remove(self._spill_path(session_id))
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            spilled = 0
+            if self.spill_dir:
+                spilled = sum(1 for name in os.listdir(self.spill_dir) if name.endswith('.pickle'))
+            return {
+                'backend': 'memory',
+                'resident_sessions': len(self._entries),
+                'resident_bytes': sum(e.size for e in self._entries.values()),
+                'spilled_sessions': spilled,
+                'max_sessions': self.max_sessions,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'spills': self.spills,
+                'reloads': self.reloads
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Key/value session store with per-key expiry in a SQLite file.
+
+    Works like a local Redis: each put is a SETEX, so API worker processes on
+    the same host can share sessions through one file.
+
+    Args:
+        path: SQLite file shared by the workers
+        ttl: Seconds a session may stay idle before it expires (0 never expires)
+    """
+
+    def __init__(self, path: str, ttl: float = 3600.0):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, data BLOB, size INTEGER, expires_at REAL)"
+            )
+            self._conn.commit()
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl else None
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (session_id, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            # Reading a session refreshes its expiry, like a Redis GETEX
+            self._conn.execute(
+                "UPDATE sessions SET expires_at = ? WHERE session_id = ?", (self._expires_at(), session_id))
+            self._conn.commit()
+        return pickle.loads(row[0])
+
+    def put(self, session_id: str, session: Dict[str, Any]):
+        data = pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, size, expires_at) VALUES (?, ?, ?, ?)",
+                (session_id, data, len(data), self._expires_at())
+            )
+            self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions WHERE expires_at IS NULL OR expires_at > ?",
+                (time.time(),)
+            ).fetchone()
+        return {'backend': 'sqlite', 'resident_sessions': count, 'resident_bytes': size}
+
+
+def create_session_store(backend: Optional[str] = None) -> SessionStore:
+    """
+    Build the session store selected by SESSION_STORE.
+
+    "memory" (default) honours SESSION_MAX, SESSION_TTL and SESSION_SPILL_DIR;
+    "sqlite" shares sessions between processes through SESSION_DB_PATH.
+    """
+    backend = (backend or os.getenv('SESSION_STORE', 'memory')).lower()
+    ttl = float(os.getenv('SESSION_TTL', '3600'))
+    if backend == 'sqlite':
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        path = os.getenv('SESSION_DB_PATH') or os.path.join(root, 'workbench', 'sessions.sqlite')
+        return SQLiteSessionStore(path, ttl=ttl)
+    if backend != 'memory':
+        logger.warning(f"Unknown SESSION_STORE {backend}, using the in-memory store")
+    return MemorySessionStore(
+        max_sessions=int(os.getenv('SESSION_MAX', '256')),
+        ttl=ttl,
+        spill_dir=os.getenv('SESSION_SPILL_DIR') or None
+    )
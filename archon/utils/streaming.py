@@ -0,0 +1,114 @@
+"""
+Streaming agentic_flow output to API clients.
+
+The graph nodes emit text through LangGraph's stream writer, which only
+reaches callers of ``astream(..., stream_mode="custom")``. ``stream_agent``
+runs the graph that way and yields the custom chunks as they are produced,
+followed by the final state. ``coalesce`` sits between the graph and a slow
+transport: chunks are buffered in a bounded queue, tiny ones are merged into
+frames, and when the buffer is full the graph waits for the client instead of
+buffering without limit.
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+logger = logging.getLogger('streaming')
+
+_DONE = object()
+
+
+async def stream_agent(flow,
+                       state: Dict[str, Any],
+                       config: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Run a compiled graph and yield its output as it is produced.
+
+    Args:
+        flow: Compiled LangGraph graph
+        state: Input state
+        config: Run config
+
+    Yields:
+        ("chunk", text) for every stream writer call, then ("state", final_state)
+    """
+    final_state = None
+    # "values" rides along with "custom" so the final state comes from the same run
+    async for mode, payload in flow.astream(state, config=config, stream_mode=["custom", "values"]):
+        if mode == "custom":
+            yield "chunk", payload if isinstance(payload, str) else str(payload)
+        elif mode == "values":
+            final_state = payload
+    yield "state", final_state
+
+
+async def coalesce(events: AsyncIterator[Tuple[str, Any]],
+                   max_delay: float = 0.02,
+                   max_frame_chars: int = 4096,
+                   max_pending: int = 256) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Merge consecutive text chunks into frames for a transport.
+
+    A frame is sent as soon as max_frame_chars have accumulated, or max_delay
+    seconds after its first chunk. At most max_pending events are buffered; past
+    that the producer waits, which pauses the graph until the client catches up.
+    Non-chunk events flush the current frame and pass through unchanged.
+
+    Args:
+        events: ("chunk", text) and other (kind, payload) events, e.g. from stream_agent
+        max_delay: Longest a chunk waits for more text before its frame is sent
+        max_frame_chars: Frame size that triggers an immediate send
+        max_pending: Events buffered before the producer is paused
+
+    Yields:
+        ("chunk", frame) and the other events in order
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+
+    async def produce():
+        try:
+            async for event in events:
+                await queue.put(event)
+            await queue.put(_DONE)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    pending: Optional[Any] = None
+    try:
+        while True:
+            event = pending if pending is not None else await queue.get()
+            pending = None
+            if event is _DONE:
+                return
+            if isinstance(event, Exception):
+                raise event
+            kind, payload = event
+            if kind != "chunk":
+                yield event
+                continue
+
+            parts = [payload]
+            size = len(payload)
+            deadline = asyncio.get_running_loop().time() + max_delay
+            while size < max_frame_chars:
+                timeout = deadline - asyncio.get_running_loop().time()
+                try:
+                    # Whatever is already queued is taken without waiting, so a slow client gets bigger frames
+                    event = queue.get_nowait() if not queue.empty() else await asyncio.wait_for(queue.get(), max(timeout, 0))
+                except asyncio.TimeoutError:
+                    break
+                if event is _DONE or isinstance(event, Exception) or event[0] != "chunk":
+                    pending = event
+                    break
+                parts.append(event[1])
+                size += len(event[1])
+            yield "chunk", "".join(parts)
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except (asyncio.CancelledError, Exception):
+                pass
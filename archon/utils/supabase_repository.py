@@ -0,0 +1,397 @@
+"""
+Non-blocking access to the Supabase tables used by the agents.
+
+supabase-py is synchronous, so every query made from an ``async def`` node or
+tool used to stall the event loop, and concurrent API sessions waited behind
+each other's queries. ``SupabaseRepository`` runs those queries on a bounded,
+process-wide thread pool and exposes typed methods for the site_pages,
+agent_templates, mcp_templates and mcp_tools tables.
+
+Clients and repositories are reused across calls, and every call records its
+latency so slow queries show up in the metrics.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from supabase import Client
+
+from archon.utils.vector_index import get_template_index, match_site_pages
+
+logger = logging.getLogger('supabase_repository')
+
+T = TypeVar('T')
+
+# Summary columns used to rank templates, and the code columns loaded only for the chosen one
+MCP_TEMPLATE_SUMMARY_COLUMNS = ['id', 'folder_name', 'purpose', 'metadata']
+MCP_TEMPLATE_CODE_COLUMNS = ['agents_code', 'tasks_code', 'crew_code', 'main_code', 'run_agent_code']
+AGENT_TEMPLATE_CODE_COLUMNS = ['agents_code', 'tools_code', 'tasks_code', 'crew_code']
+
+# Calls slower than this are logged as warnings
+SLOW_CALL_SECONDS = float(os.getenv('SUPABASE_SLOW_CALL_SECONDS', '1.0'))
+
+
+@dataclass
+class CallStats:
+    """Timing metrics for one kind of repository call."""
+    calls: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'total_seconds': round(self.total_seconds, 4),
+            'mean_seconds': round(self.mean_seconds, 4),
+            'max_seconds': round(self.max_seconds, 4)
+        }
+
+
+class SitePageUrlCache:
+    """
+    Versioned per-source cache of documentation page URLs.
+
+    ``invalidate`` bumps the version, so a listing fetched while a crawl was
+    finishing is never stored over the newer one. Entries also expire after
+    ttl seconds, which bounds staleness when the crawl ran in another process.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self.version = 0
+        self._entries: Dict[str, Tuple[int, float, List[str]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, source: str, fetch: Callable[[], Any]) -> List[str]:
+        """
+        Return the cached URLs of a source, fetching them on a miss.
+
+        Args:
+            source: metadata source of the pages
+            fetch: Zero-argument coroutine function returning the sorted URLs
+        """
+        with self._lock:
+            entry = self._entries.get(source)
+            version = self.version
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self.hits += 1
+                return list(entry[2])
+            self.misses += 1
+        urls = await fetch()
+        with self._lock:
+            if self.version == version:
+                self._entries[source] = (version, time.monotonic() + self.ttl, list(urls))
+        return urls
+
+    def invalidate(self):
+        """Drop every cached listing."""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'version': self.version,
+                'sources': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+site_page_urls_cache = SitePageUrlCache(ttl=float(os.getenv('SITE_PAGE_URLS_TTL', '300')))
+
+# Cleared once the site_page_urls view turns out to be missing
+_site_page_urls_view = True
+
+# PostgREST's "relation not in the schema cache" and Postgres' undefined_table
+MISSING_RELATION_CODES = {'PGRST205', '42P01'}
+
+
+def is_missing_relation(error: Exception) -> bool:
+    """Return True if a PostgREST error says the queried table or view doesn't exist."""
+    return getattr(error, 'code', None) in MISSING_RELATION_CODES
+
+
+def refresh_site_page_urls(client: Client):
+    """
+    Rebuild the site_page_urls view after a crawl and invalidate the cached listings.
+
+    Blocking; the crawler calls it once after it has written its pages.
+    """
+    try:
+        client.rpc('refresh_site_page_urls', {}).execute()
+    except Exception as e:
+        logger.warning(f"Could not refresh the site_page_urls view: {e}")
+    finally:
+        site_page_urls_cache.invalidate()
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide pool that runs blocking Supabase calls."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                max_workers = int(os.getenv('SUPABASE_MAX_WORKERS', '8'))
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='supabase')
+    return _executor
+
+
+class SupabaseRepository:
+    """
+    Async facade over a synchronous Supabase client.
+
+    Each method runs its query on the shared thread pool, so the event loop
+    stays free while PostgREST answers, and records the call in ``metrics``.
+    """
+
+    def __init__(self, client: Client, executor: Optional[ThreadPoolExecutor] = None):
+        self.client = client
+        self._executor = executor
+        self._metrics: Dict[str, CallStats] = {}
+        self._metrics_lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        return self._executor or get_executor()
+
+    def _record(self, name: str, elapsed: float, failed: bool):
+        with self._metrics_lock:
+            stats = self._metrics.setdefault(name, CallStats())
+            stats.calls += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            if failed:
+                stats.errors += 1
+        if elapsed > SLOW_CALL_SECONDS:
+            logger.warning(f"Slow Supabase call {name}: {elapsed:.2f}s")
+
+    async def run(self, name: str, fn: Callable[[], T]) -> T:
+        """
+        Run a blocking call on the thread pool and time it.
+
+        Args:
+            name: Metric name for the call
+            fn: Zero-argument callable doing the blocking work
+
+        Returns:
+            Whatever fn returns
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await loop.run_in_executor(self.executor, fn)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(name, time.perf_counter() - started, failed)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Return a snapshot of the per-call timing metrics."""
+        with self._metrics_lock:
+            return {name: stats.as_dict() for name, stats in self._metrics.items()}
+
+    # site_pages
+
+    async def match_site_pages(self,
+                               query_embedding: List[float],
+                               match_count: int = 10,
+                               filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return the chunks most similar to a query, from the local index when loaded, else the RPC."""
+        return await self.run(
+            'site_pages.match',
+            lambda: match_site_pages(self.client, query_embedding, match_count, filter)
+        )
+
+    async def list_site_page_urls(self, source: str) -> List[str]:
+        """Return the sorted distinct URLs crawled for a source, cached until the crawler invalidates them."""
+        return await site_page_urls_cache.get(source, lambda: self._fetch_site_page_urls(source))
+
+    async def _fetch_site_page_urls(self, source: str) -> List[str]:
+        global _site_page_urls_view
+        if _site_page_urls_view:
+            def view_query():
+                return self.client.from_('site_page_urls') \
+                    .select('url') \
+                    .eq('source', source) \
+                    .order('url') \
+                    .execute()
+            try:
+                result = await self.run('site_page_urls.list', view_query)
+                return [row['url'] for row in result.data or []]
+            except Exception as e:
+                if is_missing_relation(e):
+                    # Databases set up before the view existed: scan the chunk rows from now on
+                    logger.warning(f"site_page_urls view missing, listing URLs from site_pages: {e}")
+                    _site_page_urls_view = False
+                else:
+                    # Transient failures fall back for this call only, the view is tried again next time
+                    logger.warning(f"site_page_urls query failed, listing URLs from site_pages: {e}")
+
+        def query():
+            return self.client.from_('site_pages') \
+                .select('url') \
+                .eq('metadata->>source', source) \
+                .execute()
+        result = await self.run('site_pages.list_urls', query)
+        return sorted(set(row['url'] for row in result.data or []))
+
+    async def get_page_chunks(self, url: str, source: str) -> List[Dict[str, Any]]:
+        """Return the title, content and chunk_number of every chunk of a page, in order."""
+        def query():
+            return self.client.from_('site_pages') \
+                .select('title, content, chunk_number') \
+                .eq('url', url) \
+                .eq('metadata->>source', source) \
+                .order('chunk_number') \
+                .execute()
+        result = await self.run('site_pages.get_chunks', query)
+        return result.data or []
+
+    # agent_templates
+
+    async def top_agent_templates(self, query_embedding: List[float], k: int) -> List[Dict[str, Any]]:
+        """Return the k agent templates most similar to a query, without a threshold."""
+        index = get_template_index('agent_templates')
+        return await self.run(
+            'agent_templates.top_k',
+            lambda: index.top_k(self.client, query_embedding, k)
+        )
+
+    async def get_agent_template_code(self, template_id: Any) -> Dict[str, str]:
+        """Load the code columns of a single agent template."""
+        return await self._get_code('agent_templates', template_id, AGENT_TEMPLATE_CODE_COLUMNS)
+
+    # mcp_templates
+
+    def _mcp_template_summaries(self):
+        return self.client.table('mcp_templates').select(', '.join(MCP_TEMPLATE_SUMMARY_COLUMNS))
+
+    async def top_mcp_templates(self, query_embedding: List[float], k: int) -> List[Dict[str, Any]]:
+        """Return the k MCP templates most similar to a query, without a threshold."""
+        index = get_template_index('mcp_templates')
+        return await self.run(
+            'mcp_templates.top_k',
+            lambda: index.top_k(self.client, query_embedding, k)
+        )
+
+    async def fetch_mcp_template_summaries(self, template_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        """Fetch the summary columns of several MCP templates in one query, keyed by id."""
+        if not template_ids:
+            return {}
+        ids = list(template_ids)
+        result = await self.run(
+            'mcp_templates.fetch_summaries',
+            lambda: self._mcp_template_summaries().in_('id', ids).execute()
+        )
+        return {row['id']: row for row in result.data or []}
+
+    async def search_mcp_templates(self, columns: List[str], terms: List[str]) -> List[Dict[str, Any]]:
+        """Return the summaries of MCP templates where any column contains any term, in one OR-filtered query."""
+        if not terms:
+            return []
+        conditions = []
+        for term in terms:
+            # Quote the value so commas, dots and parentheses don't break the filter syntax
+            value = term.replace('\\', '\\\\').replace('"', '\\"')
+            for column in columns:
+                conditions.append(f'{column}.ilike."%{value}%"')
+        result = await self.run(
+            'mcp_templates.search',
+            lambda: self._mcp_template_summaries().or_(','.join(conditions)).execute()
+        )
+        return result.data or []
+
+    async def list_mcp_template_summaries(self) -> List[Dict[str, Any]]:
+        """Return the summaries of every MCP template."""
+        result = await self.run(
+            'mcp_templates.list_summaries',
+            lambda: self._mcp_template_summaries().execute()
+        )
+        return result.data or []
+
+    async def get_mcp_template_code(self, template_id: Any) -> Dict[str, str]:
+        """Load the code columns of a single MCP template."""
+        return await self._get_code('mcp_templates', template_id, MCP_TEMPLATE_CODE_COLUMNS)
+
+    # mcp_tools
+
+    async def match_mcp_tools(self,
+                              query_embedding: List[float],
+                              match_threshold: float,
+                              match_count: int) -> List[Dict[str, Any]]:
+        """Return the MCP tools above a similarity threshold, most similar first."""
+        def query():
+            return self.client.rpc(
+                'match_mcp_tools',
+                {
+                    'query_embedding': query_embedding,
+                    'match_threshold': match_threshold,
+                    'match_count': match_count
+                }
+            ).execute()
+        result = await self.run('mcp_tools.match', query)
+        return result.data or []
+
+    async def _get_code(self, table: str, template_id: Any, columns: List[str]) -> Dict[str, str]:
+        def query():
+            return self.client.table(table) \
+                .select(', '.join(columns)) \
+                .eq('id', template_id) \
+                .execute()
+        result = await self.run(f'{table}.get_code', query)
+        row = result.data[0] if result.data else {}
+        return {column: row.get(column) or '' for column in columns}
+
+
+_clients: Dict[Tuple[str, str], Client] = {}
+_registry_lock = threading.Lock()
+
+
+def get_supabase_client(url: Optional[str] = None, key: Optional[str] = None) -> Optional[Client]:
+    """
+    Return a process-wide Supabase client for the given credentials.
+
+    Defaults to SUPABASE_URL and SUPABASE_SERVICE_KEY, and returns None when
+    either is missing.
+    """
+    url = url or os.getenv('SUPABASE_URL')
+    key = key or os.getenv('SUPABASE_SERVICE_KEY')
+    if not url or not key:
+        return None
+    with _registry_lock:
+        if (url, key) not in _clients:
+            _clients[(url, key)] = Client(url, key)
+        return _clients[(url, key)]
+
+
+def get_supabase_repository(client: Client) -> SupabaseRepository:
+    """Return the repository wrapping a client, creating it on first use."""
+    with _registry_lock:
+        # Stored on the client, so the repository lives exactly as long as the client does
+        repository = getattr(client, '_archon_repository', None)
+        if repository is None:
+            repository = SupabaseRepository(client)
+            client._archon_repository = repository
+        return repository
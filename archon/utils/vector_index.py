@@ -0,0 +1,583 @@
+"""
+Local Vector Index Module
+
+In-process replacements for the pgvector matching RPCs.
+
+LocalVectorIndex stands in for match_site_pages. Embeddings of the
+site_pages table are kept as a normalized float32 matrix in a versioned snapshot
+that is memory-mapped on load, next to the row metadata, so retrieval is a
+vectorized dot product instead of a network round trip. Set
+SITE_PAGES_INDEX_PATH to a directory to enable it. The snapshot is rebuilt
+from Supabase by the crawler when a crawl completes, or on a schedule with
+start_auto_refresh(); other processes pick up a new snapshot the next time
+they query.
+
+TemplateIndex stands in for match_agent_templates and match_mcp_templates.
+It holds an IVF index over the template embeddings, loaded from Supabase
+and refreshed after a TTL, and answers a threshold-free top-k so callers
+can apply their own similarity cut-offs to a single result set.
+"""
+
+import os
+import json
+import shutil
+import math
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('vector_index')
+
+SITE_PAGES_COLUMNS = ['id', 'url', 'chunk_number', 'title', 'summary', 'content', 'metadata']
+
+
+def json_contains(document: Any, pattern: Any) -> bool:
+    """
+    Check JSON containment with the same semantics as Postgres' jsonb @> operator.
+
+    Args:
+        document: JSON value being tested
+        pattern: JSON value that must be contained in document
+
+    Returns:
+        True if document contains pattern
+    """
+    if isinstance(pattern, dict):
+        if not isinstance(document, dict):
+            return False
+        return all(key in document and json_contains(document[key], value) for key, value in pattern.items())
+    if isinstance(pattern, list):
+        if not isinstance(document, list):
+            return False
+        return all(any(json_contains(item, wanted) for item in document) for wanted in pattern)
+    if isinstance(document, list):
+        # A top-level array contains a matching scalar
+        return pattern in document
+    return document == pattern
+
+
+def parse_embedding(value: Any) -> Optional[List[float]]:
+    """Parse an embedding as returned by PostgREST, which sends pgvector columns as text."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length in place, leaving zero rows as they are."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the positions of the k highest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class LocalVectorIndex:
+    """Memory-mapped cosine similarity index over site_pages rows."""
+
+    def __init__(self, snapshot_dir: str, reload_interval: float = 30.0):
+        """Initialize the index.
+
+        Args:
+            snapshot_dir: Directory holding the snapshot files
+            reload_interval: Seconds between checks for a newer snapshot on disk
+        """
+        self.snapshot_dir = snapshot_dir
+        self.reload_interval = reload_interval
+        self._matrix: Optional[np.ndarray] = None
+        self._rows: List[Dict[str, Any]] = []
+        self._filter_masks: Dict[str, np.ndarray] = {}
+        self._loaded_version: Optional[str] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stop_refresh = threading.Event()
+
+    @property
+    def pointer_path(self) -> str:
+        """File naming the current snapshot directory."""
+        return os.path.join(self.snapshot_dir, 'CURRENT')
+
+    def matrix_path(self, version: str) -> str:
+        return os.path.join(self.snapshot_dir, version, 'embeddings.npy')
+
+    def rows_path(self, version: str) -> str:
+        return os.path.join(self.snapshot_dir, version, 'rows.json')
+
+    def current_version(self) -> Optional[str]:
+        """Return the name of the current snapshot, or None if none was written."""
+        try:
+            with open(self.pointer_path, 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    @property
+    def is_loaded(self) -> bool:
+        """Return True if a snapshot is loaded."""
+        return self._matrix is not None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def build(self, rows: List[Dict[str, Any]]):
+        """
+        Write a new snapshot from site_pages rows and load it.
+
+        Args:
+            rows: Rows with the site_pages columns plus an embedding
+        """
+        rows = [row for row in rows if row.get('embedding') is not None]
+        if rows:
+            matrix = normalize_rows(np.asarray([parse_embedding(row['embedding']) for row in rows], dtype=np.float32))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        metadata = [{column: row.get(column) for column in SITE_PAGES_COLUMNS} for row in rows]
+
+        # Each snapshot gets its own directory and readers follow the CURRENT pointer,
+        # which is swapped with a single os.replace, so a reader never pairs one
+        # build's rows with another build's embeddings
+        previous = self.current_version()
+        version = f"{time.time_ns()}-{os.getpid()}"
+        os.makedirs(os.path.join(self.snapshot_dir, version))
+        np.save(self.matrix_path(version), matrix)
+        with open(self.rows_path(version), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        tmp_pointer = f"{self.pointer_path}.{version}.tmp"
+        with open(tmp_pointer, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(tmp_pointer, self.pointer_path)
+
+        # Keep the previous snapshot for readers that resolved the pointer just before the swap
+        for name in os.listdir(self.snapshot_dir):
+            path = os.path.join(self.snapshot_dir, name)
+            if name not in (version, previous) and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+        logger.info(f"Wrote site_pages index snapshot with {len(rows)} rows to {self.snapshot_dir}")
+        self.load()
+
+    def load(self) -> bool:
+        """Load (or reload) the current snapshot from disk. Returns False if there is none."""
+        version = self.current_version()
+        if version is None:
+            return False
+        with self._lock:
+            try:
+                matrix = np.load(self.matrix_path(version), mmap_mode='r')
+                with open(self.rows_path(version), 'r', encoding='utf-8') as f:
+                    rows = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not load index snapshot {version}: {e}")
+                return False
+            if len(rows) != matrix.shape[0]:
+                logger.warning("Index snapshot rows and embeddings disagree, ignoring snapshot")
+                return False
+            self._matrix = matrix
+            self._rows = rows
+            self._filter_masks = {}
+            self._loaded_version = version
+            self._last_check = time.monotonic()
+        logger.info(f"Loaded site_pages index with {len(rows)} rows")
+        return True
+
+    def reload_if_changed(self):
+        """Reload the snapshot if another process has written a newer (or the first) one, at most once per reload_interval."""
+        now = time.monotonic()
+        if self._last_check and now - self._last_check < self.reload_interval:
+            return
+        self._last_check = now
+        version = self.current_version()
+        if version is not None and version != self._loaded_version:
+            self.load()
+
+    def _filter_mask(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Return the boolean mask of rows whose metadata contains the filter."""
+        if not filter:
+            return None
+        key = json.dumps(filter, sort_keys=True)
+        mask = self._filter_masks.get(key)
+        if mask is None:
+            mask = np.fromiter(
+                (json_contains(row.get('metadata') or {}, filter) for row in self._rows),
+                dtype=bool,
+                count=len(self._rows)
+            )
+            self._filter_masks[key] = mask
+        return mask
+
+    def match(self,
+              query_embedding: List[float],
+              match_count: int = 10,
+              filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Find the rows most similar to a query, like the match_site_pages RPC.
+
+        Args:
+            query_embedding: Query vector
+            match_count: Maximum number of rows to return
+            filter: JSON the row metadata must contain (metadata @> filter)
+
+        Returns:
+            Rows ordered by descending cosine similarity, each with a similarity key
+        """
+        self.reload_if_changed()
+        with self._lock:
+            matrix, rows = self._matrix, self._rows
+            mask = self._filter_mask(filter)
+        if matrix is None or not rows or match_count <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        scores = matrix @ (query / norm)
+
+        if mask is not None:
+            candidates = np.flatnonzero(mask)
+            if candidates.size == 0:
+                return []
+            scores = scores[candidates]
+        else:
+            candidates = np.arange(scores.shape[0])
+
+        results = []
+        for position in top_k(scores, match_count):
+            row = dict(rows[int(candidates[position])])
+            row['similarity'] = float(scores[position])
+            results.append(row)
+        return results
+
+    def refresh_from_supabase(self, supabase, page_size: int = 500) -> int:
+        """
+        Rebuild the snapshot from the site_pages table.
+
+        Args:
+            supabase: Supabase client
+            page_size: Rows fetched per request
+
+        Returns:
+            Number of rows indexed
+        """
+        columns = ', '.join(SITE_PAGES_COLUMNS + ['embedding'])
+        rows = []
+        start = 0
+        while True:
+            result = supabase.table('site_pages') \
+                .select(columns) \
+                .order('id') \
+                .range(start, start + page_size - 1) \
+                .execute()
+            rows.extend(result.data)
+            if len(result.data) < page_size:
+                break
+            start += page_size
+        self.build(rows)
+        return len(rows)
+
+    def start_auto_refresh(self, supabase, interval: float = 3600.0):
+        """Rebuild the snapshot from Supabase every interval seconds in a daemon thread."""
+        if self._refresh_thread is not None:
+            return
+        self._stop_refresh.clear()
+
+        def run():
+            while not self._stop_refresh.wait(interval):
+                try:
+                    self.refresh_from_supabase(supabase)
+                except Exception as e:
+                    logger.error(f"Error refreshing site_pages index: {e}")
+
+        self._refresh_thread = threading.Thread(target=run, name='site-pages-index-refresh', daemon=True)
+        self._refresh_thread.start()
+
+    def stop_auto_refresh(self):
+        """Stop the scheduled refresh thread."""
+        self._stop_refresh.set()
+        self._refresh_thread = None
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over unit vectors.
+
+    Vectors are clustered with spherical k-means; a query scores only the
+    vectors in its nprobe closest clusters. Small collections are searched
+    exhaustively, where clustering would cost more than it saves.
+    """
+
+    def __init__(self,
+                 nlist: Optional[int] = None,
+                 nprobe: int = 8,
+                 brute_force_below: int = 2048,
+                 iterations: int = 10,
+                 seed: int = 0):
+        """Initialize the index.
+
+        Args:
+            nlist: Number of clusters, defaults to sqrt of the number of vectors
+            nprobe: Number of clusters scanned per query
+            brute_force_below: Collections smaller than this are searched exhaustively
+            iterations: k-means iterations when building
+            seed: Random seed for the k-means initialization
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.brute_force_below = brute_force_below
+        self.iterations = iterations
+        self.seed = seed
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return self._vectors.shape[0]
+
+    def build(self, vectors: np.ndarray):
+        """
+        Build the index.
+
+        Args:
+            vectors: Matrix of unit-length float32 vectors, one per row
+        """
+        self._vectors = vectors
+        self._centroids = None
+        self._lists = []
+        count = vectors.shape[0]
+        if count < self.brute_force_below:
+            return
+
+        nlist = min(count, self.nlist or int(math.sqrt(count)))
+        rng = np.random.default_rng(self.seed)
+        centroids = vectors[rng.choice(count, nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for cluster in range(nlist):
+                members = vectors[assignment == cluster]
+                if len(members):
+                    centroids[cluster] = members.mean(axis=0)
+                else:
+                    # Re-seed empty clusters with a random vector
+                    centroids[cluster] = vectors[rng.integers(count)]
+            normalize_rows(centroids)
+
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        self._centroids = centroids
+        self._lists = [np.flatnonzero(assignment == cluster) for cluster in range(nlist)]
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the approximate k nearest vectors to a unit-length query.
+
+        Args:
+            query: Query vector
+            k: Number of neighbours
+
+        Returns:
+            Tuple of (row positions, cosine similarities), best first
+        """
+        if len(self) == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if self._centroids is None:
+            candidates = np.arange(len(self))
+        else:
+            probes = top_k(self._centroids @ query, self.nprobe)
+            candidates = np.concatenate([self._lists[cluster] for cluster in probes])
+
+        scores = self._vectors[candidates] @ query
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+
+
+class TemplateIndex:
+    """In-memory ANN index over a template table's embeddings."""
+
+    def __init__(self,
+                 table: str,
+                 rpc_name: str,
+                 columns: List[str],
+                 ttl: float = 600.0):
+        """Initialize the index.
+
+        Args:
+            table: Template table name
+            rpc_name: Matching RPC used when the index can't be loaded
+            columns: Columns kept for each template (embedding excluded)
+            ttl: Seconds before the index is reloaded from Supabase
+        """
+        self.table = table
+        self.rpc_name = rpc_name
+        self.columns = columns
+        self.ttl = ttl
+        self.rows: List[Dict[str, Any]] = []
+        self._index = IVFIndex()
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Force a reload on the next query, e.g. after templates are added."""
+        self._loaded_at = None
+
+    def refresh(self, supabase, page_size: int = 500):
+        """Reload the templates and their embeddings from Supabase."""
+        select = ', '.join(self.columns + ['embedding'])
+        rows = []
+        start = 0
+        while True:
+            result = supabase.table(self.table) \
+                .select(select) \
+                .order('id') \
+                .range(start, start + page_size - 1) \
+                .execute()
+            rows.extend(result.data)
+            if len(result.data) < page_size:
+                break
+            start += page_size
+
+        rows = [row for row in rows if row.get('embedding') is not None]
+        index = IVFIndex()
+        if rows:
+            vectors = normalize_rows(np.asarray([parse_embedding(row.pop('embedding')) for row in rows], dtype=np.float32))
+            index.build(vectors)
+
+        with self._lock:
+            self.rows = rows
+            self._index = index
+            self._loaded_at = time.monotonic()
+        logger.info(f"Loaded {len(rows)} {self.table} into the template index")
+
+    def _ensure_fresh(self, supabase):
+        """Reload the index when it was never loaded or its TTL has expired."""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.refresh(supabase)
+
+    def top_k(self, supabase, query_embedding: List[float], k: int) -> List[Dict[str, Any]]:
+        """
+        Return the k most similar templates without any similarity threshold.
+
+        Falls back to the matching RPC with no effective threshold when the
+        index can't be loaded.
+
+        Args:
+            supabase: Supabase client
+            query_embedding: Query vector
+            k: Number of templates to return
+
+        Returns:
+            Template rows ordered by descending similarity, each with a similarity key
+        """
+        try:
+            self._ensure_fresh(supabase)
+        except Exception as e:
+            logger.error(f"Error loading {self.table} index, using {self.rpc_name}: {e}")
+            result = supabase.rpc(
+                self.rpc_name,
+                {
+                    'query_embedding': query_embedding,
+                    'match_threshold': -1.0,
+                    'match_count': k
+                }
+            ).execute()
+            return result.data or []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        with self._lock:
+            rows, index = self.rows, self._index
+        positions, scores = index.search(query / norm, k)
+
+        results = []
+        for position, score in zip(positions, scores):
+            row = dict(rows[int(position)])
+            row['similarity'] = float(score)
+            results.append(row)
+        return results
+
+
+_template_indexes: Dict[str, TemplateIndex] = {}
+_template_indexes_lock = threading.Lock()
+
+TEMPLATE_INDEX_SPECS = {
+    'agent_templates': ('match_agent_templates', ['id', 'folder_name', 'purpose', 'metadata']),
+    'mcp_templates': ('match_mcp_templates', ['id', 'folder_name', 'purpose', 'metadata'])
+}
+
+
+def get_template_index(table: str) -> TemplateIndex:
+    """Return the process-wide index for agent_templates or mcp_templates."""
+    with _template_indexes_lock:
+        if table not in _template_indexes:
+            rpc_name, columns = TEMPLATE_INDEX_SPECS[table]
+            ttl = float(os.getenv('TEMPLATE_INDEX_TTL', '600'))
+            _template_indexes[table] = TemplateIndex(table, rpc_name, columns, ttl)
+        return _template_indexes[table]
+
+
+_site_pages_index: Optional[LocalVectorIndex] = None
+_site_pages_index_lock = threading.Lock()
+
+
+def get_site_pages_index() -> Optional[LocalVectorIndex]:
+    """Return the process-wide site_pages index, or None unless SITE_PAGES_INDEX_PATH is set."""
+    global _site_pages_index
+    snapshot_dir = os.getenv('SITE_PAGES_INDEX_PATH')
+    if not snapshot_dir:
+        return None
+    if _site_pages_index is None:
+        with _site_pages_index_lock:
+            if _site_pages_index is None:
+                index = LocalVectorIndex(snapshot_dir)
+                index.load()
+                _site_pages_index = index
+    return _site_pages_index
+
+
+def match_site_pages(supabase,
+                     query_embedding: List[float],
+                     match_count: int = 10,
+                     filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Drop-in for the match_site_pages RPC that answers from the local index when one is loaded.
+
+    Args:
+        supabase: Supabase client, used when no local snapshot is available
+        query_embedding: Query vector
+        match_count: Maximum number of rows to return
+        filter: JSON the row metadata must contain
+
+    Returns:
+        Matching rows ordered by descending similarity
+    """
+    index = get_site_pages_index()
+    if index is not None:
+        # Picks up a snapshot written after this process started
+        index.reload_if_changed()
+        if index.is_loaded:
+            return index.match(query_embedding, match_count, filter)
+
+    result = supabase.rpc(
+        'match_site_pages',
+        {
+            'query_embedding': query_embedding,
+            'match_count': match_count,
+            'filter': filter or {}
+        }
+    ).execute()
+    return result.data or []
@@ -0,0 +1,111 @@
+"""Concurrent identical requests share one API call, and survive the caller making it being cancelled."""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archon.utils.embeddings import EmbeddingCache, EmbeddingService
+from archon.utils.llm_cache import LLMResponseCache, LLMService
+
+
+class FakeEmbeddings:
+    """Embeddings endpoint whose first call blocks until released."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def create(self, model, input):
+        self.calls += 1
+        if self.calls == 1:
+            await self.release.wait()
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(self.calls)])])
+
+
+class FakeCompletions:
+    """Chat completions endpoint whose first call blocks until released."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def create(self, model, messages, **params):
+        self.calls += 1
+        if self.calls == 1:
+            await self.release.wait()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"answer {self.calls}"))])
+
+
+def fake_chat_client():
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+
+
+def test_embed_follower_takes_over_when_leader_is_cancelled():
+    async def scenario():
+        service = EmbeddingService(EmbeddingCache(max_entries=16))
+        client = SimpleNamespace(embeddings=FakeEmbeddings())
+
+        leader = asyncio.create_task(service.embed("text", client))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(service.embed("text", client))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        vector = await asyncio.wait_for(follower, timeout=1)
+        assert leader.cancelled()
+        assert vector == [2.0]
+        assert client.embeddings.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_embed_followers_share_the_leaders_result():
+    async def scenario():
+        service = EmbeddingService(EmbeddingCache(max_entries=16))
+        client = SimpleNamespace(embeddings=FakeEmbeddings())
+
+        tasks = [asyncio.create_task(service.embed("text", client)) for _ in range(3)]
+        await asyncio.sleep(0)
+        client.embeddings.release.set()
+        assert await asyncio.wait_for(asyncio.gather(*tasks), timeout=1) == [[1.0]] * 3
+        assert client.embeddings.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_complete_follower_takes_over_when_leader_is_cancelled():
+    async def scenario():
+        service = LLMService(LLMResponseCache(max_entries=16))
+        client = fake_chat_client()
+        messages = [{"role": "user", "content": "question"}]
+
+        leader = asyncio.create_task(service.complete(client, "test", "model", messages))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(service.complete(client, "test", "model", messages))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        content = await asyncio.wait_for(follower, timeout=1)
+        assert leader.cancelled()
+        assert content == "answer 2"
+        assert client.chat.completions.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_complete_followers_share_the_leaders_result():
+    async def scenario():
+        service = LLMService(LLMResponseCache(max_entries=16))
+        client = fake_chat_client()
+        messages = [{"role": "user", "content": "question"}]
+
+        tasks = [asyncio.create_task(service.complete(client, "test", "model", messages)) for _ in range(3)]
+        await asyncio.sleep(0)
+        client.chat.completions.release.set()
+        assert await asyncio.wait_for(asyncio.gather(*tasks), timeout=1) == ["answer 1"] * 3
+        assert client.chat.completions.calls == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,43 @@
+"""A failing operation in a batch is recorded on its own item without failing the others."""
+
+import asyncio
+import importlib.util
+import os
+
+import pytest
+
+pytest.importorskip("mcp")
+
+# mcp_runtime ships standalone in generated projects, so load it without the archon.mcp_tools package
+RUNTIME_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "archon", "mcp_tools", "mcp_runtime.py")
+spec = importlib.util.spec_from_file_location("mcp_runtime", RUNTIME_PATH)
+mcp_runtime = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(mcp_runtime)
+
+
+class FakeTool(mcp_runtime.BatchOperationsMixin):
+    """Validates operations the way the reference tools do, raising instead of returning error text."""
+
+    operations = {"search": {"required": ["q"]}}
+
+    async def call_operation(self, operation, parameters=None):
+        parameters = parameters or {}
+        if operation not in self.operations:
+            raise ValueError(f"Invalid operation: {operation}. Available operations: search")
+        await asyncio.sleep(0)
+        return mcp_runtime.ToolResult(f"results for {parameters['q']}")
+
+
+def test_invalid_operation_only_fails_its_own_item():
+    results = asyncio.run(FakeTool().arun_batch([
+        {"operation": "search", "parameters": {"q": "first"}},
+        ("bogus", {"q": "second"}),
+        ("search", {"q": "third"}),
+    ]))
+
+    assert [item["error"] is None for item in results] == [True, False, True]
+    assert results[1]["result"] is None
+    assert results[1]["error"].startswith("Invalid operation: bogus")
+    assert results[0]["result"] == "results for first"
+    assert results[2]["result"] == "results for third"
@@ -69,4 +69,93 @@ create policy "Allow public read access"
   on site_pages
   for select
   to public
-  using (true);
\ No newline at end of file
+  using (true);
+
+-- Per-page crawl state used by incremental re-crawls
+create table site_pages_state (
+    url varchar primary key,
+    etag varchar,
+    last_modified varchar,
+    content_hash varchar,  -- sha256 of the page markdown
+    chunk_hashes jsonb not null default '[]'::jsonb,  -- sha256 of each chunk, indexed by chunk_number
+    crawled_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+alter table site_pages_state enable row level security;
+
+-- LangGraph checkpoints shared by every API worker (CHECKPOINT_BACKEND=supabase)
+-- Binary payloads are stored as base64 text
+create table checkpoints (
+    thread_id varchar not null,
+    checkpoint_ns varchar not null default '',
+    checkpoint_id varchar not null,
+    parent_checkpoint_id varchar,
+    type varchar,
+    checkpoint text,
+    metadata_type varchar,
+    metadata text,
+    created_at double precision not null,  -- unix time, used for TTL eviction
+    primary key (thread_id, checkpoint_ns, checkpoint_id)
+);
+
+-- Channel values, stored once per channel version instead of in every checkpoint
+create table checkpoint_blobs (
+    thread_id varchar not null,
+    checkpoint_ns varchar not null default '',
+    channel varchar not null,
+    version varchar not null,
+    type varchar not null,
+    blob text,
+    primary key (thread_id, checkpoint_ns, channel, version)
+);
+
+create table checkpoint_writes (
+    thread_id varchar not null,
+    checkpoint_ns varchar not null default '',
+    checkpoint_id varchar not null,
+    task_id varchar not null,
+    idx integer not null,
+    channel varchar not null,
+    type varchar,
+    blob text,
+    task_path varchar not null default '',
+    primary key (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+
+create index on checkpoints (created_at);
+
+-- Threads whose latest checkpoint is older than the given unix time
+create function expired_checkpoint_threads (older_than double precision)
+returns table (thread_id varchar)
+language sql
+as $$
+  select thread_id
+  from checkpoints
+  group by thread_id
+  having max(created_at) < older_than;
+$$;
+
+alter table checkpoints enable row level security;
+alter table checkpoint_blobs enable row level security;
+alter table checkpoint_writes enable row level security;
+
+-- Distinct documentation page URLs per source, so listing pages doesn't read every chunk row
+-- Refreshed by the crawler through refresh_site_page_urls() after each crawl
+create materialized view site_page_urls as
+  select distinct url, metadata->>'source' as source
+  from site_pages;
+
+-- Unique index required by refresh ... concurrently
+create unique index on site_page_urls (source, url);
+
+create function refresh_site_page_urls ()
+returns void
+language sql
+security definer
+as $$
+  refresh materialized view concurrently site_page_urls;
+$$;
+
+-- Only the crawler (service role) may trigger refreshes
+revoke execute on function refresh_site_page_urls () from public, anon, authenticated;
+grant execute on function refresh_site_page_urls () to service_role;